@@ -11,7 +11,6 @@ load_dotenv(find_dotenv(), override=True)
 
 from flask import Flask, session
 from flask_limiter import Limiter
-from werkzeug.security import generate_password_hash
 import os
 
 import sys
@@ -25,19 +24,15 @@ load_dotenv(find_dotenv(), override=True)
 
 from flask import Flask, session
 from flask_limiter import Limiter
-from werkzeug.security import generate_password_hash
 from jinja2 import Undefined
 from datetime import timedelta
 
 # Custom Modules
 import config
 from extensions import limiter, fernet
-from services.db import (
-    migrate_users_table, migrate_login_logs_table, migrate_tesvik_columns, 
-    migrate_tesvik_kullanim_table, migrate_donem_matrah_table, migrate_profit_data_table, migrate_kdv_tables,
-    migrate_mukellef_table, migrate_kdv_mukellef_table, migrate_kdv_documents_table,
-    migrate_kdv_notes_table, migrate_beyanname_table, get_conn
-)
+from services.db import init_app as init_db_pool
+from services.query_budget import init_app as init_query_budget
+from services.migrations import run_migrations
 from services.utils import safe_date, currency_filter, tlformat
 
 # Blueprints
@@ -78,6 +73,8 @@ app.config["DATABASE_URL"] = _db_url
 
 app.json = SafeJSONProvider(app)
 limiter.init_app(app)
+init_db_pool(app)  # istek basina tek havuz baglantisi
+init_query_budget(app)  # debug: istek basina sorgu sayaci / butcesi
 
 app.permanent_session_lifetime = timedelta(minutes=30)
 app.secret_key = config.SECRET_KEY
@@ -134,26 +131,6 @@ app.jinja_env.filters["safe_date"] = safe_date
 app.jinja_env.filters["currency"] = currency_filter 
 app.jinja_env.filters["tlformat"] = tlformat
 
-# --- Admin Bootstrap ---
-def bootstrap_admin_from_env():
-    username = os.getenv("ADMIN_USERNAME")
-    password = os.getenv("ADMIN_PASSWORD")
-    if not username or not password: return
-
-    hashed_pw = generate_password_hash(password)
-    with get_conn() as conn:
-        with conn.cursor() as c:
-            c.execute("SELECT password FROM users WHERE username = %s", (username,))
-            row = c.fetchone()
-            if not row:
-                c.execute("INSERT INTO users (username, password, is_approved, role, has_kdv_access) VALUES (%s, %s, 1, 'admin', 1)", (username, hashed_pw))
-                print(f"Admin hesabı oluşturuldu: {username}")
-            else:
-                # Eger kullanıcı varsa bilgilerini guncelle
-                c.execute("UPDATE users SET password = %s, role = 'admin', has_kdv_access = 1 WHERE username = %s", (hashed_pw, username))
-                print(f"Admin hesabı güncellendi: {username}")
-        conn.commit()
-
 # --- Blueprints Registration ---
 app.register_blueprint(main_bp)
 app.register_blueprint(auth_bp)
@@ -172,28 +149,10 @@ app.register_blueprint(mobile_api_bp)  # ISFA Mobil API
 # --- Initialization & Database Check ---
 with app.app_context():
     try:
-        # Tables & Migrations
-        app.logger.info("Running migrations...")
-        migrate_users_table()   
-        migrate_login_logs_table()
-        migrate_beyanname_table()
-        migrate_tesvik_columns()
-        migrate_tesvik_kullanim_table()
-        migrate_donem_matrah_table()
-        migrate_profit_data_table()
-        migrate_kdv_mukellef_table()
-        migrate_kdv_tables()
-        migrate_kdv_documents_table() 
-        migrate_kdv_notes_table()
-        migrate_mukellef_table()
-        
-        # Superuser
-        bootstrap_admin_from_env()
-        
-        # Quick Connection Test
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT 1;")
+        # Tables & Migrations (şema güncelse tek sorgu; bkz. services/migrations.py)
+        applied = run_migrations()
+        if applied:
+            app.logger.info(f"Applied schema migrations: {applied}")
         
         app.logger.info("Startup sequence completed successfully.")
         print("Baslangic kontrolleri tamamlandi.")
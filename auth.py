@@ -1,13 +1,24 @@
 from functools import wraps
 from flask import session, redirect, url_for, flash, abort, request, jsonify
-from services.db import get_conn
+from services.auth_context import get_auth_context
 
 
 
+def _active_context():
+    """Oturum açık ve kullanıcı hâlâ onaylı/askıda değilse yetki bağlamı, aksi halde None."""
+    if not session.get("logged_in") or "user_id" not in session:
+        return None
+    ctx = get_auth_context()
+    if ctx is None or not ctx.is_active:
+        session.clear()
+        return None
+    return ctx
+
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not session.get("logged_in") or "user_id" not in session:
+        if _active_context() is None:
             flash("Bu sayfaya erişmek için giriş yapmalısınız.", "warning")
             return redirect(url_for("auth.login"))
         return f(*args, **kwargs)
@@ -25,8 +36,8 @@ def role_required(
     def decorator(f):
         @wraps(f)
         def wrapped(*args, **kwargs):
-            role = session.get("role")
-            user_id = session.get("user_id")
+            ctx = _active_context()
+            role = ctx.role if ctx else None
 
             def forbidden():
                 if request.path.startswith("/api/"):
@@ -34,7 +45,7 @@ def role_required(
                 abort(403)
 
             # Oturum kontrolü
-            if not role or not user_id:
+            if not ctx or not role:
                 return forbidden()
 
             # Rol kontrolü
@@ -54,19 +65,9 @@ def role_required(
                 if not mukellef_id and request.is_json:
                     mukellef_id = request.json.get(assignment_param)
 
-                if not mukellef_id:
+                if not mukellef_id or not ctx.can_access_mukellef(mukellef_id):
                     return forbidden()
 
-                with get_conn() as conn:
-                    c = conn.cursor()
-                    c.execute("""
-                        SELECT 1
-                        FROM kdv_user_assignments
-                        WHERE user_id = %s AND mukellef_id = %s
-                    """, (user_id, mukellef_id))
-                    if not c.fetchone():
-                        return forbidden()
-
             return f(*args, **kwargs)
         return wrapped
     return decorator
@@ -82,11 +83,12 @@ def kdv_access_required(f):
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not session.get("logged_in") or "user_id" not in session:
+        ctx = _active_context()
+        if ctx is None:
             return redirect(url_for("auth.login"))
             
         # Hard isolation: Explicit flag check
-        if not session.get("has_kdv_access") and session.get("username", "").lower() != "admin":
+        if not ctx.can_access_kdv:
             flash("KDV Yönetim Paneline erişim yetkiniz bulunmamaktadır. Bu alan kısıtlıdır.", "danger")
             return redirect(url_for("main.home"))
             
@@ -106,10 +108,11 @@ def api_kdv_access_required(f):
     from flask import session, jsonify
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not session.get("logged_in") or "user_id" not in session:
+        ctx = _active_context()
+        if ctx is None:
             return jsonify({"status": "error", "message": "Oturum kapalı. Lütfen tekrar giriş yapın."}), 401
             
-        if not session.get("has_kdv_access") and session.get("username", "").lower() != "admin":
+        if not ctx.can_access_kdv:
             return jsonify({"status": "error", "message": "KDV Portalı yetkiniz bulunmamaktadır."}), 403
             
         if not session.get("kdv_portal_pin_verified"):
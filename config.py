@@ -18,6 +18,9 @@ WKHTMLTOPDF_PATH = os.getenv("WKHTMLTOPDF_PATH") or "/usr/local/bin/wkhtmltopdf"
 # Maksimum yükleme boyutu (bayt cinsinden)
 MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50 MB
 
+# Mevzuat araması: "hybrid" (BM25 + vektör, RRF ile birleşik) veya "lexical" (sadece BM25)
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid").strip().lower()
+
 
 # --------------------------------------
 # İndirimli Kurumlar Modülü Sabitleri
@@ -1,5 +1,6 @@
 from typing import Dict, Any, List
 from statistics import mean
+import re
 import pandas as pd
 import numpy as np
 
@@ -516,138 +517,181 @@ def hesapla_finansal_oranlar(aktif_df, pasif_df, gelir_df, kategori="likidite"):
             )
         return merged
 
-def kt(df, codes, target_col="Cari Dönem"):
-    import numpy as np
-    import pandas as pd
+# --- STRATEJİK HİYERARŞİ KİLİDİ (BEYANNAME FORMATI) ---
+CATEGORY_PREFIXES = {
+    "1": "I. ", "2": "II. ", "3": "III. ", "4": "IV. ", "5": "V. ",
+    "60": "A.", "61": "B.", "62": "D.", "63": "E.",
+    "64": "F.", "65": "G.", "66": "H.", "690": "DONEM KARI VEYA ZARARI", "692": "DONEM NET KARI"
+}
 
-    if df is None or df.empty:
-        return 0.0
+SPECIAL_TOTALS = {
+    "AKTIF_TOPLAM": ["AKTIF TOPLAMI", "AKTIF (TOPLAM)", "AKTIF GENEL TOPLAMI"],
+    "PASIF_TOPLAM": ["PASIF TOPLAMI", "PASIF (TOPLAM)", "PASIF GENEL TOPLAMI"]
+}
 
-    # Fiziksel satır takibi için indeksi sıfırla
-    df = df.copy().reset_index(drop=True)
-    df.columns = df.columns.astype(str).str.strip()
-    if "Kod" not in df.columns or target_col not in df.columns:
-        return 0.0
+KEYWORD_MAP = {
+    "1": "DONEN VARLIK", "2": "DURAN VARLIK", "3": "KISA VADELI YABANCI", "4": "UZUN VADELI YABANCI", "5": "OZKAYNAK",
+    "60": "BRUT SATISLAR", "61": "SATIS INDIRIM", "62": "SATISLARIN MALIYETI", "63": "FAALIYET GIDERI",
+    "64": "OLAGAN GELIR", "65": "OLAGAN GIDER", "66": "FINANSMAN GIDERI",
+    "690": "DONEM KARI VEYA ZARARI", "692": "DONEM NET KARI"
+}
 
-    def tr_normalize(text):
-        if not text or pd.isna(text): return ""
-        t = str(text).upper()
-        chars = {'İ': 'I', 'Ğ': 'G', 'Ü': 'U', 'Ş': 'S', 'Ö': 'O', 'Ç': 'C'}
-        for c, r in chars.items():
-            t = t.replace(c, r)
-        return t
-
-    df["_kod_norm"] = df["Kod"].astype(str).str.strip().str.replace(r'\.0+$', '', regex=True)
-    df["_desc_norm"] = df["Açıklama"].apply(tr_normalize)
-
-    search_list = [str(c).strip().replace(".0", "") for c in codes]
-    search_set = set(search_list)
-
-    # --- STRATEJİK HİYERARŞİ KİLİDİ (BEYANNAME FORMATI) ---
-    CATEGORY_PREFIXES = {
-        "1": "I. ", "2": "II. ", "3": "III. ", "4": "IV. ", "5": "V. ",
-        "60": "A.", "61": "B.", "62": "D.", "63": "E.", 
-        "64": "F.", "65": "G.", "66": "H.", "690": "DONEM KARI VEYA ZARARI", "692": "DONEM NET KARI"
-    }
-    
-    SPECIAL_TOTALS = {
-        "AKTIF_TOPLAM": ["AKTIF TOPLAMI", "AKTIF (TOPLAM)", "AKTIF GENEL TOPLAMI"],
-        "PASIF_TOPLAM": ["PASIF TOPLAMI", "PASIF (TOPLAM)", "PASIF GENEL TOPLAMI"]
-    }
+# Açıklaması bunlardan biriyle başlayan satır yeni bir ana bölüm başlatır
+SECTION_HEADERS = ("A.", "B.", "C.", "D.", "E.", "F.", "G.", "H.", "I.", "J.", "I. ", "II. ", "III. ", "IV. ", "V. ")
 
-    # Özel Toplam Kontrolü (Bilanço Toplamları İçin)
-    is_asking_total_active = any(c in ["1", "2"] for c in search_list) and len(search_list) > 5
-    if is_asking_total_active:
-        for t_kw in SPECIAL_TOTALS["AKTIF_TOPLAM"]:
-            match = df[df["_desc_norm"].str.contains(t_kw, na=False)]
-            if not match.empty:
-                from services.utils import to_float_turkish
-                return float(to_float_turkish(match.iloc[0][target_col]))
-
-    # Kategori Başı Kontrolü
-    for sc in search_list:
-        if sc in CATEGORY_PREFIXES:
-            prefix = CATEGORY_PREFIXES[sc]
-            match_row = df[df["_desc_norm"].str.startswith(prefix, na=False)]
-            if not match_row.empty:
-                val = match_row.iloc[0][target_col]
-                from services.utils import to_float_turkish
-                return float(to_float_turkish(val))
-
-    # --- STANDART HİYERARŞİK TOPLAMA ---
-    KEYWORD_MAP = {
-        "1": "DONEN VARLIK", "2": "DURAN VARLIK", "3": "KISA VADELI YABANCI", "4": "UZUN VADELI YABANCI", "5": "OZKAYNAK",
-        "60": "BRUT SATISLAR", "61": "SATIS INDIRIM", "62": "SATISLARIN MALIYETI", "63": "FAALIYET GIDERI",
-        "64": "OLAGAN GELIR", "65": "OLAGAN GIDER", "66": "FINANSMAN GIDERI",
-        "690": "DONEM KARI VEYA ZARARI", "692": "DONEM NET KARI"
-    }
+# Kod öneki eşleşmesinde önekten sonra gelebilecek ayraçlar
+CODE_SEPARATORS = ('.', ' ', '-', '_', '/')
 
-    matches = []
-    for idx, row in df.iterrows():
-        code = row["_kod_norm"]
-        desc = row["_desc_norm"]
-        val = row[target_col]
-        
-        is_m = False
-        m_type = None 
-        
-        if code in search_set:
-            is_m = True
-            m_type = 'code'
-        else:
-            for sc in search_list:
-                if sc and code.startswith(sc) and (len(code) == len(sc) or code[len(sc)] in ('.', ' ', '-', '_', '/') or code[len(sc)].isdigit()):
-                    is_m = True
-                    m_type = 'code'
-                    break
-        
-        if not is_m:
-            for sc in search_list:
-                if sc in KEYWORD_MAP and KEYWORD_MAP[sc] in desc:
-                    is_m = True
-                    m_type = 'desc'
-                    break
-
-        if is_m:
-            from services.utils import to_float_turkish
-            matches.append({
-                "idx": idx,
-                "code": code,
-                "desc": desc,
-                "val": to_float_turkish(val),
-                "type": m_type,
-                "len": len(code) if code else 999
-            })
-
-    # Hiyerarşik Tekilleştirme
-    matches.sort(key=lambda x: (x["type"] == 'desc', -x["len"]), reverse=True)
-    
-    final_sum = 0.0
-    processed_indices = set()
-    
-    for m in matches:
-        if m["idx"] in processed_indices:
-            continue
-            
-        final_sum += m["val"]
-        processed_indices.add(m["idx"])
-        
-        if m["code"] != "":
-            for other in matches:
-                if other["idx"] != m["idx"] and other["code"].startswith(m["code"]):
-                    processed_indices.add(other["idx"])
-        
-        if m["type"] == 'desc':
-            # Fiziksel hiyerarşiyi (A -> B arası gibi) temizle
-            for j in range(m["idx"] + 1, len(df)):
-                next_desc = df.iloc[j]["_desc_norm"]
-                if any(next_desc.startswith(p) for p in ["A.","B.","C.","D.","E.","F.","G.","H.","I.","J.","I. ","II. ","III. ","IV. ","V. "]):
-                    break
-                processed_indices.add(j)
 
-    return float(final_sum)
+def tr_normalize(text):
+    if not text or pd.isna(text): return ""
+    t = str(text).upper()
+    chars = {'İ': 'I', 'Ğ': 'G', 'Ü': 'U', 'Ş': 'S', 'Ö': 'O', 'Ç': 'C'}
+    for c, r in chars.items():
+        t = t.replace(c, r)
+    return t
+
+
+class HesapAgaci:
+    """
+    Bir bilanço/gelir tablosunun bir kez derlenmiş hali: normalize kod ve
+    açıklamalar, NumPy değer dizisi, kod önek indeksleri ve bölüm sınırları.
+    `toplam(codes)` eski kt() ile aynı sonucu satır taraması yapmadan,
+    indeks üzerinden hesaplar; aynı kod listesi için sonuç önbelleklenir.
+    """
+
+    def __init__(self, df, target_col="Cari Dönem"):
+        from services.utils import to_float_turkish
+
+        self.target_col = target_col
+        self.kodlar, self.aciklamalar = [], []
+        self.degerler = np.zeros(0)
+        self._memo = {}
+        self._kelime_satirlari = {}
+        self._onek_ilk_satir = {}
+
+        if df is None or df.empty:
+            return
+        df = df.reset_index(drop=True)
+        df.columns = df.columns.astype(str).str.strip()
+        if "Kod" not in df.columns or target_col not in df.columns:
+            return
+
+        self.kodlar = df["Kod"].astype(str).str.strip().str.replace(r'\.0+$', '', regex=True).tolist()
+        aciklama = df["Açıklama"] if "Açıklama" in df.columns else [""] * len(df)
+        self.aciklamalar = [tr_normalize(t) for t in aciklama]
+        self.degerler = np.array([to_float_turkish(v) for v in df[target_col]], dtype=float)
+
+        # kod -> satırlar; önek -> o önekle başlayan satırlar (sınırlı: önekten
+        # sonra ayraç/rakam gelen ya da kodun tamamı olan önekler)
+        self.kod_satirlari, self.onek_satirlari, self.sinirli_onek_satirlari = {}, {}, {}
+        for i, kod in enumerate(self.kodlar):
+            self.kod_satirlari.setdefault(kod, []).append(i)
+            for n in range(1, len(kod) + 1):
+                onek = kod[:n]
+                self.onek_satirlari.setdefault(onek, []).append(i)
+                if n == len(kod) or kod[n] in CODE_SEPARATORS or kod[n].isdigit():
+                    self.sinirli_onek_satirlari.setdefault(onek, []).append(i)
+
+        # Her satırdan sonraki ilk ana bölüm başlığının satırı
+        n = len(self.kodlar)
+        self.bolum_sonu = [n] * n
+        sonraki = n
+        for j in range(n - 1, -1, -1):
+            self.bolum_sonu[j] = sonraki
+            if self.aciklamalar[j].startswith(SECTION_HEADERS):
+                sonraki = j
+
+    @property
+    def bos(self):
+        return not self.kodlar
+
+    def _ilk_satir(self, kosul_anahtari, kosul):
+        if kosul_anahtari not in self._onek_ilk_satir:
+            self._onek_ilk_satir[kosul_anahtari] = next(
+                (i for i, aciklama in enumerate(self.aciklamalar) if kosul(aciklama)), None
+            )
+        return self._onek_ilk_satir[kosul_anahtari]
+
+    def _kelime_gecen_satirlar(self, kelime):
+        if kelime not in self._kelime_satirlari:
+            self._kelime_satirlari[kelime] = [i for i, aciklama in enumerate(self.aciklamalar) if kelime in aciklama]
+        return self._kelime_satirlari[kelime]
+
+    def toplam(self, codes):
+        key = tuple(codes)
+        if key not in self._memo:
+            self._memo[key] = self._hesapla(codes)
+        return self._memo[key]
+
+    def _hesapla(self, codes):
+        if self.bos:
+            return 0.0
+
+        search_list = [str(c).strip().replace(".0", "") for c in codes]
+
+        # Özel Toplam Kontrolü (Bilanço Toplamları İçin)
+        if any(c in ["1", "2"] for c in search_list) and len(search_list) > 5:
+            for t_kw in SPECIAL_TOTALS["AKTIF_TOPLAM"]:
+                # str.contains ile aynı: anahtar kelime düzenli ifade olarak aranır
+                satir = self._ilk_satir(("icerir", t_kw), lambda a, kw=re.compile(t_kw): kw.search(a))
+                if satir is not None:
+                    return float(self.degerler[satir])
+
+        # Kategori Başı Kontrolü
+        for sc in search_list:
+            if sc in CATEGORY_PREFIXES:
+                prefix = CATEGORY_PREFIXES[sc]
+                satir = self._ilk_satir(("onek", prefix), lambda a, p=prefix: a.startswith(p))
+                if satir is not None:
+                    return float(self.degerler[satir])
+
+        # --- STANDART HİYERARŞİK TOPLAMA ---
+        eslesme = {}
+        for sc in search_list:
+            for i in self.kod_satirlari.get(sc, ()):
+                eslesme[i] = 'code'
+            if sc:
+                for i in self.sinirli_onek_satirlari.get(sc, ()):
+                    eslesme[i] = 'code'
+        for sc in search_list:
+            if sc in KEYWORD_MAP:
+                for i in self._kelime_gecen_satirlar(KEYWORD_MAP[sc]):
+                    eslesme.setdefault(i, 'desc')
+
+        # Hiyerarşik Tekilleştirme: önce açıklama eşleşmeleri, sonra kısa koddan uzuna
+        def uzunluk(i):
+            return len(self.kodlar[i]) if self.kodlar[i] else 999
+
+        sirali = sorted(sorted(eslesme), key=lambda i: (eslesme[i] == 'desc', -uzunluk(i)), reverse=True)
+
+        final_sum = 0.0
+        islenen = set()
+        for i in sirali:
+            if i in islenen:
+                continue
+            final_sum += self.degerler[i]
+            islenen.add(i)
+            if self.kodlar[i] != "":
+                islenen.update(self.onek_satirlari.get(self.kodlar[i], ()))
+            if eslesme[i] == 'desc':
+                # Fiziksel hiyerarşiyi (A -> B arası gibi) temizle
+                islenen.update(range(i + 1, self.bolum_sonu[i]))
+
+        return float(final_sum)
+
+
+def hesap_agaci(df, target_col="Cari Dönem"):
+    return df if isinstance(df, HesapAgaci) else HesapAgaci(df, target_col)
+
+
+def kt(df, codes, target_col="Cari Dönem"):
+    """Kod listesine düşen hesapların hiyerarşik toplamı (DataFrame veya HesapAgaci)."""
+    return hesap_agaci(df, target_col).toplam(codes)
 
 def hesapla_finansal_oranlar(aktif_df, pasif_df, gelir_df, kategori="likidite"):
+    # Tablolar bir kez derlenir; tüm kategoriler aynı ağaçları (ve kt önbelleğini) paylaşır
+    aktif_df, pasif_df, gelir_df = hesap_agaci(aktif_df), hesap_agaci(pasif_df), hesap_agaci(gelir_df)
 
     if kategori in ("tümü","all","tum"):
         merged = {}
@@ -1,6 +1,9 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, jsonify
 from werkzeug.security import generate_password_hash
-from services.db import get_conn
+from services.db import get_conn, get_pool_stats
+from services.beyanname_cache import get_cache_stats
+from services.audit_log import get_audit_log_stats
+from services.auth_context import invalidate_auth_context
 from auth import login_required
 import re
 import psycopg2.extras
@@ -61,6 +64,7 @@ def approve_user(user_id):
         c = conn.cursor()
         c.execute("UPDATE users SET is_approved = 1 WHERE id = %s", (user_id,))
         conn.commit()
+    invalidate_auth_context(user_id)
     flash("Kullanıcı başarıyla onaylandı ✅", "success")
     return redirect(url_for("admin.admin_users"))
 
@@ -84,6 +88,7 @@ def reject_user(user_id):
 
         c.execute("DELETE FROM users WHERE id = %s", (user_id,))
         conn.commit()
+    invalidate_auth_context(user_id)
 
     flash("Kullanıcı kaydı silindi ❌", "info")
     return redirect(url_for("admin.admin_users"))
@@ -104,6 +109,7 @@ def update_username(user_id):
         c = conn.cursor()
         c.execute("UPDATE users SET username = %s WHERE id = %s", (new_username, user_id))
         conn.commit()
+    invalidate_auth_context(user_id)
 
     flash("Kullanıcı adı başarıyla güncellendi ✅", "success")
     return redirect(url_for('admin.admin_users'))
@@ -123,6 +129,7 @@ def suspend_user(user_id):
             WHERE id = %s
         """, (user_id,))
         conn.commit()
+    invalidate_auth_context(user_id)
 
     flash("Kullanıcının askıya alma durumu değiştirildi.", "info")
     return redirect(url_for('admin.admin_users'))
@@ -143,6 +150,7 @@ def change_role(user_id):
         c = conn.cursor()
         c.execute("UPDATE users SET role = %s WHERE id = %s", (new_role, user_id))
         conn.commit()
+    invalidate_auth_context(user_id)
 
     flash("Kullanıcı rolü başarıyla güncellendi.", "success")
     return redirect(url_for('admin.admin_users'))
@@ -205,3 +213,27 @@ def login_logs():
 def delete_all_logs():
     flash("Giriş logları işlemleri veri minimizasyonu kapsamında kapatıldı.", "info")
     return redirect(url_for("admin.admin_users"))
+
+@bp.route("/db_pool_stats")
+@login_required
+def db_pool_stats():
+    """Bu worker sürecinin bağlantı havuzu metrikleri (izleme için)."""
+    if session.get("username", "").lower() != "admin":
+        return jsonify({"status": "error", "message": "Yetkisiz erişim"}), 403
+    return jsonify({"status": "success", "pool": get_pool_stats()})
+
+@bp.route("/beyanname_cache_stats")
+@login_required
+def beyanname_cache_stats():
+    """Bu worker sürecinin çözülmüş beyanname önbelleği metrikleri (isabet/ıska)."""
+    if session.get("username", "").lower() != "admin":
+        return jsonify({"status": "error", "message": "Yetkisiz erişim"}), 403
+    return jsonify({"status": "success", "cache": get_cache_stats()})
+
+@bp.route("/audit_log_stats")
+@login_required
+def audit_log_stats():
+    """Bu worker sürecinin log kuyruğu metrikleri (kuyruklanan/yazılan/senkron/hatalı/bekleyen)."""
+    if session.get("username", "").lower() != "admin":
+        return jsonify({"status": "error", "message": "Yetkisiz erişim"}), 403
+    return jsonify({"status": "success", "logs": get_audit_log_stats()})
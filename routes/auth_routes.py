@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
 from werkzeug.security import generate_password_hash, check_password_hash
 from services.db import get_conn
+from services.audit_log import login_log
 from extensions import limiter
 from datetime import timedelta
 import re
@@ -10,16 +11,10 @@ import config
 bp = Blueprint("auth", __name__)
 
 def log_login_attempt(username, success, user_id=None):
-    with get_conn() as conn:
-        c = conn.cursor()
-        ip = request.remote_addr
-        agent = request.headers.get("User-Agent", "Bilinmiyor")[:255]
-
-        c.execute(
-            "INSERT INTO login_logs (user_id, username, ip_address, user_agent, success) VALUES (%s, %s, %s, %s, %s)",
-            (user_id, username, ip, agent, bool(success))
-        )
-        conn.commit()
+    # İstek verisi burada okunur; yazma arka planda toplu yapılır
+    ip = request.remote_addr
+    agent = request.headers.get("User-Agent", "Bilinmiyor")[:255]
+    login_log.write(user_id, username, ip, agent, bool(success))
 
 
 
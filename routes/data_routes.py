@@ -1,14 +1,10 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from werkzeug.utils import secure_filename
-from services.db import get_conn
+from services.db import get_conn, USE_SQLITE
 from services.utils import allowed_file, to_float_turkish
-from services.pdf_service import (
-    parse_bilanco_from_pdf,
-    parse_gelir_from_pdf,
-    parse_kdv_from_pdf,
-)
-
-from services.xml_service import parse_xml_file
+from services.upload_service import get_job, start_job
+from services import beyanname_cache
+from services.donem import metin_anahtari
 from services.excel_service import parse_mizan_excel
 from extensions import fernet
 from auth import role_required
@@ -23,126 +19,87 @@ from decimal import Decimal
 
 bp = Blueprint("data", __name__)
 
-def kaydet_beyanname(data, tur):
-    with get_conn() as conn:
-        c = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        vkn = data.get("vergi_kimlik_no")
-        unvan = data.get("unvan")
-        if not vkn or vkn == "Bilinmiyor":
-            return False
-
-        c.execute("SELECT id FROM mukellef WHERE vergi_kimlik_no=%s AND user_id=%s", (vkn, session["user_id"]))
-        row = c.fetchone()
-        if not row:
-            c.execute("INSERT INTO mukellef (user_id, vergi_kimlik_no, unvan) VALUES (%s, %s, %s) RETURNING id", 
-                      (session["user_id"], vkn, unvan))
-            mukellef_id = c.fetchone()["id"]
-        else:
-            mukellef_id = row["id"]
-            if unvan and unvan != "Bilinmiyor":
-                c.execute("UPDATE mukellef SET unvan=%s WHERE id=%s", (unvan, mukellef_id))
-
-        json_str = json.dumps(data, ensure_ascii=False)
-        encrypted_data = fernet.encrypt(json_str.encode("utf-8"))
-        donem = data.get("donem", "Bilinmiyor")
-
-        c.execute("SELECT id FROM beyanname WHERE user_id=%s AND mukellef_id=%s AND donem=%s AND tur=%s", 
-                  (session["user_id"], mukellef_id, donem, tur))
-        existing = c.fetchone()
-        
-        if existing:
-            c.execute("UPDATE beyanname SET veriler=%s, yuklenme_tarihi=CURRENT_TIMESTAMP WHERE id=%s", 
-                      (encrypted_data, existing["id"]))
-        else:
-            c.execute("INSERT INTO beyanname (user_id, mukellef_id, donem, tur, veriler) VALUES (%s, %s, %s, %s, %s)", 
-                      (session["user_id"], mukellef_id, donem, tur, encrypted_data))
-        conn.commit()
-    return True
-
-def process_parsed_parts(full_data, doc_type):
-    import copy
-    import re
-    
-    # Yıl tespiti
-    yil = 2023
-    try:
-        m = re.search(r"(\d{4})", str(full_data.get("donem", "")))
-        if m: yil = int(m.group(1))
-    except: pass
-    
-    results = []
+def kaydet_beyanname(data, tur, user_id=None, conn=None):
+    """
+    Beyannameyi şifreleyip kaydeder. `conn` verilirse onun transaction'ı
+    kullanılır ve commit çağırana bırakılır (toplu yükleme).
+    """
+    if conn is None:
+        with get_conn() as conn:
+            saved = kaydet_beyanname(data, tur, user_id=user_id, conn=conn)
+            conn.commit()
+        return saved
+
+    if user_id is None:
+        user_id = session["user_id"]
+    c = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    vkn = data.get("vergi_kimlik_no")
+    unvan = data.get("unvan")
+    if not vkn or vkn == "Bilinmiyor":
+        return False
+
+    c.execute("SELECT id FROM mukellef WHERE vergi_kimlik_no=%s AND user_id=%s", (vkn, user_id))
+    row = c.fetchone()
+    if not row:
+        c.execute("INSERT INTO mukellef (user_id, vergi_kimlik_no, unvan) VALUES (%s, %s, %s) RETURNING id", 
+                  (user_id, vkn, unvan))
+        mukellef_id = c.fetchone()["id"]
+    else:
+        mukellef_id = row["id"]
+        if unvan and unvan != "Bilinmiyor":
+            c.execute("UPDATE mukellef SET unvan=%s WHERE id=%s", (unvan, mukellef_id))
+
+    json_str = json.dumps(data, ensure_ascii=False)
+    encrypted_data = fernet.encrypt(json_str.encode("utf-8"))
+    donem = data.get("donem", "Bilinmiyor")
+
+    c.execute("SELECT id FROM beyanname WHERE user_id=%s AND mukellef_id=%s AND donem=%s AND tur=%s", 
+              (user_id, mukellef_id, donem, tur))
+    existing = c.fetchone()
     
-    if doc_type == 'bilanco':
-        cols = {'prev': 'Önceki Dönem', 'curr': 'Cari Dönem', 'inf': 'Cari Dönem (Enflasyonlu)'}
-        target_val_key = 'Cari Dönem'
-        sections = ['aktif', 'pasif']
-        title_base = "BİLANÇO"
-    else: # gelir
-        cols = {'prev': 'onceki_donem', 'curr': 'cari_donem', 'inf': 'cari_donem_enflasyonlu'}
-        target_val_key = 'cari_donem'
-        sections = ['tablo']
-        title_base = "GELİR TABLOSU"
-
-    def create_part(source_col, target_year, type_suffix="", include_prev=False):
-        new_d = copy.deepcopy(full_data)
-        new_d['donem'] = str(target_year)
-        
-        has_any_data = False
-        
-        # Keys mapping for previous and inflation columns
-        prev_key = cols['prev'] 
-        inf_key = cols.get('inf', None)  # Inflation column name
-
-        for sec in sections:
-            new_rows = []
-            if sec in new_d:
-                for row in new_d[sec]:
-                    val = row.get(source_col)
-                    prev_val = row.get(prev_key)
-                    inf_val = row.get(inf_key) if inf_key else None
-
-                    if val is not None or (include_prev and (prev_val is not None or inf_val is not None)):
-                        base_keys = ['Kod', 'Açıklama', 'kod', 'aciklama', 'grup']
-                        new_row = {k: v for k, v in row.items() if k in base_keys}
-                        
-                        # Set target value (Current Period or Inflation Adjusted)
-                        if val is not None:
-                            new_row[target_val_key] = val
-                            has_any_data = True
-                        
-                        # If including previous period data (only for main current year record)
-                        if include_prev and prev_val is not None:
-                            new_row[prev_key] = prev_val
-                        
-                        # If including inflation data (only for main current year record)
-                        if include_prev and inf_val is not None and inf_key:
-                            new_row[inf_key] = inf_val
-                        
-                        new_rows.append(new_row)
-            new_d[sec] = new_rows
-            
-        new_d['veriler'] = {s: new_d.get(s, []) for s in sections}
-        # has_inflation should be True if we have inflation column data
-        new_d['has_inflation'] = (type_suffix == '_enf') or (include_prev and full_data.get('has_inflation', False))
-        
-        final_tur = doc_type + type_suffix
-        return new_d, has_any_data, final_tur
+    if existing:
+        c.execute("UPDATE beyanname SET veriler=%s, yuklenme_tarihi=CURRENT_TIMESTAMP WHERE id=%s", 
+                  (encrypted_data, existing["id"]))
+        beyanname_cache.invalidate(existing["id"])
+    else:
+        c.execute("INSERT INTO beyanname (user_id, mukellef_id, donem, donem_anahtari, tur, veriler) VALUES (%s, %s, %s, %s, %s, %s)", 
+                  (user_id, mukellef_id, donem, metin_anahtari(donem), tur, encrypted_data))
+    return True
 
-    # 1. Önceki Dönem
-    d1, ok1, t1 = create_part(cols['prev'], yil - 1)
-    if ok1: results.append((d1, t1, f"{yil-1} {title_base}"))
-    
-    # 2. Cari Dönem
-    d2, ok2, t2 = create_part(cols['curr'], yil, include_prev=True)
-    if ok2: results.append((d2, t2, f"{yil} {title_base}"))
-    
-    # 3. Enflasyonlu
-    if full_data.get('has_inflation') and doc_type == 'bilanco':
-        d3, ok3, t3 = create_part(cols['inf'], yil, '_enf')
-        if ok3: results.append((d3, t3, f"{yil} ENFLASYONLU {title_base}"))
-        
-    return results
+def kaydet_yukleme_sonuclari(user_id, dosyalar):
+    """
+    Ayrıştırılmış yükleme adımlarını tek transaction içinde kaydeder ve
+    istemciye dönülecek mesaj listesini üretir. Her kayıt kendi savepoint'inde
+    yapılır; biri hata verirse yalnız o geri alınır. Commit döngüden sonra
+    bir kez yapılır; döngü yarıda kesilirse hiçbir kayıt yazılmaz.
+    """
+    sonuclar = []
+    with get_conn() as conn:
+        if USE_SQLITE:
+            # Aksi halde dıştaki SAVEPOINT'in her RELEASE'i kaydı ayrı ayrı commit eder
+            conn.begin()
+        cur = conn.cursor()
+        for filename, adimlar in dosyalar:
+            for adim in adimlar:
+                if "mesaj" in adim:
+                    sonuclar.append(adim["mesaj"])
+                    continue
+                kayit = adim["kayit"]
+                cur.execute("SAVEPOINT yukleme_kayit")
+                try:
+                    saved = kaydet_beyanname(kayit["data"], kayit["tur"], user_id=user_id, conn=conn)
+                    cur.execute("RELEASE SAVEPOINT yukleme_kayit")
+                except Exception as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT yukleme_kayit")
+                    sonuclar.append({"filename": filename, "type": "error", "message": str(e)})
+                    continue
+                if saved:
+                    sonuclar.append(adim["basarili"])
+                elif adim.get("basarisiz"):
+                    sonuclar.append(adim["basarisiz"])
+        conn.commit()
+    return sonuclar
 
 @bp.route("/yukle-coklu", methods=["POST"])
 @role_required(allow_roles=("admin",))
@@ -156,143 +113,32 @@ def yukle_coklu():
         flash("Dosya seçilmedi.", "warning")
         return redirect(url_for("data.veri_giris"))
 
-    sonuclar = []
-
-    for file in files:
+    work_dir = tempfile.mkdtemp(prefix="yukle_")
+    kayitli, sonuclar = [], []
+    for idx, file in enumerate(files):
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            temp_path = os.path.join(tempfile.gettempdir(), filename)
+            # Aynı adlı dosyalar birbirini ezmesin
+            temp_path = os.path.join(work_dir, f"{idx}_{filename}")
             file.save(temp_path)
-
-            try:
-                import pdfplumber
-                import re
-                
-                full_text = ""
-                is_pdf = file.filename.lower().endswith(".pdf")
-                if is_pdf:
-                    with pdfplumber.open(temp_path) as pdf:
-                        full_text = "\n".join([p.extract_text() or "" for p in pdf.pages])
-
-                parsed_data = None
-                tur = "diger"
-
-                # 1. XML Kontrolü
-                if filename.lower().endswith(".xml") or full_text.strip().startswith("<?xml"):
-                    try:
-                        res = parse_xml_file(temp_path)
-                        if not res.get("hata"):
-                            parsed_data = res
-                            tur = res.get("tur", "xml_beyanname")
-                            # XML ise direkt kaydet
-                            if kaydet_beyanname(parsed_data, tur):
-                                sonuclar.append({
-                                    "filename": filename,
-                                    "type": "success",
-                                    "title": "XML Beyanname Yüklendi",
-                                    "text": f"{parsed_data.get('unvan')} - {parsed_data.get('donem')} yüklendi.",
-                                    "tur": tur,
-                                    "donem": parsed_data.get("donem")
-                                })
-                        else:
-                            sonuclar.append({"filename": filename, "type": "error", "message": res['hata']})
-                            continue
-                    except Exception as e:
-                         sonuclar.append({"filename": filename, "type": "error", "message": f"(XML): {str(e)}"})
-                         continue
-
-                # 2. PDF Kontrolü (Öncelik Kurumlar/Bilanço/Gelir'de)
-                # Regex ile sağlam kontrol: encoding hatalarını (. ile) tolere et
-                elif is_pdf and (re.search(r"KURUMLAR\s*VERG", full_text, re.I) or \
-                                 re.search(r"BILAN.O", full_text, re.I) or \
-                                 re.search(r"GEL.R\s*TABLO", full_text, re.I)):
-                     
-                     tur = "bilanco/gelir"
-                     
-                     # Bilanço Parsingleme ve Parçalama
-                     try:
-                         res_b = parse_bilanco_from_pdf(temp_path, full_text)
-                         # Eğer bilanco içeriği varsa (aktif veya pasif doluysa)
-                         if res_b.get("aktif") or res_b.get("pasif"):
-                             parts_b = process_parsed_parts(res_b, "bilanco")
-                             if not parts_b:
-                                 # Parça çıkmadı ama belki sadece gelir tablosu vardır, devam et
-                                 pass
-                             for p_data, p_tur, p_title in parts_b:
-                                 if kaydet_beyanname(p_data, p_tur):
-                                     sonuclar.append({
-                                         "filename": filename,
-                                         "type": "success",
-                                         "title": "Bilanço Yüklendi",
-                                         "text": f"{p_data.get('unvan')} - {p_title} başarıyla yüklendi.",
-                                         "tur": p_tur,
-                                         "donem": p_data.get("donem")
-                                     })
-                     except Exception as e:
-                         pass # Bilanço hatası, devam et
-                         
-                     # Gelir Tablosu Parsingleme ve Parçalama
-                     try:
-                         res_g = parse_gelir_from_pdf(temp_path, full_text)
-                         if res_g.get("tablo"):
-                             parts_g = process_parsed_parts(res_g, "gelir")
-                             for p_data, p_tur, p_title in parts_g:
-                                 if kaydet_beyanname(p_data, p_tur):
-                                     sonuclar.append({
-                                         "filename": filename,
-                                         "type": "success",
-                                         "title": "Gelir Tablosu Yüklendi",
-                                         "text": f"{p_data.get('unvan')} - {p_title} başarıyla yüklendi.",
-                                         "tur": p_tur,
-                                         "donem": p_data.get("donem")
-                                     })
-                     except Exception as e:
-                         pass
-
-                # 3. KDV Kontrolü (Sadece yukarıdakiler değilse)
-                elif is_pdf and (re.search(r"KATMA\s*DE.ER\s*VERG", full_text, re.I) or "KDV" in full_text.upper()):
-                     res = parse_kdv_from_pdf(temp_path, full_text)
-                     if not res.get("hata"):
-                         parsed_data = res
-                         tur = "kdv"
-                         save_success = kaydet_beyanname(parsed_data, tur)
-                         if save_success:
-                            sonuclar.append({
-                                "filename": filename,
-                                "type": "success",
-                                "title": "Başarıyla Yüklendi",
-                                "text": f"{parsed_data.get('unvan', 'Bilinmiyor')} mükellefi {parsed_data.get('donem', 'Bilinmiyor')} dönemi KDV yüklendi.",
-                                "vkn": parsed_data.get("vergi_kimlik_no"),
-                                "donem": parsed_data.get("donem"),
-                                "tur": "kdv"
-                            })
-                         else:
-                            sonuclar.append({"filename": filename, "type": "error", "message": "Veritabanına kaydedilirken hata oluştu."})
-
-                # 4. Mizan (Excel) kontrolü
-                elif not parsed_data and file.filename.lower().endswith((".xlsx", ".xls")):
-                    sonuclar.append({
-                        "filename": filename,
-                        "type": "mizan_input_required",
-                        "text": "Excel mizan dosyası için mükellef ve dönem bilgisi gerekli."
-                    })
-                    continue
-                
-                # Hiçbiri değilse
-                if tur == "diger":
-                    sonuclar.append({"filename": filename, "type": "error", "message": "Dosya içeriği tanınamadı veya desteklenmeyen format."})
-
-            except Exception as e:
-                sonuclar.append({"filename": filename, "type": "error", "message": str(e)})
-            finally:
-                if os.path.exists(temp_path):
-                    try:
-                       os.remove(temp_path)
-                    except: pass
+            kayitli.append((temp_path, filename))
         else:
             sonuclar.append({"filename": file.filename, "type": "error", "message": "Desteklenmeyen dosya uzantısı."})
 
-    return jsonify(sonuclar)
+    job_id = start_job(session["user_id"], kayitli, work_dir, kaydet_yukleme_sonuclari, pre_results=sonuclar)
+    return jsonify({
+        "job_id": job_id,
+        "total": len(kayitli),
+        "status_url": url_for("data.yukle_coklu_durum", job_id=job_id),
+    }), 202
+
+@bp.route("/yukle-coklu/durum/<job_id>")
+@role_required(allow_roles=("admin",))
+def yukle_coklu_durum(job_id):
+    job = get_job(job_id, session["user_id"])
+    if not job:
+        return jsonify({"status": "error", "message": "Yükleme işi bulunamadı."}), 404
+    return jsonify(job)
 
 @bp.route("/kaydet-mizan-meta", methods=["POST"])
 @role_required(allow_roles=("admin",))
@@ -365,10 +211,11 @@ def veri_giris():
             if secili_vkn:
                 # Seçili mükellefin dönemlerini getir
                 c.execute("""
-                    SELECT DISTINCT donem FROM beyanname b 
+                    SELECT b.donem FROM beyanname b 
                     JOIN mukellef m ON b.mukellef_id=m.id 
                     WHERE m.user_id=%s AND m.vergi_kimlik_no=%s 
-                    ORDER BY donem DESC
+                    GROUP BY b.donem
+                    ORDER BY COALESCE(MAX(b.donem_anahtari), 0) DESC, b.donem DESC
                 """, (uid, secili_vkn))
                 donemler = [r["donem"] for r in c.fetchall()]
 
@@ -424,7 +271,8 @@ def mukellef_sil():
             if not row: return jsonify({"status": "error", "message": "Mükellef bulunamadı."}), 404
             
             mid = row["id"]
-            c.execute("DELETE FROM beyanname WHERE user_id=%s AND mukellef_id=%s", (session["user_id"], mid))
+            c.execute("DELETE FROM beyanname WHERE user_id=%s AND mukellef_id=%s RETURNING id", (session["user_id"], mid))
+            beyanname_cache.invalidate(*(r["id"] for r in c.fetchall()))
             c.execute("DELETE FROM mukellef WHERE user_id=%s AND id=%s", (session["user_id"], mid))
             conn.commit()
             
@@ -450,9 +298,10 @@ def donem_sil():
             mid = row["id"]
             
             if tur == "all":
-                c.execute("DELETE FROM beyanname WHERE user_id=%s AND mukellef_id=%s AND donem=%s", (session["user_id"], mid, donem))
+                c.execute("DELETE FROM beyanname WHERE user_id=%s AND mukellef_id=%s AND donem=%s RETURNING id", (session["user_id"], mid, donem))
             else:
-                c.execute("DELETE FROM beyanname WHERE user_id=%s AND mukellef_id=%s AND donem=%s AND tur=%s", (session["user_id"], mid, donem, tur))
+                c.execute("DELETE FROM beyanname WHERE user_id=%s AND mukellef_id=%s AND donem=%s AND tur=%s RETURNING id", (session["user_id"], mid, donem, tur))
+            beyanname_cache.invalidate(*(r["id"] for r in c.fetchall()))
             conn.commit()
             
         return jsonify({"status": "success", "message": "Silindi."})
@@ -480,9 +329,10 @@ def yeniden_yukle():
             if not row: return jsonify({"status": "error", "message": "Bulunamadı."}), 404
             mid, unvan = row["id"], row["unvan"]
             
-            c.execute("DELETE FROM beyanname WHERE user_id=%s AND mukellef_id=%s AND donem=%s AND tur=%s", (session["user_id"], mid, donem, tur))
-            c.execute("INSERT INTO beyanname (user_id, mukellef_id, donem, tur, veriler, yuklenme_tarihi) VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP) RETURNING yuklenme_tarihi", 
-                      (session["user_id"], mid, donem, tur, veriler))
+            c.execute("DELETE FROM beyanname WHERE user_id=%s AND mukellef_id=%s AND donem=%s AND tur=%s RETURNING id", (session["user_id"], mid, donem, tur))
+            beyanname_cache.invalidate(*(r["id"] for r in c.fetchall()))
+            c.execute("INSERT INTO beyanname (user_id, mukellef_id, donem, donem_anahtari, tur, veriler, yuklenme_tarihi) VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP) RETURNING id, yuklenme_tarihi", 
+                      (session["user_id"], mid, donem, metin_anahtari(donem), tur, veriler))
             row = c.fetchone()
             conn.commit()
             
@@ -17,12 +17,24 @@ from flask import Blueprint, render_template, request, session, flash, redirect,
 from werkzeug.utils import secure_filename
 
 
-from services.db import get_conn, USE_SQLITE
-from services.ozelge_service import POPULAR_TOPICS, get_ozelge_by_slug, load_ozelge_index, search_ozelgeler
+from services.db import get_conn, USE_SQLITE, bulk_upsert, changed_rows
+from services.tesvik_data import (
+    defter_belge_no_degistir, defter_guncelle, defter_sil, fetch_kullanim, load_indirimli_page, load_tesvik_docs,
+)
+from services.query_budget import query_budget
+from services.donem import GECICI, coz, kullanim_anahtari, kullanim_donemi, tarih_gecici_anahtari
+from services.indirimli_kv import KatkiGecmisi, donem_anahtari, kazanc_gridi, senaryo_projeksiyonu
+from services import guest_workspace
+from services.guest_workspace import DOCS as GUEST_DOCS, DONEM_MATRAH as GUEST_DONEM_MATRAH
+from services.ozelge_service import POPULAR_TOPICS, get_ozelge_by_slug, get_ozelge_repository
 from config import ILLER, BOLGE_MAP, BOLGE_MAP_9903, TESVIK_KATKILAR, TESVIK_VERGILER, TESVIK_KATKILAR_9903
 from auth import login_required
 from types import SimpleNamespace
 
+# Sayfa sorgu bütçesi (debug): mükellef listesi, belgeler, dönem kayıtları,
+# dönem matrah havuzu, kazanç tablosu (+ ilk erişimde varsayılan satırlar)
+INDIRIMLI_PAGE_QUERY_BUDGET = 6
+
 bp = Blueprint("indirimlikurumlar", __name__, url_prefix="/indirimlikurumlar")
 seo_bp = Blueprint(
     "indirimlikurumlar_seo",
@@ -31,18 +43,12 @@ seo_bp = Blueprint(
 )
 
 
-def _guest_list(key):
-    value = session.get(key)
-    if isinstance(value, list):
-        return value
-    return []
+def _guest_list(kind):
+    return guest_workspace.list_items(kind)
 
 
-def _guest_next_id(key):
-    next_id = int(session.get(key, 0) or 0) + 1
-    session[key] = next_id
-    session.modified = True
-    return next_id
+def _guest_next_id(name):
+    return guest_workspace.next_id(name)
 
 
 def _guest_usage_fields():
@@ -68,7 +74,9 @@ def _guest_usage_fields():
 
 
 def _guest_find_doc(doc_id=None, belge_no=None):
-    for doc in _guest_list("guest_tesvik_docs"):
+    if doc_id is not None:
+        return guest_workspace.get_item(GUEST_DOCS, doc_id)
+    for doc in _guest_list(GUEST_DOCS):
         if doc_id is not None and int(doc.get("id") or 0) == int(doc_id):
             return doc
         if belge_no is not None and str(doc.get("belge_no") or "") == str(belge_no):
@@ -77,25 +85,14 @@ def _guest_find_doc(doc_id=None, belge_no=None):
 
 
 def _guest_save_doc(updated_doc):
-    docs = _guest_list("guest_tesvik_docs")
-    saved = False
-    for idx, doc in enumerate(docs):
-        if int(doc.get("id") or 0) == int(updated_doc.get("id") or 0):
-            docs[idx] = updated_doc
-            saved = True
-            break
-    if not saved:
-        docs.append(updated_doc)
-    session["guest_tesvik_docs"] = docs
-    session.modified = True
+    guest_workspace.save_item(GUEST_DOCS, updated_doc)
 
 
 def _guest_period_sort_key(item):
-    try:
-        year = int(item.get("display_hesap_donemi") or item.get("hesap_donemi") or 0)
-    except Exception:
-        year = 0
-    return (year, _donem_rank(item.get("display_donem_turu") or item.get("donem_turu")))
+    return _period_key(
+        item.get("display_hesap_donemi") or item.get("hesap_donemi"),
+        item.get("display_donem_turu") or item.get("donem_turu"),
+    )
 
 
 def _guest_usage_record(doc, belge_no, hesap_donemi, donem_turu, donem_text, data):
@@ -115,29 +112,15 @@ def _guest_usage_record(doc, belge_no, hesap_donemi, donem_turu, donem_text, dat
     return record
 
 
-def _donem_rank(turu: str) -> int:
-    s = (turu or "").upper()
-    if "KURUMLAR" in s:
-        return 5
-    if "4" in s:
-        return 4
-    if "3" in s:
-        return 3
-    if "2" in s:
-        return 2
-    if "1" in s:
-        return 1
-    return 0
+def _period_key(hesap_donemi, donem_turu):
+    """Kanonik dönem anahtarı (services.donem); yıl yoksa 0 (en eskiye)."""
+    return donem_anahtari(hesap_donemi, donem_turu) or 0
 
 
 def _sort_donem_matrah(rows):
     return sorted(
         rows or [],
-        key=lambda r: (
-            int(r.get("hesap_donemi") or 0),
-            _donem_rank(r.get("donem_turu")),
-            int(r.get("id") or 0),
-        ),
+        key=lambda r: (_period_key(r.get("hesap_donemi"), r.get("donem_turu")), int(r.get("id") or 0)),
         reverse=True,
     )
 
@@ -186,47 +169,26 @@ def _payload_num(data, key):
     return _num_for_json((data or {}).get(key))
 
 
-def _donem_key(year, turu):
-    try:
-        return (int(year), _donem_rank(turu))
-    except Exception:
-        return (0, 0)
-
-
-def _date_to_period_key(value):
-    dt = _parse_date_any(value)
-    if not dt:
-        return None
-    if dt.month <= 3:
-        rank = 1
-    elif dt.month <= 6:
-        rank = 2
-    elif dt.month <= 9:
-        rank = 3
-    else:
-        rank = 4
-    return (int(dt.year), rank)
-
-
 def _period_after_investment_end(hesap_donemi, donem_turu, doc):
     end_keys = [
         key for key in (
-            _date_to_period_key((doc or {}).get("fiili_tamamlanma_tarihi")),
-            _date_to_period_key((doc or {}).get("vize_basvuru_tarihi")),
+            tarih_gecici_anahtari(_parse_date_any((doc or {}).get("fiili_tamamlanma_tarihi"))),
+            tarih_gecici_anahtari(_parse_date_any((doc or {}).get("vize_basvuru_tarihi"))),
         )
         if key
     ]
     if not end_keys:
         return False
-    end_year, end_rank = min(end_keys)
-    current_year, current_rank = _donem_key(hesap_donemi, donem_turu)
+    end_year, end_month, _ = coz(min(end_keys))
+    current_year, current_month, current_tur = coz(_period_key(hesap_donemi, donem_turu))
     if current_year > end_year:
         return True
     if current_year < end_year:
         return False
-    if current_rank == 5:
+    # Bitiş yılının kurumlar beyannamesi yatırım dönemi içinde sayılır
+    if current_tur != GECICI:
         return False
-    return current_rank > end_rank
+    return current_month > end_month
 
 
 def _normalize_donem_matrah(row):
@@ -327,6 +289,9 @@ def _clean_json_value(val):
 
 
 
+PROFIT_COLUMNS = ("column_b", "column_c", "column_d", "column_e")
+
+
 def get_user_profit_df(user_id: int) -> pd.DataFrame:
     df = pd.DataFrame({
         'Açıklama': explanations,
@@ -346,44 +311,53 @@ def get_user_profit_df(user_id: int) -> pd.DataFrame:
         db_data = c.fetchall()
 
         if db_data:
-            for row_idx, val_b, val_c, val_d, val_e in db_data:
+            for r in db_data:
                 try:
-                    row_idx = int(row_idx)
+                    row_idx = int(r["aciklama_index"])
                 except (ValueError, TypeError):
                     continue  # Geçersiz indeksleri atla
                 if 0 <= row_idx < len(explanations): 
-                    df.at[row_idx, 'B'] = val_b
-                    df.at[row_idx, 'C'] = val_c
-                    df.at[row_idx, 'D'] = val_d
-                    df.at[row_idx, 'E'] = val_e
+                    df.at[row_idx, 'B'] = r["column_b"]
+                    df.at[row_idx, 'C'] = r["column_c"]
+                    df.at[row_idx, 'D'] = r["column_d"]
+                    df.at[row_idx, 'E'] = r["column_e"]
         else:
-            for i, _ in enumerate(explanations):
-                c.execute(
-                    "INSERT INTO profit_data (user_id, aciklama_index, column_b, column_c, column_d, column_e) "
-                    "VALUES (%s, %s, %s, %s, %s, %s)",
-                    (user_id, i, 0.0, 0.0, 0.0, 0.0)
-                )
+            # İlk erişim: varsayılan satırlar tek seferde
+            bulk_upsert(
+                c, "profit_data", ("user_id", "aciklama_index", *PROFIT_COLUMNS),
+                [(user_id, i, 0.0, 0.0, 0.0, 0.0) for i in range(len(explanations))],
+                conflict=("user_id", "aciklama_index"), update=[],
+            )
             conn.commit()
 
     return df
 
-def save_user_profit_df(user_id: int, dataframe: pd.DataFrame):
+
+def _profit_rows(dataframe: pd.DataFrame):
+    return [
+        (int(i), float(row['B'] or 0), float(row['C'] or 0), float(row['D'] or 0), float(row['E'] or 0))
+        for i, row in dataframe.iterrows()
+    ]
+
+
+def save_user_profit_df(user_id: int, dataframe: pd.DataFrame, loaded: pd.DataFrame = None):
+    """Tabloyu yazar; `loaded` verilirse yalnızca ondan farklı satırlar yazılır."""
     if user_id == -1 or user_id is None:
         return
-    
+
+    rows = _profit_rows(dataframe)
+    if loaded is not None:
+        rows = changed_rows(rows, {r[0]: r[1:] for r in _profit_rows(loaded)})
+    if not rows:
+        return
+
     with get_conn() as conn:
         c = conn.cursor()
-        for i, row in dataframe.iterrows():
-            c.execute("""
-                INSERT INTO profit_data (user_id, aciklama_index, column_b, column_c, column_d, column_e)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (user_id, aciklama_index)
-                DO UPDATE SET
-                    column_b = EXCLUDED.column_b,
-                    column_c = EXCLUDED.column_c,
-                    column_d = EXCLUDED.column_d,
-                    column_e = EXCLUDED.column_e
-            """, (user_id, i, row['B'], row['C'], row['D'], row['E']))
+        bulk_upsert(
+            c, "profit_data", ("user_id", "aciklama_index", *PROFIT_COLUMNS),
+            [(user_id, *r) for r in rows],
+            conflict=("user_id", "aciklama_index"),
+        )
         conn.commit()
 
 
@@ -438,6 +412,7 @@ def ayrintili_kazanc():
                 })
 
             current_df_profit = get_user_profit_df(user_id)
+            loaded_df_profit = current_df_profit.copy()
 
             # 🟦 İçe Aktar
             if 'import' in request.form:
@@ -518,7 +493,7 @@ def ayrintili_kazanc():
                         except ValueError:
                             current_df_profit.at[i, col] = 0.0
 
-                save_user_profit_df(user_id, current_df_profit)
+                save_user_profit_df(user_id, current_df_profit, loaded=loaded_df_profit)
                 return jsonify({
                     "status": "success",
                     "title": "Kaydedildi!",
@@ -531,7 +506,7 @@ def ayrintili_kazanc():
         if is_logged_in and aktif_mukellef_id:
             docs = get_all_tesvik_docs(user_id, aktif_mukellef_id)
         else:
-            docs = _guest_list("guest_tesvik_docs")
+            docs = _guest_list(GUEST_DOCS)
 
         current_belge = None
         active_tesvik_id = session.get("active_tesvik_id")
@@ -623,11 +598,12 @@ def mukellef_bilgi():
 
 
 @bp.route("/list_tesvik_docs")
+@query_budget(2)
 def list_tesvik_docs():
     user_id = session.get("user_id")
     mukellef_id = session.get("aktif_mukellef_id")
     if not user_id or not mukellef_id:
-        return jsonify({"docs": _guest_list("guest_tesvik_docs")})
+        return jsonify({"docs": _guest_list(GUEST_DOCS)})
 
     docs = get_all_tesvik_docs(user_id, mukellef_id)
 
@@ -782,7 +758,7 @@ def baslat_tesvik_belgesi():
             diger_oran = num("diger_oran")
 
         if not user_id or not mukellef_id:
-            docs = _guest_list("guest_tesvik_docs")
+            docs = _guest_list(GUEST_DOCS)
             new_id = edit_id or _guest_next_id("guest_tesvik_next_id")
             existing_doc = next(
                 (
@@ -823,9 +799,10 @@ def baslat_tesvik_belgesi():
                 "use_detailed_profit_ratios": False,
                 "donemler": existing_doc.get("donemler") or [],
             }
-            docs = [d for d in docs if int(d.get("id") or 0) != new_id and d.get("belge_no") != belge_no]
-            docs.append(doc)
-            session["guest_tesvik_docs"] = docs
+            for d in docs:
+                if int(d.get("id") or 0) != int(new_id) and d.get("belge_no") == belge_no:
+                    guest_workspace.delete_item(GUEST_DOCS, d["id"])
+            _guest_save_doc(doc)
             session["active_tesvik_id"] = new_id
             session["current_tesvik_id"] = new_id
             session.modified = True
@@ -871,6 +848,7 @@ def baslat_tesvik_belgesi():
                         "UPDATE tesvik_kullanim SET belge_no=%s WHERE user_id=%s AND belge_no=%s",
                         (belge_no, user_id, old_doc.get("belge_no")),
                     )
+                    defter_belge_no_degistir(cur, user_id, old_doc.get("belge_no"), belge_no)
             else:
                 cur.execute("""
                     INSERT INTO tesvik_belgeleri (
@@ -914,11 +892,13 @@ def baslat_tesvik_belgesi():
 
 
 @bp.route("/", methods=["GET", "POST"])
+@query_budget(INDIRIMLI_PAGE_QUERY_BUDGET)
 def index():
     return render_indirimlikurumlar()
 
 
 @seo_bp.route("/")
+@query_budget(INDIRIMLI_PAGE_QUERY_BUDGET)
 def hesaplama_araci():
     return render_indirimlikurumlar(
         seo_context={
@@ -1043,20 +1023,6 @@ def render_indirimlikurumlar(sekme_override=None, seo_context=None):
         if not aktif_mukellef_id and sekme not in ["ornekler", "mevzuat", "ozelgeler"]:
             return redirect(url_for("mukellef.index", next=url_for("indirimlikurumlar.index")))
 
-        # Unvan oturumda yoksa DB'den çek
-        if not session.get("aktif_mukellef_unvan"):
-            try:
-                with get_conn() as conn:
-                    c = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-                    c.execute("SELECT vergi_kimlik_no, unvan FROM mukellef WHERE id = %s AND user_id = %s", (aktif_mukellef_id, user_id))
-                    row = c.fetchone()
-                    if row:
-                        session["aktif_mukellef_vkn"] = row["vergi_kimlik_no"]
-                        session["aktif_mukellef_unvan"] = row["unvan"]
-                        ("    ''")
-            except Exception as e:
-                ("️     ")
-
         with get_conn() as conn:
             c = conn.cursor()
             c.execute(
@@ -1065,56 +1031,29 @@ def render_indirimlikurumlar(sekme_override=None, seo_context=None):
             )
             mukellefler = c.fetchall()
 
+        # Unvan oturumda yoksa mükellef listesinden al
+        if not session.get("aktif_mukellef_unvan") and aktif_mukellef_id:
+            row = next((m for m in mukellefler if str(m["id"]) == str(aktif_mukellef_id)), None)
+            if row:
+                session["aktif_mukellef_vkn"] = row["vergi_kimlik_no"]
+                session["aktif_mukellef_unvan"] = row["unvan"]
+
     docs, user_df, current_belge = [], None, None 
     current_kullanim = None 
     edit_doc = None 
     donem_matrah_list = []
     active_donem_matrah = None
 
+    page_data = None
     if aktif_mukellef_id: 
-        docs = get_all_tesvik_docs(user_id, aktif_mukellef_id) 
+        # Belgeler + dönemleri, tüm dönem kayıtları ve dönem matrah havuzu sabit sayıda sorguda
+        page_data = load_indirimli_page(user_id, aktif_mukellef_id)
+        docs = page_data["docs"]
         user_df = get_user_profit_df(user_id) 
 
-        # Dönem matrah kayıtlarını çek (Dönem Hesabı sekmesi için)
-        # Sıralama: daima "yeniden eskiye" (en yeni -> en eski). DB farklarından etkilenmemek için
-        # Python tarafında stabil sıralıyoruz.
+        # Dönem matrah kayıtları (Dönem Hesabı sekmesi için); sorgu en yeni dönemi önce getirir
         try:
-            with get_conn() as _conn_dm:
-                _cur_dm = _conn_dm.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-                _cur_dm.execute(
-                    """
-                    SELECT *
-                    FROM donem_matrah
-                    WHERE user_id = %s AND mukellef_id = %s
-                    """,
-                    (user_id, aktif_mukellef_id),
-                )
-                _rows_dm = _cur_dm.fetchall() or []
-
-            def _donem_rank(turu: str) -> int:
-                s = (turu or "").upper()
-                # büyük rank = daha yeni göster
-                if "KURUMLAR" in s:
-                    return 5
-                if "4" in s:
-                    return 4
-                if "3" in s:
-                    return 3
-                if "2" in s:
-                    return 2
-                if "1" in s:
-                    return 1
-                return 0
-
-            donem_matrah_list = sorted(
-                _rows_dm,
-                key=lambda r: (
-                    int(r.get("hesap_donemi") or 0),
-                    _donem_rank(r.get("donem_turu")),
-                    int(r.get("id") or 0),
-                ),
-                reverse=True,
-            )
+            donem_matrah_list = list(page_data["donem_matrah"])
 
             # Aktif dönem matrah kaydı (Form sekmesi otomatik doldursun diye)
             try:
@@ -1163,14 +1102,10 @@ def render_indirimlikurumlar(sekme_override=None, seo_context=None):
                     session["flash_tesvik_required"] = True
                     return redirect(url_for("indirimlikurumlar.index", sekme="tesvik"))
 
-                with get_conn() as conn_form:
-                    cur = conn_form.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-                    cur.execute("""
-                        SELECT *
-                        FROM tesvik_belgeleri
-                        WHERE id = %s AND user_id = %s AND mukellef_id = %s
-                    """, (active_tesvik_id, user_id, aktif_mukellef_id))
-                    current_belge = cur.fetchone()
+                # docs zaten kullanıcı + mükellef ile süzülü
+                current_belge = next((d for d in docs if str(d["id"]) == str(active_tesvik_id)), None)
+                if current_belge:
+                    current_belge = {k: v for k, v in current_belge.items() if k != "donemler"}
             else:
                 current_belge = None
 
@@ -1195,15 +1130,9 @@ def render_indirimlikurumlar(sekme_override=None, seo_context=None):
                 if not active_donem:
                     session["flash_donem_matrah_required"] = True
                     return redirect(url_for("indirimlikurumlar.index", sekme="donem"))
-                with get_conn() as _conn_chk:
-                    _cur = _conn_chk.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-                    _cur.execute(
-                        "SELECT id FROM donem_matrah WHERE user_id=%s AND mukellef_id=%s AND donem_text=%s LIMIT 1",
-                        (user_id, aktif_mukellef_id, active_donem),
-                    )
-                    if not _cur.fetchone():
-                        session["flash_donem_matrah_required"] = True
-                        return redirect(url_for("indirimlikurumlar.index", sekme="donem"))
+                if not any(x.get("donem_text") == active_donem for x in page_data["donem_matrah"]):
+                    session["flash_donem_matrah_required"] = True
+                    return redirect(url_for("indirimlikurumlar.index", sekme="donem"))
             except Exception:
                 # Tablo henüz yoksa / bağlantı sorunu varsa formu açıp kullanıcıyı yanıltmayalım.
                 session["flash_donem_matrah_required"] = True
@@ -1216,8 +1145,8 @@ def render_indirimlikurumlar(sekme_override=None, seo_context=None):
                     return redirect(url_for("indirimlikurumlar.index", sekme="tesvik"))
 
     else:
-        docs = _guest_list("guest_tesvik_docs")
-        donem_matrah_list = _sort_donem_matrah(_guest_list("guest_donem_matrah_list"))
+        docs = _guest_list(GUEST_DOCS)
+        donem_matrah_list = _sort_donem_matrah(_guest_list(GUEST_DONEM_MATRAH))
         active_text = session.get("active_donem_text")
         if active_text:
             active_donem_matrah = next((x for x in donem_matrah_list if x.get("donem_text") == active_text), None)
@@ -1249,96 +1178,93 @@ def render_indirimlikurumlar(sekme_override=None, seo_context=None):
             return 0.0
 
     if docs and user_id:
-        with get_conn() as conn_k:
-            cur_k = conn_k.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            belge_nolar = [d["belge_no"] for d in docs if d.get("belge_no")]
-            if belge_nolar:
-                cur_k.execute("""
-                    SELECT * FROM tesvik_kullanim 
-                    WHERE user_id = %s AND belge_no = ANY(%s)
-                    ORDER BY hesap_donemi DESC
-                """, (user_id, belge_nolar))
-                all_k = cur_k.fetchall()
-                import re as _usage_re
-                for item in all_k:
-                    item["display_hesap_donemi"] = item.get("hesap_donemi")
-                    item["display_donem_turu"] = item.get("donem_turu")
-                    m = _usage_re.match(r"^(\d{4})\s*-\s*(.+)$", str(item.get("donem_text") or "").strip())
-                    if m:
-                        try:
-                            item["display_hesap_donemi"] = int(m.group(1))
-                        except Exception:
-                            item["display_hesap_donemi"] = m.group(1)
-                        item["display_donem_turu"] = m.group(2).strip().upper()
-                for item in all_k:
-                    bno = item["belge_no"]
-                    if bno not in kullanimlar:
-                        kullanimlar[bno] = []
-                    kullanimlar[bno].append(item)
-
-                    donem_key = str(item.get("donem_text") or "").strip()
-                    if not donem_key:
-                        donem_key = f"{item.get('display_hesap_donemi') or item.get('hesap_donemi')} - {item.get('display_donem_turu') or item.get('donem_turu')}"
-                    rec = donem_summary_totals.get(donem_key)
-                    if not rec:
-                        rec = {
-                            "donem_text": donem_key,
-                            "hesap_donemi": item.get("display_hesap_donemi") or item.get("hesap_donemi"),
-                            "donem_turu": item.get("display_donem_turu") or item.get("donem_turu"),
-                            "belge_count": 0,
-                            "belgeler": set(),
-                            "indirimli_matrah": 0.0,
-                            "indirimli_kv": 0.0,
-                            "yatirim_katki": 0.0,
-                            "diger_katki": 0.0,
-                            "toplam_katki": 0.0,
-                        }
-                        donem_summary_totals[donem_key] = rec
-                    rec["belgeler"].add(str(bno))
-                    rec["belge_count"] = len(rec["belgeler"])
-                    rec["indirimli_matrah"] += _float0(item.get("indirimli_matrah"))
-                    rec["indirimli_kv"] += _float0(item.get("indirimli_kv"))
-                    rec["yatirim_katki"] += _float0(item.get("cari_yatirim_katki"))
-                    rec["diger_katki"] += _float0(item.get("cari_diger_katki"))
-                    rec["toplam_katki"] += _float0(item.get("cari_toplam_katki"))
-
-                # Donem Hesabi sekmesi icin: belge bazinda toplam indirimli matrah ve
-                # secili donem icin kullanilan toplam indirimli matrah / indirimli KV
-                try:
-                    import re as _re
+        if page_data is not None:
+            all_k = page_data["kullanim"]
+        else:
+            with get_conn() as conn_k:
+                cur_k = conn_k.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+                all_k = fetch_kullanim(cur_k, user_id, [d.get("belge_no") for d in docs])
+        if all_k:
+            import re as _usage_re
+            for item in all_k:
+                item["display_hesap_donemi"] = item.get("hesap_donemi")
+                item["display_donem_turu"] = item.get("donem_turu")
+                m = _usage_re.match(r"^(\d{4})\s*-\s*(.+)$", str(item.get("donem_text") or "").strip())
+                if m:
+                    try:
+                        item["display_hesap_donemi"] = int(m.group(1))
+                    except Exception:
+                        item["display_hesap_donemi"] = m.group(1)
+                    item["display_donem_turu"] = m.group(2).strip().upper()
+            for item in all_k:
+                bno = item["belge_no"]
+                if bno not in kullanimlar:
+                    kullanimlar[bno] = []
+                kullanimlar[bno].append(item)
 
-                    active_text = session.get("active_donem_text")
-                    active_yil = None
-                    active_turu = None
-                    if active_text:
-                        m = _re.match(r"^(\\d{4})\\s*-\\s*(.+)$", str(active_text).strip())
-                        if m:
-                            active_yil = int(m.group(1))
-                            active_turu = str(m.group(2)).strip().upper()
+                donem_key = str(item.get("donem_text") or "").strip()
+                if not donem_key:
+                    donem_key = f"{item.get('display_hesap_donemi') or item.get('hesap_donemi')} - {item.get('display_donem_turu') or item.get('donem_turu')}"
+                rec = donem_summary_totals.get(donem_key)
+                if not rec:
+                    rec = {
+                        "donem_text": donem_key,
+                        "hesap_donemi": item.get("display_hesap_donemi") or item.get("hesap_donemi"),
+                        "donem_turu": item.get("display_donem_turu") or item.get("donem_turu"),
+                        "belge_count": 0,
+                        "belgeler": set(),
+                        "indirimli_matrah": 0.0,
+                        "indirimli_kv": 0.0,
+                        "yatirim_katki": 0.0,
+                        "diger_katki": 0.0,
+                        "toplam_katki": 0.0,
+                    }
+                    donem_summary_totals[donem_key] = rec
+                rec["belgeler"].add(str(bno))
+                rec["belge_count"] = len(rec["belgeler"])
+                rec["indirimli_matrah"] += _float0(item.get("indirimli_matrah"))
+                rec["indirimli_kv"] += _float0(item.get("indirimli_kv"))
+                rec["yatirim_katki"] += _float0(item.get("cari_yatirim_katki"))
+                rec["diger_katki"] += _float0(item.get("cari_diger_katki"))
+                rec["toplam_katki"] += _float0(item.get("cari_toplam_katki"))
 
-                    def _f0(x):
-                        try:
-                            return float(x or 0)
-                        except Exception:
-                            return 0.0
-
-                    for it in all_k:
-                        bno2 = it.get("belge_no")
-                        if not bno2:
-                            continue
-                        drec = donem_usage_by_belge.get(bno2)
-                        if not drec:
-                            drec = {"total_matrah": 0.0}
-                            donem_usage_by_belge[bno2] = drec
-                        drec["total_matrah"] = drec.get("total_matrah", 0.0) + _f0(it.get("indirimli_matrah"))
-
-                        if active_yil is not None and active_turu:
-                            if int(it.get("hesap_donemi") or 0) == active_yil and str(it.get("donem_turu") or "").upper() == active_turu:
-                                donem_usage_totals["used_matrah"] += _f0(it.get("indirimli_matrah"))
-                                donem_usage_totals["ind_kv"] += _f0(it.get("indirimli_kv"))
-                except Exception:
-                    # Bu ozet veriler kritik degil; hata olursa tablo 0 gosterir.
-                    pass
+            # Donem Hesabi sekmesi icin: belge bazinda toplam indirimli matrah ve
+            # secili donem icin kullanilan toplam indirimli matrah / indirimli KV
+            try:
+                import re as _re
+
+                active_text = session.get("active_donem_text")
+                active_yil = None
+                active_turu = None
+                if active_text:
+                    m = _re.match(r"^(\\d{4})\\s*-\\s*(.+)$", str(active_text).strip())
+                    if m:
+                        active_yil = int(m.group(1))
+                        active_turu = str(m.group(2)).strip().upper()
+
+                def _f0(x):
+                    try:
+                        return float(x or 0)
+                    except Exception:
+                        return 0.0
+
+                for it in all_k:
+                    bno2 = it.get("belge_no")
+                    if not bno2:
+                        continue
+                    drec = donem_usage_by_belge.get(bno2)
+                    if not drec:
+                        drec = {"total_matrah": 0.0}
+                        donem_usage_by_belge[bno2] = drec
+                    drec["total_matrah"] = drec.get("total_matrah", 0.0) + _f0(it.get("indirimli_matrah"))
+
+                    if active_yil is not None and active_turu:
+                        if int(it.get("hesap_donemi") or 0) == active_yil and str(it.get("donem_turu") or "").upper() == active_turu:
+                            donem_usage_totals["used_matrah"] += _f0(it.get("indirimli_matrah"))
+                            donem_usage_totals["ind_kv"] += _f0(it.get("indirimli_kv"))
+            except Exception:
+                # Bu ozet veriler kritik degil; hata olursa tablo 0 gosterir.
+                pass
     elif docs:
         import re as _usage_re
         active_text = session.get("active_donem_text")
@@ -1434,10 +1360,7 @@ def render_indirimlikurumlar(sekme_override=None, seo_context=None):
             rec["belgeler"] = ", ".join(sorted(rec.get("belgeler") or []))
         donem_summary_list = sorted(
             donem_summary_totals.values(),
-            key=lambda r: (
-                int(r.get("hesap_donemi") or 0),
-                _donem_rank(r.get("donem_turu")),
-            ),
+            key=lambda r: _period_key(r.get("hesap_donemi"), r.get("donem_turu")),
             reverse=True,
         )
     except Exception:
@@ -1490,7 +1413,7 @@ def render_indirimlikurumlar(sekme_override=None, seo_context=None):
     rows = []
     if sekme == "ayrintili":
         try:
-            df = get_user_profit_df(user_id if user_id else -1)
+            df = user_df if user_df is not None else get_user_profit_df(user_id if user_id else -1)
             rows = format_df_for_html(df)
         except Exception as e:
             rows = []
@@ -1515,7 +1438,7 @@ def render_indirimlikurumlar(sekme_override=None, seo_context=None):
     initial_ayrintili_ratios = {}
     if sekme == "ayrintili":
         try:
-            df = get_user_profit_df(user_id if user_id else -1)
+            df = user_df if user_df is not None else get_user_profit_df(user_id if user_id else -1)
             initial_ayrintili_ratios = {
                 c: f"{df.at[54, c]:.2f}".replace(".", ",") + "%"
                 if not pd.isna(df.at[54, c])
@@ -1550,21 +1473,24 @@ def render_indirimlikurumlar(sekme_override=None, seo_context=None):
         }
 
     if sekme == "ozelgeler":
-        data = load_ozelge_index(current_app.root_path)
+        repo = get_ozelge_repository(current_app.root_path)
+        data = repo.data
         q = (request.args.get("q") or "").strip().lower()
         konu = (request.args.get("konu") or "").strip()
-        items = data.get("items", [])
+        items = repo.items
 
         if q:
-            items = search_ozelgeler(items, q)
+            items = repo.search(q)
         if konu:
             if konu.startswith("sc:"):
                 scenario_query = konu[3:]
-                items = search_ozelgeler(items, scenario_query)
+                items = repo.search(scenario_query, items=items)
+            elif not q:
+                items = repo.by_topic.get(konu, [])
             else:
                 items = [item for item in items if konu in item.get("topics", [])]
 
-        topics = sorted({topic for item in data.get("items", []) for topic in item.get("topics", [])})
+        topics = repo.topics
         popular_topics = [topic for topic in POPULAR_TOPICS if topic in topics]
         selected_topic = konu
         
@@ -1919,43 +1845,7 @@ def form_kaydet():
 
 def get_all_tesvik_docs(user_id: int, mukellef_id: int = None):
     """Kullanıcının teşvik belgelerini ve dönemlerini döndürür."""
-    with get_conn() as conn:
-        c = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-        # 🔹 1) Eğer mükellef filtresi varsa ona göre çek
-        if mukellef_id:
-            c.execute("""
-                SELECT *
-                FROM tesvik_belgeleri
-                WHERE user_id = %s AND mukellef_id = %s
-                ORDER BY id DESC
-            """, (user_id, mukellef_id))
-        else:
-            c.execute("""
-                SELECT *
-                FROM tesvik_belgeleri
-                WHERE user_id = %s
-                ORDER BY id DESC
-            """, (user_id,))
-
-        docs = c.fetchall()
-        if not docs:
-            return []
-
-        # 🔹 2) Her belgeye dönem listesini ekle
-        for d in docs:
-            belge_no = d["belge_no"]
-
-            c.execute("""
-                SELECT hesap_donemi, donem_turu
-                FROM tesvik_kullanim
-                WHERE user_id = %s AND belge_no = %s
-                ORDER BY hesap_donemi ASC
-            """, (user_id, belge_no))
-
-            d["donemler"] = c.fetchall() or []
-
-        return docs
+    return load_tesvik_docs(user_id, mukellef_id)
 
 
 
@@ -1968,11 +1858,8 @@ def delete_tesvik(doc_id):
     """Bir teşvik belgesini ve ona bağlı dönem kayıtlarını güvenli şekilde siler."""
     user_id = session.get("user_id")
     if not user_id:
-        docs = _guest_list("guest_tesvik_docs")
-        remaining = [d for d in docs if int(d.get("id") or 0) != int(doc_id)]
-        if len(remaining) == len(docs):
+        if not guest_workspace.delete_item(GUEST_DOCS, doc_id):
             return jsonify({"status": "error", "title": "Bulunamadı", "message": "Belge bulunamadı."}), 404
-        session["guest_tesvik_docs"] = remaining
         if int(session.get("active_tesvik_id") or 0) == int(doc_id):
             session.pop("active_tesvik_id", None)
             session.pop("current_tesvik_id", None)
@@ -2017,6 +1904,7 @@ def delete_tesvik(doc_id):
                 DELETE FROM tesvik_kullanim
                 WHERE user_id=%s AND belge_no=%s
             """, (user_id, belge_no))
+            defter_sil(c, user_id, belge_no)
 
             # ----------------------------------------------------------
             # 4) Sonra belgenin kendisini sil
@@ -2287,7 +2175,7 @@ def download_tesvik_donem_pdf(kullanim_id):
 
     if not user_id:
         data_dict = None
-        for doc in _guest_list("guest_tesvik_docs"):
+        for doc in _guest_list(GUEST_DOCS):
             for item in doc.get("donemler") or []:
                 if int(item.get("id") or 0) == int(kullanim_id):
                     data_dict = {**doc, **item}
@@ -2508,12 +2396,12 @@ def save_tesvik_kullanim():
                     }), 400
 
             active_pool = next(
-                (r for r in _guest_list("guest_donem_matrah_list") if str(r.get("donem_text") or "").strip() == donem_text),
+                (r for r in _guest_list(GUEST_DONEM_MATRAH) if str(r.get("donem_text") or "").strip() == donem_text),
                 None,
             )
             donem_matrah_chk = _num_for_json((active_pool or {}).get("kv_matrah"))
             diger_belgeler_matrah = 0.0
-            for other in _guest_list("guest_tesvik_docs"):
+            for other in _guest_list(GUEST_DOCS):
                 if str(other.get("belge_no") or "") == str(belge_no):
                     continue
                 for item in other.get("donemler") or []:
@@ -2805,24 +2693,39 @@ def save_tesvik_kullanim():
         # Sayısal değerleri çek ve sadece effective_fields listesindekileri kullan
         values = [float(data.get(f, 0) or 0) for f in effective_fields]
 
+        # Dönem anahtarı defterle aynı kuralla: donem_text öncelikli (services.donem.kullanim_donemi)
+        anahtar = kullanim_anahtari(donem_text if "donem_text" in existing else None, hesap_donemi, donem_turu)
+
         with get_conn() as conn:
             cur = conn.cursor()
 
+            # Kayıt önceden başka bir dönem metniyle (başka anahtarla) yazıldıysa defter oradan yeniden yazılır
+            cur.execute(
+                """
+                SELECT MIN(donem_anahtari) AS anahtar
+                FROM tesvik_kullanim
+                WHERE user_id = %s AND belge_no = %s AND hesap_donemi = %s AND UPPER(donem_turu) = %s
+                """,
+                (user_id, belge_no, hesap_donemi, str(donem_turu).upper()),
+            )
+            onceki_anahtar = (cur.fetchone() or {}).get("anahtar")
+
             # SQL sorgusu, sadece tabloda var olan sütunları kullanır.
             cur.execute(f"""
                 INSERT INTO tesvik_kullanim (
-                    user_id, belge_no, hesap_donemi, donem_turu,
+                    user_id, belge_no, hesap_donemi, donem_turu, donem_anahtari,
                     {", ".join(effective_fields)}
                 )
                 VALUES (
-                    %s, %s, %s, %s,
+                    %s, %s, %s, %s, %s,
                     {", ".join(["%s"] * len(effective_fields))}
                 )
                 ON CONFLICT (user_id, belge_no, hesap_donemi, donem_turu)
                 DO UPDATE SET
                     {", ".join([f"{col} = EXCLUDED.{col}" for col in effective_fields])},
+                    donem_anahtari = EXCLUDED.donem_anahtari,
                     kayit_tarihi = CURRENT_TIMESTAMP;
-            """, (user_id, belge_no, hesap_donemi, donem_turu, *values))
+            """, (user_id, belge_no, hesap_donemi, donem_turu, anahtar, *values))
 
             if "donem_text" in existing:
                 cur.execute(
@@ -2837,6 +2740,7 @@ def save_tesvik_kullanim():
                     (donem_text, user_id, belge_no, hesap_donemi, str(donem_turu).upper()),
                 )
 
+            defter_guncelle(cur, user_id, belge_no, min(anahtar, onceki_anahtar or anahtar))
             conn.commit()
 
         return jsonify({
@@ -2891,6 +2795,7 @@ def clone_tesvik_donem():
             donem_turu = "KURUMLAR"
 
         donem_turu = donem_turu.upper()
+        anahtar = kullanim_anahtari(donem_text, hesap_donemi, donem_turu)
 
         # ======================================================
         # 🔍 Önceki dönem değerlerini çek
@@ -2915,9 +2820,10 @@ def clone_tesvik_donem():
                 FROM tesvik_kullanim
                 WHERE user_id = %s 
                   AND belge_no = %s
-                ORDER BY hesap_donemi DESC, donem_turu DESC
+                  AND donem_anahtari < %s
+                ORDER BY donem_anahtari DESC, id DESC
                 LIMIT 1
-            """, (user_id, belge_no))
+            """, (user_id, belge_no, anahtar))
 
             prev = cur.fetchone()
             
@@ -2935,17 +2841,18 @@ def clone_tesvik_donem():
             # ======================================================
             cur.execute(f"""
                 INSERT INTO tesvik_kullanim (
-                    user_id, belge_no, hesap_donemi, donem_turu,
+                    user_id, belge_no, hesap_donemi, donem_turu, donem_anahtari,
                     {", ".join(clone_fields)}
                 )
                 VALUES (
-                    %s, %s, %s, %s,
+                    %s, %s, %s, %s, %s,
                     {", ".join(["%s"]*len(clone_fields))}
                 )
                 ON CONFLICT (user_id, belge_no, hesap_donemi, donem_turu) 
                 DO NOTHING;
-            """, (user_id, belge_no, hesap_donemi, donem_turu, *prev_vals))
+            """, (user_id, belge_no, hesap_donemi, donem_turu, anahtar, *prev_vals))
 
+            defter_guncelle(cur, user_id, belge_no, anahtar)
             conn.commit()
 
         return jsonify({
@@ -3004,6 +2911,16 @@ def delete_tesvik_donem():
         with get_conn() as conn:
             cur = conn.cursor()
 
+            cur.execute("""
+                SELECT MIN(donem_anahtari) AS anahtar
+                FROM tesvik_kullanim
+                WHERE user_id = %s
+                  AND belge_no = %s
+                  AND hesap_donemi = %s
+                  AND UPPER(donem_turu) = %s
+            """, (user_id, belge_no, hesap_donemi, donem_turu))
+            silinen_anahtar = (cur.fetchone() or {}).get("anahtar")
+
             cur.execute("""
                 DELETE FROM tesvik_kullanim
                 WHERE user_id = %s 
@@ -3014,6 +2931,8 @@ def delete_tesvik_donem():
 
             # Kaç satırın silindiğini kontrol etmek isterseniz (opsiyonel)
             row_count = cur.rowcount
+            if row_count:
+                defter_guncelle(cur, user_id, belge_no, silinen_anahtar)
             conn.commit()
 
         if row_count == 0:
@@ -3255,202 +3174,195 @@ def get_onceki_katki(tesvik_id: int):
     Seçilen dönemin (yıl + tür) öncesindeki dönemlerde kullanılan katkıları toplar.
     """
     from flask import jsonify
-    import re
 
     user_id = session.get("user_id")
     donem = (request.args.get("donem") or "").strip()
     if not donem or " - " not in donem:
         return jsonify({"status": "error", "message": "donem parametresi gerekli."}), 400
 
-    def _period_order(value):
-        text = str(value or "").strip().upper()
-        if "KURUMLAR" in text:
-            return 5
-        for idx in (1, 2, 3, 4):
-            if str(idx) in text:
-                return idx
-        return 99
-
-    def _parse_period(value, fallback_year=None, fallback_type=None):
-        text = str(value or "").strip()
-        match = re.match(r"^(\d{4})\s*-\s*(.+)$", text)
-        if match:
-            return match.group(1).strip(), match.group(2).strip()
-        return fallback_year, fallback_type
-
-    yil_str, turu = _parse_period(donem)
+    # Defter anahtarı ve ziyaretçi satırları aynı dönem kuralıyla (services.donem.kullanim_donemi)
+    yil_str, turu = kullanim_donemi(donem)
     try:
         yil = int(yil_str)
     except Exception:
         return jsonify({"status": "error", "message": "donem yil formatı geçersiz."}), 400
 
-    cur_order = _period_order(turu)
-
-    if not user_id:
-        doc = _guest_find_doc(doc_id=tesvik_id)
-        if not doc:
-            return jsonify({"status": "error", "message": "Yetkisiz erişim."}), 403
-
-        rows = doc.get("donemler") or []
-        onceki_yatirim = 0.0
-        onceki_diger = 0.0
-        debug_rows = []
-        for r in rows:
-            ry, rt = _parse_period(
-                r.get("donem_text"),
-                r.get("hesap_donemi") or r.get("donem_yil"),
-                r.get("donem_turu"),
-            )
-            try:
-                ry_i = int(ry)
-            except Exception:
-                continue
-            ro = _period_order(rt)
-            cy = r.get("cari_yatirim_katki") or 0
-            cd = r.get("cari_diger_katki") or 0
-            if (ry_i < yil) or (ry_i == yil and ro < cur_order):
-                onceki_yatirim += float(cy or 0)
-                onceki_diger += float(cd or 0)
-            if len(debug_rows) < 10:
-                debug_rows.append({
-                    "donem_text": r.get("donem_text"),
-                    "yil": ry,
-                    "turu": rt,
-                    "cy": float(cy or 0),
-                    "cd": float(cd or 0),
-                })
-
+    def _onceki_yanit(belge_no, onceki_yatirim, onceki_diger, debug):
         return jsonify({
             "status": "success",
             "onceki_yatirim_katki_tutari": onceki_yatirim,
             "onceki_diger_katki_tutari": onceki_diger,
             "onceki_katki_tutari": onceki_yatirim + onceki_diger,
-            "_debug": {
-                "belge_no": doc.get("belge_no"),
-                "donem": donem,
-                "rows_count": len(rows),
-                "rows_sample": debug_rows,
-            },
+            # debug (front'ta console'da görebilmek için)
+            "_debug": {"belge_no": belge_no, "donem": donem, **debug},
         }), 200
 
+    if not user_id:
+        doc = _guest_find_doc(doc_id=tesvik_id)
+        if not doc:
+            return jsonify({"status": "error", "message": "Yetkisiz erişim."}), 403
+
+        donemler = []
+        for r in doc.get("donemler") or []:
+            ry, rt = kullanim_donemi(r.get("donem_text"), r.get("hesap_donemi"), r.get("donem_turu"))
+            if str(ry or "").isdigit():
+                donemler.append((int(ry), rt, r.get("cari_yatirim_katki"), r.get("cari_diger_katki")))
+        onceki_yatirim, onceki_diger = KatkiGecmisi(donemler).onceki(yil, turu)
+        return _onceki_yanit(doc.get("belge_no"), onceki_yatirim, onceki_diger, {"rows_count": len(donemler)})
+
+    # Yetki kontrolü + seçilen dönemden önceki son defter satırı (tek indeksli okuma)
     with get_conn() as conn:
         cur = conn.cursor()
-
-        # Yetki kontrolü + belge_no bul
         cur.execute(
-            "SELECT belge_no FROM tesvik_belgeleri WHERE id=%s AND user_id=%s",
-            (tesvik_id, user_id),
+            """
+            SELECT b.belge_no, d.donem_anahtari, d.kum_yatirim_katki, d.kum_diger_katki
+            FROM tesvik_belgeleri b
+            LEFT JOIN tesvik_katki_defteri d
+              ON d.user_id = b.user_id AND d.belge_no = b.belge_no
+             AND d.donem_anahtari = (
+                 SELECT MAX(donem_anahtari) FROM tesvik_katki_defteri
+                 WHERE user_id = b.user_id AND belge_no = b.belge_no AND donem_anahtari < %s
+             )
+            WHERE b.id = %s AND b.user_id = %s
+            """,
+            (kullanim_anahtari(donem), tesvik_id, user_id),
         )
         row = cur.fetchone()
-        if not row:
-            return jsonify({"status": "error", "message": "Yetkisiz erişim."}), 403
-        belge_no = row[0] if not isinstance(row, dict) else row.get("belge_no")
+    if not row:
+        return jsonify({"status": "error", "message": "Yetkisiz erişim."}), 403
 
-        # Ortamlar arası sütun farklarını tolere et (eski şemalarda donem_yil/donem_turu olabilir)
-        rows = []
-        try:
-            cur.execute(
-                """
-                SELECT hesap_donemi, donem_turu, donem_text,
-                       COALESCE(cari_yatirim_katki,0) AS cy,
-                       COALESCE(cari_diger_katki,0) AS cd
-                FROM tesvik_kullanim
-                WHERE user_id=%s AND belge_no=%s
-                """,
-                (user_id, belge_no),
-            )
-            rows = cur.fetchall() or []
-        except Exception:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-            cur.execute(
-                """
-                SELECT donem_yil, donem_turu, NULL AS donem_text,
-                       COALESCE(cari_yatirim_katki,0) AS cy,
-                       COALESCE(cari_diger_katki,0) AS cd
-                FROM tesvik_kullanim
-                WHERE user_id=%s AND belge_no=%s
-                """,
-                (user_id, belge_no),
-            )
-            rows = cur.fetchall() or []
-
-    onceki_yatirim = 0.0
-    onceki_diger = 0.0
-
-    for r in (rows or []):
-        # sqlite -> tuple, postgres RealDictCursor -> dict
-        if isinstance(r, dict):
-            ry, rt = _parse_period(
-                r.get("donem_text"),
-                r.get("hesap_donemi") or r.get("donem_yil"),
-                r.get("donem_turu"),
-            )
-            cy = r.get("cy") if ("cy" in r) else r.get("cari_yatirim_katki")
-            cd = r.get("cd") if ("cd" in r) else r.get("cari_diger_katki")
-        else:
-            ry, rt = _parse_period(r[2] if len(r) > 4 else None, r[0], r[1])
-            cy = r[3] if len(r) > 4 else r[2]
-            cd = r[4] if len(r) > 4 else r[3]
+    return _onceki_yanit(
+        row["belge_no"],
+        float(row["kum_yatirim_katki"] or 0),
+        float(row["kum_diger_katki"] or 0),
+        {"defter_donem_anahtari": row["donem_anahtari"]},
+    )
 
-        try:
-            ry_i = int(ry)
-        except Exception:
-            continue
 
-        ro = _period_order(rt)
-        if (ry_i < yil) or (ry_i == yil and ro < cur_order):
-            onceki_yatirim += float(cy or 0)
-            onceki_diger += float(cd or 0)
+SENARYO_LIMIT = 10000
+SENARYO_AZAMI_YIL = 50
+
+
+@bp.route("/api/senaryo/<int:tesvik_id>", methods=["POST"])
+def tesvik_senaryo(tesvik_id: int):
+    """
+    Yatırım planlaması: belgenin kalan katkısının gelecek yıllara dağılımını
+    kazanç senaryoları ızgarası için tek çağrıda hesaplar.
+
+    JSON: baz_kazanclar (liste) + buyume_oranlari (yüzde, liste) + yil_sayisi
+    ızgarası veya doğrudan kazanclar (senaryo × yıl matrisi); isteğe bağlı
+    baslangic_yili, satis_paylari {ihracat, imalat, diger} ve yillik (bool).
+    """
+    user_id = session.get("user_id")
+    data = request.get_json(silent=True) or {}
+
+    if not user_id:
+        doc = _guest_find_doc(doc_id=tesvik_id)
+        if not doc:
+            return jsonify({"status": "error", "message": "Yetkisiz erişim."}), 403
+        donemler = [
+            (*kullanim_donemi(d.get("donem_text"), d.get("hesap_donemi"), d.get("donem_turu")),
+             d.get("cari_yatirim_katki"), d.get("cari_diger_katki"))
+            for d in doc.get("donemler") or []
+        ]
+        kullanilan = sum(KatkiGecmisi(d for d in donemler if str(d[0] or "").isdigit()).toplam())
+    else:
+        with get_conn() as conn:
+            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            cur.execute("SELECT * FROM tesvik_belgeleri WHERE id = %s AND user_id = %s", (tesvik_id, user_id))
+            doc = cur.fetchone()
+            if not doc:
+                return jsonify({"status": "error", "message": "Yetkisiz erişim."}), 403
+            cur.execute("""
+                SELECT kum_yatirim_katki + kum_diger_katki AS kullanilan
+                FROM tesvik_katki_defteri
+                WHERE user_id = %s AND belge_no = %s
+                ORDER BY donem_anahtari DESC
+                LIMIT 1
+            """, (user_id, doc["belge_no"]))
+            son = cur.fetchone()
+        kullanilan = float((son or {}).get("kullanilan") or 0)
 
-    # Debug: ilk birkaç satırı döndür (sadece sayısal özet)
-    debug_rows = []
     try:
-        for r in (rows[:10] if isinstance(rows, list) else []):
-            if isinstance(r, dict):
-                ry, rt = _parse_period(
-                    r.get("donem_text"),
-                    r.get("hesap_donemi") or r.get("donem_yil"),
-                    r.get("donem_turu"),
-                )
-                debug_rows.append({
-                    "donem_text": r.get("donem_text"),
-                    "yil": ry,
-                    "turu": rt,
-                    "cy": float(r.get("cy") or 0),
-                    "cd": float(r.get("cd") or 0),
-                })
-            else:
-                ry, rt = _parse_period(r[2] if len(r) > 4 else None, r[0], r[1])
-                cy = r[3] if len(r) > 4 else r[2]
-                cd = r[4] if len(r) > 4 else r[3]
-                debug_rows.append({
-                    "donem_text": r[2] if len(r) > 4 else None,
-                    "yil": ry,
-                    "turu": rt,
-                    "cy": float(cy or 0),
-                    "cd": float(cd or 0),
-                })
-    except Exception:
-        debug_rows = []
+        yil_sayisi = int(data.get("yil_sayisi") or 10)
+        baslangic_yili = int(data.get("baslangic_yili") or datetime.now().year)
+        if data.get("kazanclar"):
+            kazanclar = [[_num_for_json(v) for v in satir] for satir in data["kazanclar"]]
+            yil_sayisi = len(kazanclar[0]) if kazanclar else 0
+            if any(len(satir) != yil_sayisi for satir in kazanclar):
+                raise ValueError("kazanclar satırları aynı uzunlukta olmalı.")
+            baz, buyume = [], []
+        else:
+            baz = [_num_for_json(v) for v in data.get("baz_kazanclar") or []]
+            buyume = [_num_for_json(v) / 100 for v in data.get("buyume_oranlari") or [0]]
+            kazanclar = kazanc_gridi(baz, buyume, yil_sayisi) if baz else []
+        satis_paylari = {k: _num_for_json(v) for k, v in (data.get("satis_paylari") or {}).items()} or None
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Geçersiz senaryo parametresi: {e}"}), 400
+
+    senaryo_sayisi = len(kazanclar)
+    if not senaryo_sayisi or not 0 < yil_sayisi <= SENARYO_AZAMI_YIL:
+        return jsonify({"status": "error", "message": f"En az bir senaryo ve 1-{SENARYO_AZAMI_YIL} yıl gerekli."}), 400
+    if senaryo_sayisi > SENARYO_LIMIT:
+        return jsonify({"status": "error", "message": f"En fazla {SENARYO_LIMIT} senaryo hesaplanabilir."}), 400
+
+    # 2025/9903: ilk indirim yılı dahil 10 hesap dönemi sınırı
+    kullanilabilir_yil = None
+    if doc.get("karar") == "2025/9903":
+        belge_alinma_dt = _parse_date_any(doc.get("belge_alinma_tarihi"))
+        limitleri_uygula = not (belge_alinma_dt and belge_alinma_dt.date() < datetime(2025, 7, 24).date())
+        allowed_year = None
+        if str(doc.get("ilk_indirim_yili") or "").isdigit():
+            allowed_year = int(doc.get("ilk_indirim_yili"))
+        for tarih_key in ("belge_tarihi", "basvuru_tarihi", "belge_alinma_tarihi"):
+            if allowed_year:
+                break
+            dt = _parse_date_any(doc.get(tarih_key))
+            if dt:
+                allowed_year = int(dt.year)
+        if limitleri_uygula and allowed_year:
+            kullanilabilir_yil = allowed_year + 10 - baslangic_yili
+
+    kalan_katki = max(0.0, _num_for_json(doc.get("katki_tutari")) - kullanilan)
+    sonuc = senaryo_projeksiyonu(
+        kalan_katki,
+        kazanclar,
+        _num_for_json(doc.get("vergi_orani")) / 100,
+        satis_paylari=satis_paylari,
+        kullanilabilir_yil=kullanilabilir_yil,
+    )
 
-    return jsonify(
-        {
-            "status": "success",
-            "onceki_yatirim_katki_tutari": onceki_yatirim,
-            "onceki_diger_katki_tutari": onceki_diger,
-            "onceki_katki_tutari": onceki_yatirim + onceki_diger,
-            # debug (front'ta console'da görebilmek için)
-            "_debug": {
-                "belge_no": belge_no,
-                "donem": donem,
-                "rows_count": len(rows),
-                "rows_sample": debug_rows,
-            },
+    yillar = list(range(baslangic_yili, baslangic_yili + yil_sayisi))
+    toplam = sonuc["toplam_katki"].round(2).tolist()
+    kalan_son = sonuc["kalan_son"].round(2).tolist()
+    bitis = sonuc["bitis_yili"].tolist()
+    senaryolar = []
+    for i in range(senaryo_sayisi):
+        item = {
+            "toplam_katki": toplam[i],
+            "kalan_katki": kalan_son[i],
+            "bitis_yili": yillar[bitis[i]] if bitis[i] >= 0 else None,
+        }
+        if baz:
+            item["baz_kazanc"] = baz[i // len(buyume)]
+            item["buyume_orani"] = round(buyume[i % len(buyume)] * 100, 4)
+        senaryolar.append(item)
+
+    yanit = {
+        "status": "success",
+        "belge_no": doc.get("belge_no"),
+        "kalan_katki": round(kalan_katki, 2),
+        "yillar": yillar,
+        "kullanilabilir_yil": kullanilabilir_yil,
+        "senaryo_sayisi": senaryo_sayisi,
+        "senaryolar": senaryolar,
+    }
+    if data.get("yillik"):
+        yanit["yillik"] = {
+            key: sonuc[key].round(2).tolist()
+            for key in ("cari_katki", "indirimli_matrah", "indirimli_kv", "kalan_katki")
         }
-    ), 200
+    return jsonify(yanit), 200
 
 # ----------------------------------------------------
 # 🗑️ SİLME İŞLEMLERİ (YENİ EKLENEN)
@@ -3466,11 +3378,8 @@ def tesvik_sil(id):
 
     try:
         if not user_id:
-            docs = _guest_list("guest_tesvik_docs")
-            remaining = [d for d in docs if int(d.get("id") or 0) != int(id)]
-            if len(remaining) == len(docs):
+            if not guest_workspace.delete_item(GUEST_DOCS, id):
                 return jsonify({"status": "error", "message": "Silinecek belge bulunamadı."}), 404
-            session["guest_tesvik_docs"] = remaining
             if int(session.get("active_tesvik_id") or 0) == int(id):
                 session.pop("active_tesvik_id", None)
                 session.pop("current_tesvik_id", None)
@@ -3493,7 +3402,7 @@ def tesvik_sil(id):
                     "message": "Silinecek belge bulunamadı veya yetkiniz yok."
                 }), 404
 
-            del_id, belge_no = row
+            belge_no = row["belge_no"]
             
             # 1. Bağlı Kullanım Kayıtlarını Sil (belge_no ile bağlılarsa)
             if belge_no:
@@ -3501,6 +3410,7 @@ def tesvik_sil(id):
                     DELETE FROM tesvik_kullanim 
                     WHERE belge_no = %s AND user_id = %s
                 """, (belge_no, user_id))
+                 defter_sil(c, user_id, belge_no)
 
             # 2. Belgeyi Sil
             c.execute("DELETE FROM tesvik_belgeleri WHERE id = %s", (id,))
@@ -3531,27 +3441,27 @@ def delete_tesvik_kullanim(id):
 
     try:
         if not user_id:
-            docs = _guest_list("guest_tesvik_docs")
-            found = False
-            for doc in docs:
+            for doc in _guest_list(GUEST_DOCS):
                 items = doc.get("donemler") or []
                 kept = [x for x in items if int(x.get("id") or 0) != int(id)]
                 if len(kept) != len(items):
                     doc["donemler"] = kept
-                    found = True
+                    _guest_save_doc(doc)
                     break
-            if not found:
+            else:
                 return jsonify({"status": "error", "message": "Silinecek dönem kaydı bulunamadı."}), 404
-            session["guest_tesvik_docs"] = docs
-            session.modified = True
             return jsonify({"status": "success", "message": "Dönem kaydı silindi."})
 
         with get_conn() as conn:
             c = conn.cursor()
             
             # Kaydın varlığını kontrol et
-            c.execute("SELECT id FROM tesvik_kullanim WHERE id = %s AND user_id = %s", (id, user_id))
-            if not c.fetchone():
+            c.execute(
+                "SELECT belge_no, donem_anahtari FROM tesvik_kullanim WHERE id = %s AND user_id = %s",
+                (id, user_id),
+            )
+            kayit = c.fetchone()
+            if not kayit:
                 return jsonify({
                     "status": "error",
                     "message": "Silinecek dönem kaydı bulunamadı."
@@ -3559,6 +3469,7 @@ def delete_tesvik_kullanim(id):
 
             # Sil
             c.execute("DELETE FROM tesvik_kullanim WHERE id = %s", (id,))
+            defter_guncelle(c, user_id, kayit["belge_no"], kayit["donem_anahtari"])
             conn.commit()
             ("️     ")
 
@@ -3603,7 +3514,7 @@ def save_donem_matrah():
             return jsonify({"status": "error", "message": "Dönem bilgisi eksik."}), 400
 
         if not user_id or not mukellef_id:
-            rows = _guest_list("guest_donem_matrah_list")
+            rows = _guest_list(GUEST_DONEM_MATRAH)
             existing = next((r for r in rows if r.get("donem_text") == donem_text), None)
             pool_id = int(existing.get("id")) if existing else _guest_next_id("guest_donem_next_id")
             row = {
@@ -3620,9 +3531,7 @@ def save_donem_matrah():
                 "sabit_kiymet_toplam": sabit_toplam,
                 "sabit_kiymet_json": sabit_json or "{}",
             }
-            rows = [r for r in rows if r.get("donem_text") != donem_text]
-            rows.append(row)
-            session["guest_donem_matrah_list"] = rows
+            guest_workspace.save_item(GUEST_DONEM_MATRAH, row)
             session["active_donem_text"] = donem_text
             session.modified = True
             return jsonify({"status": "success", "id": pool_id, "donem_text": donem_text})
@@ -3633,20 +3542,22 @@ def save_donem_matrah():
             except Exception:
                 cur = conn.cursor()
 
+            anahtar = donem_anahtari(hesap_donemi, donem_turu)
             is_sqlite = ("sqlite3" in str(type(conn)).lower()) or ("sqlite" in str(type(conn)).lower())
 
             if is_sqlite:
                 cur.execute(
                     """
                     INSERT INTO donem_matrah (
-                        user_id, mukellef_id, donem_text, hesap_donemi, donem_turu,
+                        user_id, mukellef_id, donem_text, hesap_donemi, donem_turu, donem_anahtari,
                         ticari_bilanco_kari, kkeg, indirim_istisna, gecmis_yil_zarari, kv_matrah, genel_oran,
                         sabit_kiymet_toplam, sabit_kiymet_json
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                     ON CONFLICT(user_id, mukellef_id, donem_text)
                     DO UPDATE SET
                         hesap_donemi=excluded.hesap_donemi,
                         donem_turu=excluded.donem_turu,
+                        donem_anahtari=excluded.donem_anahtari,
                         ticari_bilanco_kari=excluded.ticari_bilanco_kari,
                         kkeg=excluded.kkeg,
                         indirim_istisna=excluded.indirim_istisna,
@@ -3657,7 +3568,7 @@ def save_donem_matrah():
                         sabit_kiymet_json=excluded.sabit_kiymet_json
                     """,
                     (
-                        user_id, mukellef_id, donem_text, hesap_donemi, donem_turu,
+                        user_id, mukellef_id, donem_text, hesap_donemi, donem_turu, anahtar,
                         ticari, kkeg, ind, zarar, matrah, genel_oran,
                         sabit_toplam, sabit_json,
                     ),
@@ -3673,14 +3584,15 @@ def save_donem_matrah():
                 cur.execute(
                     """
                     INSERT INTO donem_matrah (
-                        user_id, mukellef_id, donem_text, hesap_donemi, donem_turu,
+                        user_id, mukellef_id, donem_text, hesap_donemi, donem_turu, donem_anahtari,
                         ticari_bilanco_kari, kkeg, indirim_istisna, gecmis_yil_zarari, kv_matrah, genel_oran,
                         sabit_kiymet_toplam, sabit_kiymet_json
-                    ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+                    ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
                     ON CONFLICT (user_id, mukellef_id, donem_text)
                     DO UPDATE SET
                         hesap_donemi=EXCLUDED.hesap_donemi,
                         donem_turu=EXCLUDED.donem_turu,
+                        donem_anahtari=EXCLUDED.donem_anahtari,
                         ticari_bilanco_kari=EXCLUDED.ticari_bilanco_kari,
                         kkeg=EXCLUDED.kkeg,
                         indirim_istisna=EXCLUDED.indirim_istisna,
@@ -3692,7 +3604,7 @@ def save_donem_matrah():
                     RETURNING id
                     """,
                     (
-                        user_id, mukellef_id, donem_text, hesap_donemi, donem_turu,
+                        user_id, mukellef_id, donem_text, hesap_donemi, donem_turu, anahtar,
                         ticari, kkeg, ind, zarar, matrah, genel_oran,
                         sabit_toplam, sabit_json,
                     ),
@@ -3713,11 +3625,9 @@ def delete_donem_matrah(id):
         user_id = session.get("user_id")
         mukellef_id = session.get("aktif_mukellef_id")
         if not user_id or not mukellef_id:
-            rows = _guest_list("guest_donem_matrah_list")
-            removed = next((r for r in rows if int(r.get("id") or 0) == int(id)), None)
+            removed = guest_workspace.get_item(GUEST_DONEM_MATRAH, id)
             was_active_selection = bool(removed and session.get("active_donem_text") == removed.get("donem_text"))
-            rows = [r for r in rows if int(r.get("id") or 0) != int(id)]
-            session["guest_donem_matrah_list"] = rows
+            guest_workspace.delete_item(GUEST_DONEM_MATRAH, id)
             if was_active_selection:
                 session.pop("active_donem_text", None)
                 session.pop("active_tesvik_id", None)
@@ -3757,7 +3667,7 @@ def select_donem_matrah(id):
         user_id = session.get("user_id")
         mukellef_id = session.get("aktif_mukellef_id")
         if not user_id or not mukellef_id:
-            row = next((r for r in _guest_list("guest_donem_matrah_list") if int(r.get("id") or 0) == int(id)), None)
+            row = guest_workspace.get_item(GUEST_DONEM_MATRAH, id)
             if not row:
                 return jsonify({"status": "error", "message": "Kayıt bulunamadı."}), 404
             session["active_donem_text"] = row["donem_text"]
@@ -3799,7 +3709,7 @@ def select_tesvik_doc(id):
         user_id = session.get("user_id")
         mukellef_id = session.get("aktif_mukellef_id")
         if not user_id or not mukellef_id:
-            doc = next((d for d in _guest_list("guest_tesvik_docs") if int(d.get("id") or 0) == int(id)), None)
+            doc = guest_workspace.get_item(GUEST_DOCS, id)
             if not doc:
                 return jsonify({"status": "error", "message": "Belge bulunamadı."}), 404
             session["active_tesvik_id"] = id
@@ -1,7 +1,12 @@
 from flask import Blueprint, render_template, request, jsonify, session, current_app, flash, redirect, url_for
 from services.db import get_conn
+from services.kdv_stats import get_stats_cached, invalidate_stats, sync_kdv_file_dates
 from auth import login_required, kdv_access_required, api_kdv_access_required, role_required
+from services.auth_context import get_auth_context, invalidate_auth_context, mukellef_scope_sql
+from services.audit_log import kdv_system_log
 import psycopg2.extras
+import base64
+import json
 from datetime import datetime
 
 bp = Blueprint("kdv", __name__)
@@ -46,15 +51,10 @@ STATUS_STAGES = {
 }
 
 # Helper for System Logs - Works for both SQLite and PostgreSQL
+# Satır kuyruğa eklenir ve arka planda toplu yazılır (services/audit_log.py)
 def kdv_log_action(user_name, action, description):
     try:
-        with get_conn() as conn:
-            c = conn.cursor()
-            c.execute("""
-                INSERT INTO kdv_system_logs (date, user_name, action, description)
-                VALUES (%s, %s, %s, %s)
-            """, (datetime.now().strftime("%d.%m.%Y %H:%M"), user_name, action, description))
-            conn.commit()
+        kdv_system_log.write(datetime.now().strftime("%d.%m.%Y %H:%M"), user_name, action, description)
     except Exception as e:
         import traceback
         print(f"KDV Log Error: {e}\n{traceback.format_exc()}")
@@ -130,20 +130,10 @@ def details(file_id):
 @kdv_access_required
 @role_required(allow_roles=("admin", "ymm", "yonetici", "uzman"))
 def mukellef_ozet(mukellef_id):
-    user_id = session.get("user_id")
-    role = session.get("role")
-
     # 🔐 UZMAN → SADECE ATANMIŞ MÜKELLEF
-    if role == "uzman":
-        with get_conn() as conn:
-            c = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            c.execute("""
-                SELECT 1 FROM kdv_user_assignments
-                WHERE user_id = %s AND mukellef_id = %s
-            """, (user_id, mukellef_id))
-            if not c.fetchone():
-                flash("Bu mükellefi görüntüleme yetkiniz yok.", "danger")
-                return redirect(url_for("kdv.mukellefler"))
+    if not get_auth_context().can_access_mukellef(mukellef_id):
+        flash("Bu mükellefi görüntüleme yetkiniz yok.", "danger")
+        return redirect(url_for("kdv.mukellefler"))
 
     with get_conn() as conn:
         c = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
@@ -160,8 +150,7 @@ def mukellef_ozet(mukellef_id):
 @kdv_access_required
 @role_required(allow_roles=("admin", "ymm", "yonetici", "uzman"))
 def mukellefler():
-    user_id = session.get("user_id")
-    role = session.get("role")
+    ctx = get_auth_context()
     
     with get_conn() as conn:
         c = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
@@ -176,7 +165,8 @@ def mukellefler():
         """)
         users_list = [dict(r) for r in c.fetchall()]
 
-        if role in ('admin', 'ymm', 'yonetici'):
+        mukellefler = []
+        if ctx.sees_all_mukellef:
             # Fetch all clients with their assigned usernames
             c.execute("""
                 SELECT m.*, 
@@ -189,9 +179,11 @@ def mukellefler():
                 FROM kdv_mukellef m 
                 ORDER BY m.unvan ASC
             """)
-        else:
+            mukellefler = [dict(r) for r in c.fetchall()]
+        elif ctx.assigned_mukellef_ids:
             # Fetch only assigned clients for this user
-            c.execute("""
+            assigned = sorted(ctx.assigned_mukellef_ids)
+            c.execute(f"""
                 SELECT m.*, 
                        (SELECT COUNT(*) FROM kdv_files WHERE mukellef_id = m.id AND is_active = TRUE) as active_files,
                        (SELECT COALESCE(SUM(amount_request), 0) FROM kdv_files WHERE mukellef_id = m.id AND is_active = TRUE) as total_request,
@@ -200,12 +192,10 @@ def mukellefler():
                         JOIN kdv_user_assignments kua ON kua.user_id = u.id 
                         WHERE kua.mukellef_id = m.id) as assigned_names
                 FROM kdv_mukellef m 
-                JOIN kdv_user_assignments kua_filter ON kua_filter.mukellef_id = m.id
-                WHERE kua_filter.user_id = %s
+                WHERE m.id IN ({','.join(['%s'] * len(assigned))})
                 ORDER BY m.unvan ASC
-            """, (user_id,))
-            
-        mukellefler = [dict(r) for r in c.fetchall()]
+            """, assigned)
+            mukellefler = [dict(r) for r in c.fetchall()]
         
     return render_template("kdv/mukellefler.html", mukellefler=mukellefler, users_list=users_list)
 
@@ -248,151 +238,71 @@ def verify_pin():
 @api_kdv_access_required
 @role_required(allow_roles=("admin", "ymm", "yonetici", "uzman"))
 def get_stats():
-    user_id = session.get("user_id")
-    role = session.get("role")
     mukellef_id = request.args.get("mukellef_id") or request.args.get("mukellef")
     filter_user_id = request.args.get("user_id")
 
-    def parse_money(val):
-        if not val:
-            return 0.0
-        if isinstance(val, (int, float)):
-            return float(val)
-        clean = (
-            str(val)
-            .replace(".", "")
-            .replace(",", ".")
-            .replace("₺", "")
-            .replace("TL", "")
-            .strip()
-        )
-        try:
-            return float(clean)
-        except:
-            return 0.0
-
     try:
         with get_conn() as conn:
             cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            
-            now_dt = datetime.now()
-            curr_month_str = now_dt.strftime("%m.%Y")
-            from datetime import timedelta
-            prev_month_dt = now_dt.replace(day=1) - timedelta(days=1)
-            prev_month_str = prev_month_dt.strftime("%m.%Y")
-            
-            params = []
-            where_sql = " WHERE is_active = TRUE"
-            if role == "uzman":
-                where_sql += " AND mukellef_id IN (SELECT mukellef_id FROM kdv_user_assignments WHERE user_id = %s)"
-                params.append(user_id)
-            elif role not in ("admin", "ymm", "yonetici"):
-                where_sql += " AND user_id = %s"
-                params.append(user_id)
-            if mukellef_id:
-                where_sql += " AND mukellef_id = %s"
-                params.append(mukellef_id)
-
-            cur.execute(f"SELECT status, amount_request, completed_at FROM kdv_files {where_sql}", tuple(params))
-            rows = cur.fetchall()
-
-            pending_amt = 0.0
-            missing_count = 0
-            comp_curr = 0.0
-            comp_prev = 0.0
-
-            for r in rows:
-                try:
-                    stat = r['status'] or ""
-                    amt_str = r['amount_request'] or "0"
-                    comp_at = r['completed_at'] or ""
-                    
-                    amt = parse_money(amt_str)
 
-                    if stat not in ('İade Tamamlandı', 'İade Alındı'):
-                        pending_amt += amt
-                    
-                    if stat == 'Eksiklik yazısı geldi':
-                        missing_count += 1
-                        
-                    if stat in ('İade Tamamlandı', 'İade Alındı'):
-                        if curr_month_str in comp_at: comp_curr += amt
-                        elif prev_month_str in comp_at: comp_prev += amt
-                except:
-                    continue
-
-            # Pasif tamamlananlar
-            cur.execute(f"SELECT amount_request, completed_at FROM kdv_files WHERE is_active=FALSE AND status IN ('İade Tamamlandı','İade Alındı') {'AND user_id=%s' if 'user_id' in where_sql else ''}", (user_id,) if 'user_id' in where_sql else ())
-            for ar in cur.fetchall():
-                try:
-                    a = parse_money(ar['amount_request'])
-                    c_at = ar['completed_at'] or ""
-                    if curr_month_str in c_at: comp_curr += a
-                    elif prev_month_str in c_at: comp_prev += a
-                except: continue
-
-            cur.execute("SELECT amount_request, date, guarantee_date FROM kdv_files WHERE is_active=TRUE AND (subject LIKE '%%Teminat%%' OR type LIKE '%%Teminat%%')")
-            g_total = 0.0
-            g_alerts = 0
-            for gf in cur.fetchall():
-                try:
-                    b_date = gf['guarantee_date'] or gf['date']
-                    if b_date:
-                        pts = str(b_date).split(' ')[0].split('.')
-                        if len(pts) >= 3:
-                            s_dt = datetime(int(pts[-1]), int(pts[1]), int(pts[0]))
-                            rem = (s_dt + timedelta(days=180) - datetime.now()).days
-                            if rem <= 30:
-                                g_total += parse_money(gf['amount_request'])
-                                g_alerts += 1
-                except: continue
-
-            cur.execute(f"SELECT period, amount_request FROM kdv_files {where_sql} ORDER BY id DESC LIMIT 500", tuple(params))
-            monthly_totals = {}
-            for tr in cur.fetchall():
-                try:
-                    p = tr['period']
-                    if p and '/' in p:
-                        pts = p.split("/")
-                        key = f"{pts[1]}-{pts[0].zfill(2)}"
-                        monthly_totals[key] = monthly_totals.get(key, 0) + parse_money(tr['amount_request'])
-                except: continue
-
-            tr_m = {"01":"Oca","02":"Şub","03":"Mar","04":"Nis","05":"May","06":"Haz","07":"Tem","08":"Ağu","09":"Eyl","10":"Eki","11":"Kas","12":"Ara"}
-            sorted_m = sorted(monthly_totals.keys())[-6:]
-            trend_l = [f"{tr_m.get(m.split('-')[1], m.split('-')[1])} {m.split('-')[0][2:]}" for m in sorted_m]
-            trend_d = [monthly_totals[m] for m in sorted_m]
+            # Tutarlar/sayılar SQL tarafında toplanır; kapsam başına kısa süre önbelleklenir
+            stats = dict(get_stats_cached(cur, get_auth_context(), mukellef_id))
 
             # Son Aktiviteler
+            kdv_system_log.flush()
             cur.execute("SELECT date, user_name, action, description FROM kdv_system_logs ORDER BY id DESC LIMIT 5")
-            activities = [dict(l) for l in cur.fetchall()]
+            stats["recent_activities"] = [dict(l) for l in cur.fetchall()]
 
-            return jsonify({
-                "pending_amount": pending_amt,
-                "completed_amount": comp_curr,
-                "completed_prev": comp_prev,
-                "current_month_name": tr_m.get(now_dt.strftime("%m")),
-                "prev_month_name": tr_m.get(prev_month_dt.strftime("%m")),
-                "missing_docs_count": int(missing_count),
-                "guarantee_amount": g_total,
-                "guarantee_alert_count": int(g_alerts),
-                "trend_labels": trend_l,
-                "trend_data": trend_d,
-                "recent_activities": activities
-            })
+            return jsonify(stats)
     except Exception as e:
         import traceback
         current_app.logger.error(f"KDV Stats Error: {traceback.format_exc()}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+# /api/kdv/files için izin verilen kolonlar (fields= projeksiyonu) ve sıralamalar
+KDV_FILE_FIELDS = {
+    "id": "f.id", "mukellef_id": "f.mukellef_id", "user_id": "f.user_id", "period": "f.period",
+    "subject": "f.subject", "type": "f.type", "amount_request": "f.amount_request",
+    "amount_tenzil": "f.amount_tenzil", "amount_bloke": "f.amount_bloke",
+    "amount_resolved": "f.amount_resolved", "amount_guarantee": "f.amount_guarantee",
+    "status": "f.status", "location": "f.location", "date": "f.date", "is_active": "f.is_active",
+    "is_guaranteed": "f.is_guaranteed", "guarantee_date": "f.guarantee_date",
+    "completed_at": "f.completed_at", "client_name": "m.unvan",
+}
+KDV_FILE_SORTS = {
+    "id": "f.id",
+    "period": "COALESCE(f.donem_anahtari, 0)",
+    "client_name": "COALESCE(m.unvan, '')",
+    "subject": "COALESCE(f.subject, '')",
+    "amount_request": "COALESCE(f.amount_request, 0)",
+    "status": "COALESCE(f.status, '')",
+}
+KDV_FILES_MAX_LIMIT = 500
+
+
+def _encode_cursor(sort_value, file_id):
+    if hasattr(sort_value, "isoformat"):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, file_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor):
+    sort_value, file_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    return sort_value, int(file_id)
+
+
 @bp.route("/api/kdv/files")
 @api_kdv_access_required
 @role_required(allow_roles=("admin", "ymm", "yonetici", "uzman"))
 def list_files():
-    user_id = session.get("user_id")
-    role = session.get("role")
-
+    """
+    KDV dosya listesi (JSON dizi).
+    limit= verilirse sayfalı döner: sonraki sayfa için X-Next-Cursor başlığı cursor= ile
+    geri gönderilir (id üzerinde keyset). İlk sayfada X-Total-Count toplam kayıt sayısıdır.
+    fields= kolon projeksiyonu, q= metin araması, sort=/order= sunucu tarafı sıralama.
+    """
     is_active_arg = request.args.get("active")
     if is_active_arg == "all":
         is_active = -1
@@ -405,6 +315,30 @@ def list_files():
     status_filter = request.args.get("status")
     filter_type = request.args.get("filter_type")  # guarantee
     filter_user_id = request.args.get("user_id")
+    exclude_completed = request.args.get("exclude_completed") == "1"
+    search = (request.args.get("q") or "").strip()
+
+    fields = [f.strip() for f in (request.args.get("fields") or "").split(",") if f.strip()]
+    unknown = [f for f in fields if f not in KDV_FILE_FIELDS]
+    if unknown:
+        return jsonify({"status": "error", "message": f"Bilinmeyen alan: {', '.join(unknown)}"}), 400
+    if fields and "id" not in fields:
+        fields.insert(0, "id")
+    fields = fields or list(KDV_FILE_FIELDS)
+
+    sort_key = request.args.get("sort") or "id"
+    if sort_key not in KDV_FILE_SORTS:
+        return jsonify({"status": "error", "message": "Geçersiz sıralama alanı."}), 400
+    descending = (request.args.get("order") or "desc").lower() != "asc"
+    sort_expr = KDV_FILE_SORTS[sort_key]
+
+    limit = request.args.get("limit")
+    cursor = request.args.get("cursor")
+    try:
+        limit = min(max(int(limit), 1), KDV_FILES_MAX_LIMIT) if limit else None
+        after = _decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        return jsonify({"status": "error", "message": "Geçersiz sayfalama parametresi."}), 400
 
     try:
         with get_conn() as conn:
@@ -412,8 +346,7 @@ def list_files():
             c = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
             # 🔒 GÜVENLİ BASE QUERY
-            query = """
-                SELECT f.*, m.unvan AS client_name
+            where = """
                 FROM kdv_files f
                 JOIN kdv_mukellef m ON f.mukellef_id = m.id
                 WHERE 1=1
@@ -421,50 +354,79 @@ def list_files():
             params = []
             
             if is_active != -1: # -1 indicates "all"
-                query += " AND f.is_active = %s"
+                where += " AND f.is_active = %s"
                 params.append(True if is_active == 1 else False)
 
             # 🔐 ROL BAZLI ERİŞİM
-            if role == "uzman":
-                query += """
-                    AND f.mukellef_id IN (
-                        SELECT mukellef_id
-                        FROM kdv_user_assignments
-                        WHERE user_id = %s
-                    )
-                """
-                params.append(user_id)
-
-            elif role not in ("admin", "ymm", "yonetici"):
-                query += " AND f.user_id = %s"
-                params.append(user_id)
+            scope_sql, scope_params = mukellef_scope_sql(get_auth_context(), "f.mukellef_id", "f.user_id")
+            where += scope_sql
+            params.extend(scope_params)
 
             # 🔹 MÜKELLEF FİLTRESİ
             if mukellef_filter:
-                query += " AND f.mukellef_id = %s"
+                where += " AND f.mukellef_id = %s"
                 params.append(mukellef_filter)
                 
             if filter_user_id and filter_user_id != "":
-                query += " AND f.user_id = %s"
+                where += " AND f.user_id = %s"
                 params.append(filter_user_id)
 
             # 🔹 STATÜ FİLTRESİ
             if status_filter:
-                query += " AND f.status = %s"
+                where += " AND f.status = %s"
                 params.append(status_filter)
+            if exclude_completed:
+                where += " AND COALESCE(f.status, '') NOT IN ('İade Tamamlandı', 'İade Alındı') AND COALESCE(f.location, '') <> 'İade Tamamlandı'"
 
             # 🔹 ÖZEL FİLTRELER
             if filter_type == "guarantee":
-                query += " AND (f.subject ILIKE %s OR f.type ILIKE %s)"
+                where += " AND (f.subject ILIKE %s OR f.type ILIKE %s)"
                 params.extend(["%Teminat%", "%Teminat%"])
 
-            query += " ORDER BY f.id DESC"
-
-            c.execute(query, tuple(params))
+            # 🔎 METİN ARAMA
+            if search:
+                like = f"%{search}%"
+                where += " AND (m.unvan ILIKE %s OR m.vkn ILIKE %s OR f.period ILIKE %s OR f.subject ILIKE %s OR f.type ILIKE %s OR f.status ILIKE %s)"
+                params.extend([like] * 6)
+
+            total = None
+            if limit and not after:
+                c.execute("SELECT COUNT(*) AS total " + where, tuple(params))
+                total = c.fetchone()["total"]
+
+            # ⏩ KEYSET: (sıralama değeri, id) son görülen satırdan sonrası
+            query_params = list(params)
+            if after:
+                where += f" AND ({sort_expr}, f.id) {'<' if descending else '>'} (%s, %s)"
+                query_params.extend(after)
+
+            direction = "DESC" if descending else "ASC"
+            columns = ", ".join(f"{KDV_FILE_FIELDS[f]} AS {f}" for f in fields)
+            query = f"SELECT {columns}, {sort_expr} AS sort_key {where} ORDER BY {sort_expr} {direction}, f.id {direction}"
+            if limit:
+                query += " LIMIT %s"
+                query_params.append(limit + 1)
+
+            c.execute(query, tuple(query_params))
             rows = c.fetchall()
-            files = [dict(r) for r in rows]
 
-        return jsonify(files)
+        next_cursor = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1]["sort_key"], rows[-1]["id"])
+
+        files = []
+        for r in rows:
+            r = dict(r)
+            r.pop("sort_key", None)
+            files.append(r)
+
+        response = jsonify(files)
+        if total is not None:
+            response.headers["X-Total-Count"] = str(total)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response
     except Exception as e:
         import traceback
         current_app.logger.error(f"Error in list_files: {e}\n{traceback.format_exc()}")
@@ -596,6 +558,7 @@ def assign_mukellef():
             target_mukellef = res_mukellef["unvan"] if res_mukellef else "Bilinmeyen"
 
             conn.commit()
+            invalidate_auth_context(user_id)
 
             kdv_log_action(
                 session.get("username", "Admin"),
@@ -648,6 +611,7 @@ def remove_assignment():
         """, (user_id, mukellef_id))
 
         conn.commit()
+        invalidate_auth_context(user_id)
 
         kdv_log_action(
             session.get("username", "Admin"),
@@ -687,6 +651,7 @@ def delete_kdv_user(user_id):
         """, (user_id,))
 
         conn.commit()
+        invalidate_auth_context(user_id)
 
         # Sistem logu
         kdv_log_action(
@@ -705,6 +670,7 @@ def delete_kdv_user(user_id):
 @api_kdv_access_required
 @role_required(allow_roles=("admin",))
 def get_kdv_logs():
+    kdv_system_log.flush()
     with get_conn() as conn:
         c = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
@@ -734,6 +700,7 @@ def get_kdv_logs():
 @api_kdv_access_required
 @role_required(allow_roles=("admin",))
 def delete_all_logs():
+    kdv_system_log.flush()
     with get_conn() as conn:
         c = conn.cursor()
         c.execute("DELETE FROM kdv_system_logs")
@@ -748,36 +715,21 @@ def delete_all_logs():
 @api_kdv_access_required
 @role_required(allow_roles=("admin", "ymm", "yonetici", "uzman"))
 def get_file(file_id):
-    user_id = session.get("user_id")
-    role = session.get("role")
-
     with get_conn() as conn:
         c = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-        if role in ("admin", "ymm", "yonetici"):
-            # 🔓 Tam erişim
-            c.execute("""
-                SELECT f.*, m.unvan AS client_name
-                FROM kdv_files f
-                JOIN kdv_mukellef m ON f.mukellef_id = m.id
-                WHERE f.id = %s
-            """, (file_id,))
-        else:
-            # 🔐 Uzman → sadece atanmış mükellefin dosyası
-            c.execute("""
-                SELECT f.*, m.unvan AS client_name
-                FROM kdv_files f
-                JOIN kdv_mukellef m ON f.mukellef_id = m.id
-                WHERE f.id = %s
-                  AND f.mukellef_id IN (
-                      SELECT mukellef_id
-                      FROM kdv_user_assignments
-                      WHERE user_id = %s
-                  )
-            """, (file_id, user_id))
-
+        c.execute("""
+            SELECT f.*, m.unvan AS client_name
+            FROM kdv_files f
+            JOIN kdv_mukellef m ON f.mukellef_id = m.id
+            WHERE f.id = %s
+        """, (file_id,))
         file_row = c.fetchone()
 
+        # 🔐 Uzman → sadece atanmış mükellefin dosyası
+        if file_row and not get_auth_context().can_access_mukellef(file_row["mukellef_id"]):
+            file_row = None
+
         if not file_row:
             return jsonify({
                 "status": "error",
@@ -833,19 +785,11 @@ def add_file():
         }), 400
 
     # 🔐 Uzman → atanmış mükellef kontrolü
-    if role == "uzman":
-        with get_conn() as conn:
-            c = conn.cursor()
-            c.execute("""
-                SELECT 1
-                FROM kdv_user_assignments
-                WHERE user_id = %s AND mukellef_id = %s
-            """, (user_id, mukellef_id))
-            if not c.fetchone():
-                return jsonify({
-                    "status": "error",
-                    "message": "Bu mükellef için dosya oluşturma yetkiniz yok."
-                }), 403
+    if role == "uzman" and not get_auth_context().can_access_mukellef(mukellef_id):
+        return jsonify({
+            "status": "error",
+            "message": "Bu mükellef için dosya oluşturma yetkiniz yok."
+        }), 403
 
     
     # Batch Support: 'periods' keys can be a list of period strings
@@ -923,6 +867,7 @@ def add_file():
                 
                 if file_id:
                     inserted_count += 1
+                    sync_kdv_file_dates(c, file_id)
                     # 📜 History
                     c.execute("""
                         INSERT INTO kdv_history (file_id, date, text)
@@ -964,7 +909,6 @@ def add_file():
 @role_required(allow_roles=("admin", "ymm", "yonetici", "uzman"))
 def update_status():
     data = request.get_json()
-    user_id = session.get("user_id")
     role = session.get("role")
 
     file_id = data.get("file_id")
@@ -1005,14 +949,8 @@ def update_status():
                 return jsonify({"status": "success", "message": "Durum zaten güncel."})
 
         # 🔐 UZMAN → SADECE ATANMIŞ MÜKELLEF
-        if role == "uzman":
-            c.execute("""
-                SELECT 1
-                FROM kdv_user_assignments
-                WHERE user_id = %s AND mukellef_id = %s
-            """, (user_id, file_row["mukellef_id"]))
-            if not c.fetchone():
-                return jsonify({"status": "error", "message": "Bu dosya üzerinde işlem yapma yetkiniz yok."}), 403
+        if role == "uzman" and not get_auth_context().can_access_mukellef(file_row["mukellef_id"]):
+            return jsonify({"status": "error", "message": "Bu dosya üzerinde işlem yapma yetkiniz yok."}), 403
 
         # 🔄 Statü güncelleme
         if new_status:
@@ -1082,6 +1020,7 @@ def update_status():
                 f"{session.get('username')} \"{file_row['unvan']}\" mükellefinin {file_row['period']} dönemi dosya lokasyonunu \"{new_location}\" olarak değiştirdi."
             )
             
+        sync_kdv_file_dates(c, file_id)
         conn.commit()
         return jsonify({"status": "success", "message": "Durum güncellendi."})
 
@@ -1109,7 +1048,6 @@ def delete_history_item(item_id):
 def update_file_amounts():
     data = request.get_json()
     file_id = data.get("file_id")
-    user_id = session.get("user_id")
     role = session.get("role")
 
     if not file_id:
@@ -1149,10 +1087,8 @@ def update_file_amounts():
             return jsonify({"status": "error", "message": "Dosya bulunamadı."}), 404
 
         # 🔐 UZMAN KONTROLÜ
-        if role == "uzman":
-            c.execute("SELECT 1 FROM kdv_user_assignments WHERE user_id = %s AND mukellef_id = %s", (user_id, row["mukellef_id"]))
-            if not c.fetchone():
-                return jsonify({"status": "error", "message": "Yetkisiz işlem."}), 403
+        if role == "uzman" and not get_auth_context().can_access_mukellef(row["mukellef_id"]):
+            return jsonify({"status": "error", "message": "Yetkisiz işlem."}), 403
 
         # 💾 DİNAMİK GÜNCELLEME SORGUSU
         fields = []
@@ -1196,6 +1132,7 @@ def update_file_amounts():
         update_sql = f"UPDATE kdv_files SET {', '.join(fields)} WHERE id = %s"
         
         c.execute(update_sql, tuple(params))
+        sync_kdv_file_dates(c, file_id)
 
         # 📜 Log
         log_msg = f"{session.get('username')} \"{row['unvan']}\" {row['period']} dosyası bilgilerini güncelledi."
@@ -1234,6 +1171,7 @@ def delete_file():
 
         c.execute("DELETE FROM kdv_files WHERE id = %s", (file_id,))
         conn.commit()
+        invalidate_stats()
 
         kdv_log_action(
             session.get("username", "Admin"),
@@ -1294,6 +1232,7 @@ def toggle_active():
         """, (bool(is_active), file_id))
 
         conn.commit()
+        invalidate_stats()
 
         kdv_log_action(
             session.get("username", "Admin"),
@@ -1310,19 +1249,9 @@ def toggle_active():
 @api_kdv_access_required
 @role_required(allow_roles=("admin", "ymm", "yonetici", "uzman"))
 def mukellef_summary(mukellef_id):
-    user_id = session.get("user_id")
-    role = session.get("role")
-
     # 🔐 UZMAN → SADECE ATANMIŞ MÜKELLEF
-    if role == "uzman":
-        with get_conn() as conn:
-            c = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            c.execute("""
-                SELECT 1 FROM kdv_user_assignments
-                WHERE user_id = %s AND mukellef_id = %s
-            """, (user_id, mukellef_id))
-            if not c.fetchone():
-                return jsonify({"status": "error", "message": "Yetkisiz erişim"}), 403
+    if not get_auth_context().can_access_mukellef(mukellef_id):
+        return jsonify({"status": "error", "message": "Yetkisiz erişim"}), 403
 
     def parse_money(val):
         if not val:
@@ -1487,6 +1416,8 @@ def add_kdv_mukellef():
             """, (user_id, mukellef_id))
 
         conn.commit()
+        if role == "uzman":
+            invalidate_auth_context(user_id)
         
         kdv_log_action(
             session.get("username", "Admin"),
@@ -1501,7 +1432,6 @@ def add_kdv_mukellef():
 @api_kdv_access_required
 def update_kdv_mukellef():
     role = session.get("role")
-    user_id = session.get("user_id")
     data = request.json
     mid = data.get("id")
 
@@ -1513,12 +1443,7 @@ def update_kdv_mukellef():
 
         # 🔒 UZMAN → SADECE ATANMIŞ MÜKELLEF
         if role == "uzman":
-            c.execute("""
-                SELECT 1
-                FROM kdv_user_assignments
-                WHERE user_id = %s AND mukellef_id = %s
-            """, (user_id, mid))
-            if not c.fetchone():
+            if not get_auth_context().can_access_mukellef(mid):
                 return jsonify({"status": "error", "message": "Yetkisiz erişim"}), 403
 
         elif role not in ("admin", "ymm", "yonetici"):
@@ -1557,7 +1482,6 @@ def update_kdv_mukellef():
 @role_required(allow_roles=("admin", "ymm", "yonetici", "uzman"))
 def delete_kdv_mukellef():
     role = session.get("role")
-    user_id = session.get("user_id")
     mid = request.json.get("id")
 
     if not mid:
@@ -1567,14 +1491,8 @@ def delete_kdv_mukellef():
         c = conn.cursor()
 
         # 🔒 UZMAN → SADECE ATANMIŞ MÜKELLEF
-        if role == "uzman":
-            c.execute("""
-                SELECT 1
-                FROM kdv_user_assignments
-                WHERE user_id = %s AND mukellef_id = %s
-            """, (user_id, mid))
-            if not c.fetchone():
-                return jsonify({"status": "error", "message": "Bu mükellefi silme yetkiniz yok."}), 403
+        if role == "uzman" and not get_auth_context().can_access_mukellef(mid):
+            return jsonify({"status": "error", "message": "Bu mükellefi silme yetkiniz yok."}), 403
 
         # Log için ismi al
         c.execute("SELECT unvan FROM kdv_mukellef WHERE id = %s", (mid,))
@@ -1583,6 +1501,8 @@ def delete_kdv_mukellef():
 
         c.execute("DELETE FROM kdv_mukellef WHERE id = %s", (mid,))
         conn.commit()
+        invalidate_stats()
+        invalidate_auth_context()
         
         kdv_log_action(
             session.get("username", "Admin"),
@@ -1605,7 +1525,6 @@ def upload_document():
     file = request.files['file']
     file_id = request.form.get('file_id')
     doc_type = request.form.get('doc_type')
-    user_id = session.get("user_id")
     role = session.get("role")
     
     if not file_id:
@@ -1617,13 +1536,9 @@ def upload_document():
 
         if role == "uzman":
             # Uzman → sadece kendine atanmış mükellefin dosyasına belge ekleyebilir
-            c.execute("""
-                SELECT 1
-                FROM kdv_files f
-                JOIN kdv_user_assignments a ON a.mukellef_id = f.mukellef_id
-                WHERE f.id = %s AND a.user_id = %s
-            """, (file_id, user_id))
-            if not c.fetchone():
+            c.execute("SELECT mukellef_id FROM kdv_files WHERE id = %s", (file_id,))
+            file_row = c.fetchone()
+            if not file_row or not get_auth_context().can_access_mukellef(file_row["mukellef_id"]):
                 return jsonify({
                     "status": "error",
                     "message": "Bu dosyaya belge yükleme yetkiniz yok."
@@ -1743,7 +1658,6 @@ def upload_document():
 @api_kdv_access_required
 @role_required(allow_roles=("admin", "ymm", "yonetici", "uzman"))
 def delete_document(doc_id):
-    user_id = session.get("user_id")
     role = session.get("role")
 
     with get_conn() as conn:
@@ -1761,15 +1675,9 @@ def delete_document(doc_id):
         if not row:
             return jsonify({"status": "error", "message": "Belge bulunamadı."}), 404
 
-        if role == "uzman":
-            # Uzman → sadece kendine atanmış mükellefin belgesini silebilir
-            c.execute("""
-                SELECT 1
-                FROM kdv_user_assignments
-                WHERE user_id = %s AND mukellef_id = %s
-            """, (user_id, row["mukellef_id"]))
-            if not c.fetchone():
-                return jsonify({"status": "error", "message": "Bu belgeyi silme yetkiniz yok."}), 403
+        # Uzman → sadece kendine atanmış mükellefin belgesini silebilir
+        if role == "uzman" and not get_auth_context().can_access_mukellef(row["mukellef_id"]):
+            return jsonify({"status": "error", "message": "Bu belgeyi silme yetkiniz yok."}), 403
 
         if row.get("file_path"):
             import os
@@ -1888,6 +1796,7 @@ def api_delete_file(file_id):
             # Soft Delete
             c.execute("UPDATE kdv_files SET is_active = FALSE WHERE id = %s", (file_id,))
             conn.commit()
+            invalidate_stats()
             
             # Log
             kdv_log_action(username, "Dosya Silme", f"{username} kullanıcısı {m_name} mükellefine ait {period} dönemli dosyayı sildi.")
@@ -5,9 +5,12 @@ os.environ["OMP_NUM_THREADS"] = "1"
 os.environ["MKL_NUM_THREADS"] = "1"
 
 from flask import Blueprint, render_template, request, make_response, jsonify, send_from_directory, url_for, current_app, redirect, flash, abort
-from services.ozelge_service import load_ozelge_index
+from services.search_index import InvertedIndex
+from services.teblig_store import find_section
+from services.sitemap_service import get_sitemap
+from services.vector_search import VectorIndex, reciprocal_rank_fusion
+import config
 from auth import login_required
-from datetime import datetime
 import logging
 import re
 import json
@@ -50,10 +53,13 @@ def expand_query(question):
 
 # --- GLOBAL SEARCH CACHE ---
 _SEARCH_RESOURCES = {
-    "kdv": {"meta": None},
-    "kv": {"meta": None}
+    "kdv": {"meta": None, "index": None, "ids": None, "vectors": None},
+    "kv": {"meta": None, "index": None, "ids": None, "vectors": None}
 }
 
+# BM25 ile fuzzy yeniden siralamaya aday olarak alinacak madde sayisi
+SEARCH_SHORTLIST_SIZE = 40
+
 def get_search_resources(tax_type=None):
     global _SEARCH_RESOURCES
     
@@ -62,6 +68,7 @@ def get_search_resources(tax_type=None):
             if _SEARCH_RESOURCES[tax_type]["meta"] is None:
                 # Try to load the simpler metadata from embeddings dir, or fall back to main json
                 meta_path = os.path.join(current_app.root_path, "static", "data", "embeddings", f"{tax_type}_meta.json")
+                vectors_path = os.path.join(current_app.root_path, "static", "data", "embeddings", f"{tax_type}_vectors.npy")
                 if not os.path.exists(meta_path):
                     # Fallback to the original json if meta doesn't exist
                     meta_path = os.path.join(current_app.root_path, "static", "data", f"{tax_type}_tebligi.json")
@@ -91,8 +98,14 @@ def get_search_resources(tax_type=None):
                         _SEARCH_RESOURCES[tax_type]["meta"] = flat_items
                     else:
                         _SEARCH_RESOURCES[tax_type]["meta"] = data
+
+                    meta = _SEARCH_RESOURCES[tax_type]["meta"]
+                    _SEARCH_RESOURCES[tax_type]["index"] = InvertedIndex(meta)
+                    _SEARCH_RESOURCES[tax_type]["ids"] = [str(it.get("id", "") or "").lower() for it in meta]
+                    # Vektorler mmap ile ilk vektor sorgusunda acilir, model de o an yuklenir
+                    _SEARCH_RESOURCES[tax_type]["vectors"] = VectorIndex(meta, vectors_path)
                         
-                    current_app.logger.info(f"✅ {tax_type.upper()} Metadata loaded.")
+                    current_app.logger.info(f"✅ {tax_type.upper()} Metadata + BM25 index loaded.")
                 except Exception as e:
                     current_app.logger.error(f"❌ {tax_type.upper()} Meta Load Failed: {e}")
                     return None
@@ -222,7 +235,8 @@ def synthesize_ai_answer(best_item, question, intent):
     summary = " ".join(relevant_sentences) if relevant_sentences else content[:250] + "..."
     return f"🚀 <b>Özet Analiz:</b> {summary}"
 
-def perform_hybrid_search(tax_type, question):
+def perform_hybrid_search(tax_type, question, mode=None):
+    mode = str(mode or config.SEARCH_MODE).lower()
     try:
         current_app.logger.info(f"🔍 Starting {tax_type} fuzzy search for: {question[:50]}...")
         resources = get_search_resources(tax_type)
@@ -237,12 +251,36 @@ def perform_hybrid_search(tax_type, question):
         article_match = re.search(r"\b\d+(\.\d+)*\b", question)
         target_id = article_match.group() if article_match else None
 
+        # 2. BM25 shortlist (ters indeks) + ID eslesmeleri; fuzzy sadece bu adaylara uygulanir
+        index = resources[tax_type].get("index")
+        if index is not None:
+            lexical = index.search(expanded_question, limit=SEARCH_SHORTLIST_SIZE)
+            shortlist = dict(lexical)
+            vectors = resources[tax_type].get("vectors")
+            if mode == "hybrid" and vectors is not None:
+                try:
+                    semantic = vectors.search(question, k=SEARCH_SHORTLIST_SIZE)
+                    if semantic:
+                        fused = reciprocal_rank_fusion([[i for i, _ in lexical], [i for i, _ in semantic]])
+                        top = sorted(fused.items(), key=lambda x: x[1], reverse=True)[:SEARCH_SHORTLIST_SIZE]
+                        shortlist = dict(top)
+                except Exception as e:
+                    current_app.logger.warning(f"Vector search skipped: {e}")
+            if target_id:
+                for doc_idx, id_str in enumerate(resources[tax_type]["ids"]):
+                    if target_id in id_str:
+                        shortlist.setdefault(doc_idx, 0.0)
+        else:
+            shortlist = {doc_idx: 0.0 for doc_idx in range(len(meta_data))}
+        max_relevance = max(shortlist.values(), default=0.0) or 1.0
+
         candidate_results = []
         # Filter out generic terms for core matching
         generic_terms = ["oran", "nedir", "kaçtır", "hakkında", "nasıl", "ne", "bir", "ve", "ile", "için"]
         core_query_words = [w for w in search_words if w not in generic_terms]
 
-        for item in meta_data:
+        for doc_idx, relevance in shortlist.items():
+            item = meta_data[doc_idx]
             score = 0
             content_lower = (item.get("content", "") or "").lower()
             title_lower = (item.get("title", "") or "").lower()
@@ -254,6 +292,9 @@ def perform_hybrid_search(tax_type, question):
             
             score += title_fuzzy * 0.8
             score += content_fuzzy * 0.2
+
+            # Lexical / fused relevance (BM25 or RRF, normalised)
+            score += 20 * relevance / max_relevance
             
             # Exact Phrase Matching
             if question.lower() in title_lower: score += 40
@@ -331,67 +372,34 @@ def cerez_politikasi():
 @bp.route("/robots.txt")
 def robots(): return send_from_directory("static", "robots.txt")
 
+def _sitemap_response(body, body_gz, etag, last_modified, content_type="application/xml"):
+    accepts_gzip = "gzip" in request.headers.get("Accept-Encoding", "").lower()
+    response = make_response(body_gz if accepts_gzip else body)
+    response.headers["Content-Type"] = content_type
+    if accepts_gzip:
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "public, max-age=3600"
+    response.set_etag(f"{etag}-gz" if accepts_gzip else etag)
+    response.last_modified = last_modified
+    return response.make_conditional(request)
+
 @bp.route("/sitemap.xml")
 def sitemap_xml():
-    host = request.host_url.rstrip('/')
-    urls = []
-    static_endpoints = [
-        ('main.home', {}), ('main.about', {}), ('main.team', {}), ('main.mevzuat', {}),
-        ('main.indirim', {}), ('main.ceza', {}), ('main.kdv_tebligi', {}),
-        ('main.kv_tebligi', {}), ('main.mevzuat_degisiklikleri', {}), ('main.contact', {}),
-        ('main.cerez_politikasi', {}),
-        ('main.kdv_tevkifat', {}), ('main.itus', {}), ('main.his', {}), ('main.kv_istisna_indirimler', {}),
-        ('main.tecil_taksitlendirme_2026', {}), ('main.varlik_barisi_2026', {}),
-        ('tools.asgari', {}), ('tools.sermaye', {}), ('tools.finansman', {}), ('tools.sermaye_azaltimi', {}),
-        ('calculators.index', {}), ('calculators.gelir_vergisi', {}), ('calculators.ithalat_kdv', {}), ('calculators.gecikme_zammi', {}), ('calculators.tecil_faizi', {}), ('calculators.serbest_meslek', {}), ('calculators.tdhp', {}), ('calculators.kdv_tevkifat', {}),
-        ('indirimlikurumlar_seo.hesaplama_araci', {}), ('indirimlikurumlar_seo.teblig_ornekleri', {}), ('indirimlikurumlar_seo.mevzuat_rehberi', {}),
-        ('indirimlikurumlar_seo.ozelge_kutuphanesi', {}),
-    ]
-    priority_map = {
-        'main.home': '1.0',
-        'calculators.gelir_vergisi': '0.9',
-        'calculators.index': '0.8',
-        'indirimlikurumlar_seo.hesaplama_araci': '0.9',
-        'indirimlikurumlar_seo.teblig_ornekleri': '0.8',
-        'indirimlikurumlar_seo.mevzuat_rehberi': '0.8',
-        'indirimlikurumlar_seo.ozelge_kutuphanesi': '0.8',
-        'main.kv_istisna_indirimler': '0.9',
-        'main.tecil_taksitlendirme_2026': '0.9',
-        'main.varlik_barisi_2026': '0.9',
-        'calculators.tecil_faizi': '0.9',
-    }
-    for rule, kw in static_endpoints:
-        try:
-            url = url_for(rule, _external=True, **kw)
-            urls.append({"loc": url, "lastmod": datetime.now().strftime("%Y-%m-%d"), "priority": priority_map.get(rule, "0.5")})
-        except Exception: pass
-            
-    def parse_links(items, base_route):
-        for item in items:
-            uid = str(item.get("uid", item.get("id", "")))
-            url = url_for(base_route, bolum_id=uid.replace("/", "-"), _external=True)
-            urls.append({"loc": url, "lastmod": datetime.now().strftime("%Y-%m-%d"), "priority": "0.8"})
-            if item.get("sub"): parse_links(item["sub"], base_route)
-                
-    try:
-        for t in ["kdv", "kv"]:
-            path = os.path.join(current_app.root_path, 'static', 'data', f'{t}_tebligi.json')
-            if os.path.exists(path):
-                with open(path, 'r', encoding='utf-8') as f: parse_links(json.load(f), f'main.{t}_tebligi')
-    except Exception: pass
-    try:
-        ozelge_data = load_ozelge_index(current_app.root_path)
-        for item in ozelge_data.get("items", []):
-            urls.append({
-                "loc": url_for("indirimlikurumlar_seo.ozelge_detay", slug=item["slug"], _external=True),
-                "lastmod": item.get("indexed_at") or datetime.now().strftime("%Y-%m-%d"),
-                "priority": "0.6",
-            })
-    except Exception:
-        pass
-    response = make_response(render_template("sitemap.xml", urls=urls))
-    response.headers["Content-Type"] = "application/xml"
-    return response
+    sitemap = get_sitemap(current_app.root_path, request.host_url)
+    return _sitemap_response(sitemap.body, sitemap.body_gz, sitemap.etag, sitemap.last_modified)
+
+@bp.route("/sitemap-<int:part>.xml.gz")
+def sitemap_part(part):
+    sitemap = get_sitemap(current_app.root_path, request.host_url)
+    if sitemap.index is None or not 1 <= part <= len(sitemap.parts_gz):
+        abort(404)
+    response = make_response(sitemap.parts_gz[part - 1])
+    response.headers["Content-Type"] = "application/gzip"
+    response.headers["Cache-Control"] = "public, max-age=3600"
+    response.set_etag(f"{sitemap.etag}-{part}")
+    response.last_modified = sitemap.last_modified
+    return response.make_conditional(request)
 
 @bp.route("/favicon.ico")
 def favicon():
@@ -420,18 +428,8 @@ def varlik_barisi_2026():
 def kdv_tebligi(bolum_id=None):
     selected_item = None
     if bolum_id:
-        json_path = os.path.join(current_app.root_path, 'static', 'data', 'kdv_tebligi.json')
         try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                def find_item(items, target_id):
-                    for item in items:
-                        if str(item.get("uid", item.get("id", ""))).replace("/", "-") == target_id: return item
-                        if item.get("sub"):
-                            found = find_item(item["sub"], target_id)
-                            if found: return found
-                    return None
-                selected_item = find_item(data, bolum_id)
+            selected_item = find_section(current_app.root_path, "kdv", bolum_id)
         except Exception: pass
     return render_template("pages/kdv_tebligi.html", bolum_id=bolum_id, selected_item=selected_item)
 
@@ -440,18 +438,8 @@ def kdv_tebligi(bolum_id=None):
 def kv_tebligi(bolum_id=None):
     selected_item = None
     if bolum_id:
-        json_path = os.path.join(current_app.root_path, 'static', 'data', 'kv_tebligi.json')
         try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                def find_item(items, target_id):
-                    for item in items:
-                        if str(item.get("uid", item.get("id", ""))).replace("/", "-") == target_id: return item
-                        if item.get("sub"):
-                            found = find_item(item["sub"], target_id)
-                            if found: return found
-                    return None
-                selected_item = find_item(data, bolum_id)
+            selected_item = find_section(current_app.root_path, "kv", bolum_id)
         except Exception: pass
     return render_template("pages/kv_tebligi.html", bolum_id=bolum_id, selected_item=selected_item)
 
@@ -505,7 +493,7 @@ def kdv_search():
     data = request.get_json()
     question = data.get("question", "").strip().lower()
     if not question: return jsonify({"answer": "Soru giriniz.", "items": []})
-    answer, items = perform_hybrid_search("kdv", question)
+    answer, items = perform_hybrid_search("kdv", question, mode=data.get("mode"))
     return jsonify({"answer": answer, "items": items})
 
 @bp.route("/api/kv-search", methods=["POST"])
@@ -513,7 +501,7 @@ def kv_search():
     data = request.get_json()
     question = data.get("question", "").strip().lower()
     if not question: return jsonify({"answer": "Soru giriniz.", "items": []})
-    answer, items = perform_hybrid_search("kv", question)
+    answer, items = perform_hybrid_search("kv", question, mode=data.get("mode"))
     return jsonify({"answer": answer, "items": items})
 
 @bp.route("/api/kdv-suggestions", methods=["GET"])
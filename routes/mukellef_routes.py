@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, request, jsonify, session, current_app, flash, redirect, url_for
 from services.db import get_conn
+from services import beyanname_cache
 from auth import role_required
 import psycopg2.extras
 
@@ -104,11 +105,12 @@ def sil():
         
     try:
         with get_conn() as conn:
-            c = conn.cursor()
+            c = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
             # Silme işleminden önce beyannameleri ve teşvik belgelerini de kontrol etmek gerekebilir 
             # ancak veritabanında ON DELETE CASCADE varsa sorun olmaz. 
             # Ama biz güvenli gidelim.
-            c.execute("DELETE FROM beyanname WHERE mukellef_id=%s AND user_id=%s", (mid, user_id))
+            c.execute("DELETE FROM beyanname WHERE mukellef_id=%s AND user_id=%s RETURNING id", (mid, user_id))
+            beyanname_cache.invalidate(*(r["id"] for r in c.fetchall()))
             c.execute("DELETE FROM tesvik_belgeleri WHERE mukellef_id=%s AND user_id=%s", (mid, user_id))
             c.execute("DELETE FROM mukellef WHERE id=%s AND user_id=%s", (mid, user_id))
             conn.commit()
@@ -1,14 +1,14 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_file, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
 from services.db import get_conn
-from services.utils import prepare_df, to_float_turkish, month_key
+from services.utils import prepare_df, to_float_turkish
 from services.pdf_service import SECTION_KEYS, SECTION_ALIASES
-from extensions import fernet
+from services.beyanname_cache import load_payload
+from services.beyanname_kalem import kalemleri_getir, kdv_kolonlari
+from services.table_export import export_response, FORMATS as EXPORT_FORMATS
 from finansal_oranlar import hesapla_finansal_oranlar, analiz_olustur
 from auth import role_required
 import pandas as pd
-import json
 import psycopg2.extras
-import io
 import re
 import os
 import shutil
@@ -171,8 +171,8 @@ def raporlama():
             row = c.fetchone()
             if row: secili_unvan = row["unvan"]
 
-            c.execute("SELECT DISTINCT b.donem FROM beyanname b JOIN mukellef m ON b.mukellef_id=m.id WHERE m.vergi_kimlik_no=%s AND m.user_id=%s ORDER BY b.donem DESC", (vkn, uid))
-            donemler = sorted(set(r["donem"] for r in c.fetchall()), reverse=True)
+            c.execute("SELECT b.donem FROM beyanname b JOIN mukellef m ON b.mukellef_id=m.id WHERE m.vergi_kimlik_no=%s AND m.user_id=%s GROUP BY b.donem ORDER BY COALESCE(MAX(b.donem_anahtari), 0) DESC, b.donem DESC", (vkn, uid))
+            donemler = [r["donem"] for r in c.fetchall()]
 
             c.execute("SELECT b.tur, b.yuklenme_tarihi, b.donem FROM beyanname b JOIN mukellef m ON b.mukellef_id=m.id WHERE m.vergi_kimlik_no=%s AND m.user_id=%s ORDER BY b.yuklenme_tarihi DESC", (vkn, uid))
             for r in c.fetchall():
@@ -207,32 +207,18 @@ def raporlama_grafik():
     try:
         with get_conn() as conn:
             c = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            # Tüm yılların bilanço ve gelir tablosu satırları tek sorguda
+            kalemler = kalemleri_getir(c, uid, vkn, donemler, ["bilanco", "gelir"])
             
             for donem in donemler:
-                # Bilanço verisi
-                c.execute("""
-                    SELECT b.veriler FROM beyanname b 
-                    JOIN mukellef m ON b.mukellef_id=m.id 
-                    WHERE m.user_id=%s AND m.vergi_kimlik_no=%s AND b.donem=%s AND b.tur='bilanco' LIMIT 1
-                """, (uid, vkn, donem))
-                rb = c.fetchone()
+                pb = kalemler.get((donem, "bilanco"))  # Bilanço verisi
+                pg = kalemler.get((donem, "gelir"))    # Gelir tablosu verisi
                 
-                # Gelir tablosu verisi
-                c.execute("""
-                    SELECT b.veriler FROM beyanname b 
-                    JOIN mukellef m ON b.mukellef_id=m.id 
-                    WHERE m.user_id=%s AND m.vergi_kimlik_no=%s AND b.donem=%s AND b.tur='gelir' LIMIT 1
-                """, (uid, vkn, donem))
-                rg = c.fetchone()
-                
-                if not rb or not rg:
+                if not pb or not pg:
                     eksik_yillar.append(donem)
                     continue
                 
                 try:
-                    # Verileri çöz
-                    pb = json.loads(fernet.decrypt(rb["veriler"].tobytes() if isinstance(rb["veriler"], memoryview) else rb["veriler"]).decode("utf-8"))
-                    pg = json.loads(fernet.decrypt(rg["veriler"].tobytes() if isinstance(rg["veriler"], memoryview) else rg["veriler"]).decode("utf-8"))
                     
                     # DataFrame'lere dönüştür
                     aktif_df = prepare_df(pd.DataFrame(pb.get("aktif", [])), "Cari Dönem")
@@ -317,39 +303,18 @@ def rapor_kdv():
         flash("Mükellef ve dönem seçilmelidir.", "warning")
         return redirect(url_for("report.raporlama"))
 
-    kdv_data, kdv_months = {}, []
     try:
         with get_conn() as conn:
             c = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            for donem in donemler:
-                c.execute("SELECT b.veriler, b.donem FROM beyanname b JOIN mukellef m ON m.id = b.mukellef_id WHERE m.vergi_kimlik_no=%s AND b.donem=%s AND b.tur='kdv'", (vkn, donem))
-                rows = c.fetchall()
-                for row in rows:
-                    try:
-                        data_bytes = row["veriler"].tobytes() if isinstance(row["veriler"], memoryview) else row["veriler"]
-                        parsed = json.loads(fernet.decrypt(data_bytes).decode("utf-8"))
-                        raw_donem = parsed.get("donem") or row["donem"]
-                        parts = [p.strip() for p in raw_donem.split("/") if p.strip()]
-                        if len(parts) == 2:
-                            ay, yil = parts[0], parts[1]
-                            col = f"{yil}/{ay.upper()}"
-                        else:
-                            col = raw_donem
-                            
-                        if col not in kdv_months: kdv_months.append(col)
-                        for rec in parsed.get("veriler", []):
-                            kdv_data.setdefault(rec["alan"], {})[col] = rec["deger"]
-                    except Exception as e: 
-                        import traceback
-                        current_app.logger.error(f"KDV Parse Error: {e}\n{traceback.format_exc()}")
+            # Excel dışa aktarımıyla aynı kolonlar (etiket ve sıra)
+            kolonlar, kdv_data = kdv_kolonlari(c, session["user_id"], vkn, donemler)
     except Exception as e:
         import traceback
         current_app.logger.error(f"Error in rapor_kdv DB access: {e}\n{traceback.format_exc()}")
         flash("KDV raporu verileri yüklenirken bir hata oluştu.", "danger")
         return redirect(url_for("report.raporlama"))
+    kdv_months = [etiket for _, etiket in kolonlar]
 
-    kdv_months = sorted(set(kdv_months), key=month_key)
-    
     # --- Summary Metrics & Validation ---
     kdv_summary = {m: {"matrah": 0, "hesaplanan": 0, "indirim": 0, "devreden": 0, "odenecek": 0, "iade": 0} for m in kdv_months}
     inconsistencies = []
@@ -400,92 +365,37 @@ def rapor_kdv_excel():
     unvan = request.args.get("unvan", "M\u00FCkellef")
     donemler_str = request.args.get("donemler", "")
     donemler = [d for d in donemler_str.split(",") if d]
+    fmt = request.args.get("format", "xlsx")
+    if fmt not in EXPORT_FORMATS:
+        fmt = "xlsx"
 
     if not vkn or not donemler:
         flash("M\u00FCkellef ve d\u00F6nem bilgisi eksik.", "warning")
         return redirect(url_for("report.raporlama"))
 
-    kdv_data, kdv_months = {}, []
     with get_conn() as conn:
-        c = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        for donem in donemler:
-            c.execute("""
-                SELECT b.veriler, b.donem 
-                FROM beyanname b 
-                JOIN mukellef m ON m.id = b.mukellef_id 
-                WHERE m.vergi_kimlik_no=%s AND b.donem=%s AND b.tur='kdv' AND b.user_id=%s
-            """, (vkn, donem, session["user_id"]))
-            rows = c.fetchall()
-            for row in rows:
-                try:
-                    data_bytes = row["veriler"].tobytes() if isinstance(row["veriler"], memoryview) else row["veriler"]
-                    parsed = json.loads(fernet.decrypt(data_bytes).decode("utf-8"))
-                    raw_donem = parsed.get("donem") or row["donem"]
-                    # '01/2024' -> parts=['01','2024']
-                    parts = [p.strip() for p in raw_donem.split("/") if p.strip()]
-                    if len(parts) == 2:
-                        # Normalize to 'YEAR/MONTH' for column sorting
-                        if parts[1].isdigit() and len(parts[1]) == 4:
-                            ay, yil = parts[0], parts[1]
-                        else:
-                            yil, ay = parts[0], parts[1]
-                        col = f"{yil}/{ay.upper()}"
-                    else:
-                        col = raw_donem
-                        
-                    if col not in kdv_months: kdv_months.append(col)
-                    for rec in parsed.get("veriler", []):
-                        kdv_data.setdefault(rec["alan"], {})[col] = rec.get("deger")
-                except Exception as e:
-                    ("   ")
-
-    kdv_months = sorted(set(kdv_months), key=month_key)
+        c = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        # Ekrandaki raporla aynı kolonlar (etiket ve sıra)
+        kolonlar, kdv_data = kdv_kolonlari(c, session["user_id"], vkn, donemler)
+    kdv_months = [etiket for _, etiket in kolonlar]
     final_data = reorder_by_section(consolidate_kdv_rows(kdv_data))
 
-    rows = []
-    for alan, values in final_data.items():
-        row = {"A\u00C7IKLAMA": alan}
-        for m in kdv_months:
-            v = values.get(m)
-            # Veri temizleme
-            if v is None or str(v).lower() in ['nan', 'none', '-']:
-                row[m] = ""
-            else:
-                row[m] = v
-        rows.append(row)
-
-    df = pd.DataFrame(rows)
-    output = io.BytesIO()
-    
-    # xlsxwriter genellikle pandas ile gelir, gelmezse openpyxl dener
-    engine = 'xlsxwriter'
-    try:
-        import xlsxwriter
-    except ImportError:
-        engine = 'openpyxl'
-
-    with pd.ExcelWriter(output, engine=engine) as writer:
-        df.to_excel(writer, index=False, sheet_name='KDV Ozeti')
-        if engine == 'xlsxwriter':
-            workbook = writer.book
-            worksheet = writer.sheets['KDV Ozeti']
-            header_format = workbook.add_format({'bold': True, 'bg_color': '#4e54c8', 'font_color': 'white', 'border': 1})
-            section_format = workbook.add_format({'bold': True, 'bg_color': '#f1f5f9', 'font_color': '#4e54c8'})
-            
-            for col_num, value in enumerate(df.columns.values):
-                worksheet.write(0, col_num, value, header_format)
-            
-            for row_num, row_data in enumerate(rows):
-                if row_data["A\u00C7IKLAMA"].startswith("\u00A7 "):
-                    worksheet.set_row(row_num + 1, None, section_format)
-            
-            worksheet.set_column(0, 0, 50)
-            worksheet.freeze_panes(1, 1)
+    def satirlar():
+        # Satırlar yazılırken üretilir; ara liste/DataFrame tutulmaz
+        for alan, values in final_data.items():
+            row = [alan]
+            for m in kdv_months:
+                v = values.get(m)
+                # Veri temizleme
+                row.append("" if v is None or str(v).lower() in ['nan', 'none', '-'] else v)
+            yield row
 
-    output.seek(0)
     safe_unvan = "".join([c for c in unvan if c.isalnum() or c in (' ', '_')]).strip().replace(' ', '_')
-    filename = f"KDV_Ozeti_{safe_unvan}_{datetime.now().strftime('%Y%m%d')}.xlsx"
-    return send_file(output, as_attachment=True, download_name=filename, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    filename = f"KDV_Ozeti_{safe_unvan}_{datetime.now().strftime('%Y%m%d')}"
+    return export_response(
+        ["A\u00C7IKLAMA", *kdv_months], satirlar(), filename, fmt=fmt,
+        sheet_name='KDV Ozeti', section_prefix="\u00A7 ",
+    )
 
 @bp.route("/tablo-mizan/<string:tur>")
 @role_required(allow_roles=("admin",))
@@ -505,17 +415,15 @@ def tablo_mizan(tur):
                  flash("Mükellef bulunamadı.")
                  return redirect(url_for("data.veri_giris"))
             mid, unvan = row["id"], row["unvan"]
-            c.execute("SELECT veriler FROM beyanname WHERE user_id=%s AND mukellef_id=%s AND donem=%s AND tur='mizan'", (session["user_id"], mid, donem))
+            c.execute("SELECT id, yuklenme_tarihi FROM beyanname WHERE user_id=%s AND mukellef_id=%s AND donem=%s AND tur='mizan'", (session["user_id"], mid, donem))
             row = c.fetchone()
+            # Veriyi çöz
+            mizan_data = load_payload(c, row) if row else None
             
-        if not row:
+        if mizan_data is None:
             flash("Mizan verisi bulunamadı.")
             return redirect(url_for("data.veri_giris", vkn=vkn, donem=donem))
 
-        # Veriyi çöz
-        data = row["veriler"].tobytes() if isinstance(row["veriler"], memoryview) else row["veriler"]
-        mizan_data = json.loads(fernet.decrypt(data).decode("utf-8"))
-
         if tur == "bilanco":
              return render_template("tables/tablo_bilanco.html", unvan=unvan, donem=donem, vkn=vkn, aktif_list=mizan_data.get("aktif",[]), pasif_list=mizan_data.get("pasif",[]), toplamlar={}, secilen_donem="cari", donem_mapping={"cari": donem}, has_inflation=False, gorunen_kolon="cari_donem", aktif_alt_toplamlar={}, pasif_alt_toplamlar={})
         elif tur == "gelir":
@@ -598,21 +506,19 @@ def finansal_analiz():
             process_queue = sorted(process_queue, key=lambda x: x['label'])
             display_periods = [p['label'] for p in process_queue]
 
+            # Kuyruktaki tüm dönemlerin bilanço/gelir satırları tek sorguda
+            kalemler = kalemleri_getir(c, uid, secili_vkn, {p['db_donem'] for p in process_queue}, ["bilanco", "gelir"])
+
             for item in process_queue:
                 label = item['label']
                 db_d = item['db_donem']
                 mode = item['mode']
                 
                 try:
-                    c.execute("SELECT veriler FROM beyanname b JOIN mukellef m ON b.mukellef_id=m.id WHERE m.user_id=%s AND m.vergi_kimlik_no=%s AND b.donem=%s AND b.tur='bilanco'", (uid, secili_vkn, db_d))
-                    rb = c.fetchone()
-                    c.execute("SELECT veriler FROM beyanname b JOIN mukellef m ON b.mukellef_id=m.id WHERE m.user_id=%s AND m.vergi_kimlik_no=%s AND b.donem=%s AND b.tur='gelir'", (uid, secili_vkn, db_d))
-                    rg = c.fetchone()
+                    pb = kalemler.get((db_d, "bilanco"))
+                    pg = kalemler.get((db_d, "gelir"))
                     
-                    if not rb or not rg: continue
-
-                    pb = json.loads(fernet.decrypt(rb["veriler"].tobytes() if isinstance(rb["veriler"], memoryview) else rb["veriler"]).decode("utf-8"))
-                    pg = json.loads(fernet.decrypt(rg["veriler"].tobytes() if isinstance(rg["veriler"], memoryview) else rg["veriler"]).decode("utf-8"))
+                    if not pb or not pg: continue
                     
                     t_col = "Cari Dönem"
                     if mode == 'enflasyonlu':
@@ -670,18 +576,21 @@ def pdf_belgeler_tablo():
              flash("Mükellef bulunamadı.")
              return redirect(url_for("data.veri_giris"))
         mid, unvan = row["id"], row["unvan"]
-        c.execute("SELECT veriler FROM beyanname WHERE user_id=%s AND mukellef_id=%s AND donem=%s AND tur=%s", (session["user_id"], mid, donem, tur))
+        c.execute("SELECT id, yuklenme_tarihi FROM beyanname WHERE user_id=%s AND mukellef_id=%s AND donem=%s AND tur=%s", (session["user_id"], mid, donem, tur))
         row = c.fetchone()
 
-    if not row:
-        flash(f"{tur.upper()} verisi bulunamadı.")
-        return redirect(url_for("data.veri_giris", vkn=vkn, donem=donem))
+        if not row:
+            flash(f"{tur.upper()} verisi bulunamadı.")
+            return redirect(url_for("data.veri_giris", vkn=vkn, donem=donem))
 
-    try:
-        data_bytes = row["veriler"].tobytes() if isinstance(row["veriler"], memoryview) else row["veriler"]
-        parsed = json.loads(fernet.decrypt(data_bytes).decode("utf-8"))
-    except Exception as e:
-        flash(f"Veri okuma hatası: {str(e)}")
+        try:
+            parsed = load_payload(c, row)
+        except Exception as e:
+            flash(f"Veri okuma hatası: {str(e)}")
+            return redirect(url_for("data.veri_giris", vkn=vkn, donem=donem))
+
+    if parsed is None:
+        flash(f"{tur.upper()} verisi bulunamadı.")
         return redirect(url_for("data.veri_giris", vkn=vkn, donem=donem))
 
     donem_turu = request.args.get("donem_turu", "cari")
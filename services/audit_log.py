@@ -0,0 +1,149 @@
+"""
+Asenkron, toplu denetim/giriş logu yazıcısı.
+
+İstek içindeki log çağrıları satırı yalnızca bellekteki sınırlı bir kuyruğa
+ekler; arka plandaki bir thread kuyruğu AUDIT_LOG_INTERVAL saniyede bir (veya
+kuyrukta AUDIT_LOG_BATCH satır birikince) tek bir çok satırlı INSERT ile yazar.
+
+    kuyruk dolu / AUDIT_LOG_ASYNC=0 / thread başlatılamadı -> satır istekte senkron yazılır
+    toplu INSERT hata verirse                             -> satırlar tek tek denenir
+    süreç kapanırken (atexit)                             -> bekleyen satırlar yazılır
+
+Logu okuyan uç noktalar okumadan önce `flush()` çağırır; böylece az önce
+yapılan işlem listede görünür.
+"""
+import atexit
+import os
+import queue
+import threading
+import traceback
+
+from services.db import get_conn
+
+AUDIT_LOG_ASYNC = os.getenv("AUDIT_LOG_ASYNC", "1") != "0"
+AUDIT_LOG_QUEUE_SIZE = int(os.getenv("AUDIT_LOG_QUEUE_SIZE", "10000"))
+# SQLite'ın eski sürümlerinde sorgu başına 999 parametre sınırı var
+AUDIT_LOG_BATCH = int(os.getenv("AUDIT_LOG_BATCH", "100"))
+AUDIT_LOG_INTERVAL = float(os.getenv("AUDIT_LOG_INTERVAL", "1.0"))
+
+_writers = []
+
+
+class AuditLogWriter:
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = tuple(columns)
+        self._queue = queue.Queue(maxsize=AUDIT_LOG_QUEUE_SIZE)
+        self._wake = threading.Event()
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.stats = {"queued": 0, "written": 0, "sync": 0, "failed": 0}
+        _writers.append(self)
+
+    def write(self, *row):
+        """Satırı kuyruğa ekler; kuyruk kullanılamıyorsa hemen yazar."""
+        if len(row) != len(self.columns):
+            raise ValueError(f"{self.table}: {len(self.columns)} kolon beklenirken {len(row)} değer geldi")
+        if AUDIT_LOG_ASYNC and self._ensure_thread():
+            try:
+                self._queue.put_nowait(row)
+                self.stats["queued"] += 1
+                if self._queue.qsize() >= AUDIT_LOG_BATCH:
+                    self._wake.set()
+                return
+            except queue.Full:
+                pass
+        self.stats["sync"] += 1
+        self._insert([row])
+
+    def flush(self):
+        """
+        Bekleyen tüm satırları çağıranın thread'inde yazar. Kilit kuyruk
+        kontrolünden önce alınır: arka plan thread'i son partiyi kuyruktan
+        almış ama henüz yazmamışsa okuyan taraf o INSERT bitene kadar bekler.
+        """
+        with self._write_lock:
+            while True:
+                batch = self._drain()
+                if not batch:
+                    return
+                self._insert(batch)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _ensure_thread(self):
+        # Fork edilen worker'lar ebeveynin thread'ini devralmaz; süreç başına bir thread
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return True
+        with self._start_lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return True
+            try:
+                thread = threading.Thread(target=self._run, name=f"audit-log-{self.table}", daemon=True)
+                thread.start()
+            except RuntimeError as e:
+                print(f"Log thread'i başlatılamadı ({self.table}): {e}")
+                return False
+            self._thread, self._pid = thread, pid
+            return True
+
+    def _run(self):
+        while True:
+            self._wake.wait(AUDIT_LOG_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                print(f"Log yazılamadı ({self.table}):\n{traceback.format_exc()}")
+
+    def _drain(self):
+        batch = []
+        while len(batch) < AUDIT_LOG_BATCH:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _insert(self, rows):
+        cols = ", ".join(self.columns)
+        placeholder = "(" + ", ".join(["%s"] * len(self.columns)) + ")"
+        try:
+            with get_conn() as conn:
+                c = conn.cursor()
+                c.execute(
+                    f"INSERT INTO {self.table} ({cols}) VALUES {', '.join([placeholder] * len(rows))}",
+                    tuple(v for row in rows for v in row),
+                )
+                conn.commit()
+            self.stats["written"] += len(rows)
+        except Exception as e:
+            if len(rows) == 1:
+                self.stats["failed"] += 1
+                print(f"Log yazılamadı ({self.table}): {e}")
+                return
+            # Hatalı tek satır bütün partiyi kaybettirmesin
+            for row in rows:
+                self._insert([row])
+
+
+def flush_all():
+    for writer in _writers:
+        try:
+            writer.flush()
+        except Exception as e:
+            print(f"Log kuyruğu boşaltılamadı ({writer.table}): {e}")
+
+
+def get_audit_log_stats():
+    return {w.table: dict(w.stats, pending=w.pending()) for w in _writers}
+
+
+atexit.register(flush_all)
+
+kdv_system_log = AuditLogWriter("kdv_system_logs", ("date", "user_name", "action", "description"))
+login_log = AuditLogWriter("login_logs", ("user_id", "username", "ip_address", "user_agent", "success"))
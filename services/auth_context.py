@@ -0,0 +1,145 @@
+"""
+İstek başına yetki bağlamı.
+
+Dekoratörler ve kapsam sorguları; rol, onay/askı durumu, KDV erişimi ve
+atanmış mükellefler için ayrı ayrı veritabanına gitmek yerine bu bağlamı
+kullanır. Bağlam istek boyunca `g` üzerinde bir kez kurulur ve kullanıcı başına
+kısa süre (AUTH_CONTEXT_TTL) süreç içinde önbelleklenir.
+
+Rol, askı, onay, KDV erişimi veya atamaları değiştiren uç noktalar
+`invalidate_auth_context()` çağırır; diğer worker'lar güncel veriyi en geç TTL
+sonunda görür.
+"""
+import os
+import threading
+import time
+
+from flask import g, has_app_context, session
+
+from services.db import get_conn
+
+AUTH_CONTEXT_TTL = float(os.getenv("AUTH_CONTEXT_TTL", "30"))
+
+# Tüm mükellefleri gören roller
+FULL_ACCESS_ROLES = ("admin", "ymm", "yonetici")
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class AuthContext:
+    __slots__ = ("user_id", "username", "role", "is_approved", "is_suspended",
+                 "has_kdv_access", "assigned_mukellef_ids")
+
+    def __init__(self, user_id, username, role, is_approved, is_suspended, has_kdv_access, assigned_mukellef_ids):
+        self.user_id = user_id
+        self.username = username
+        self.role = role
+        self.is_approved = is_approved
+        self.is_suspended = is_suspended
+        self.has_kdv_access = has_kdv_access
+        self.assigned_mukellef_ids = frozenset(assigned_mukellef_ids)
+
+    @property
+    def is_active(self):
+        # Girişteki kontrolle aynı: açıkça onaysız (0) veya askıda (1) değilse aktif
+        return self.is_approved != 0 and self.is_suspended != 1
+
+    @property
+    def is_system_admin(self):
+        return (self.username or "").lower() == "admin"
+
+    @property
+    def can_access_kdv(self):
+        return bool(self.has_kdv_access) or self.is_system_admin
+
+    @property
+    def sees_all_mukellef(self):
+        return self.role in FULL_ACCESS_ROLES
+
+    def can_access_mukellef(self, mukellef_id):
+        """Tam yetkili roller her mükellefi, diğerleri yalnızca atanmış olanları görür."""
+        if self.sees_all_mukellef:
+            return True
+        try:
+            return int(mukellef_id) in self.assigned_mukellef_ids
+        except (TypeError, ValueError):
+            return False
+
+
+def _load(user_id):
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(
+            "SELECT id, username, role, is_approved, is_suspended, has_kdv_access FROM users WHERE id = %s",
+            (user_id,),
+        )
+        row = c.fetchone()
+        if not row:
+            return None
+        c.execute("SELECT mukellef_id FROM kdv_user_assignments WHERE user_id = %s", (user_id,))
+        assigned = [r["mukellef_id"] for r in c.fetchall()]
+    return AuthContext(
+        row["id"], row["username"], row["role"], row["is_approved"],
+        row["is_suspended"], row["has_kdv_access"], assigned,
+    )
+
+
+def load_auth_context(user_id):
+    """Kullanıcının bağlamı (TTL önbellekli); kullanıcı yoksa None."""
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(user_id)
+        if hit is not None and now - hit[0] < AUTH_CONTEXT_TTL:
+            return hit[1]
+    ctx = _load(user_id)
+    with _cache_lock:
+        for stale in [k for k, (ts, _) in _cache.items() if now - ts >= AUTH_CONTEXT_TTL]:
+            del _cache[stale]
+        _cache[user_id] = (now, ctx)
+    return ctx
+
+
+def get_auth_context():
+    """Oturumdaki kullanıcının bu istek için bağlamı; oturum yoksa None."""
+    if "_auth_context" in g:
+        return g._auth_context
+    user_id = session.get("user_id")
+    ctx = load_auth_context(user_id) if user_id else None
+    if ctx is not None:
+        # Route gövdeleri session'daki rolü okur; yönetici değişikliği oturuma da yansısın
+        if session.get("role") != ctx.role:
+            session["role"] = ctx.role
+        if session.get("has_kdv_access") != bool(ctx.has_kdv_access):
+            session["has_kdv_access"] = bool(ctx.has_kdv_access)
+    g._auth_context = ctx
+    return ctx
+
+
+def invalidate_auth_context(user_id=None):
+    """Verilen kullanıcının (verilmezse herkesin) önbellekteki bağlamını düşürür."""
+    with _cache_lock:
+        if user_id is None:
+            _cache.clear()
+        else:
+            try:
+                _cache.pop(int(user_id), None)
+            except (TypeError, ValueError):
+                _cache.clear()
+    if has_app_context():
+        g.pop("_auth_context", None)
+
+
+def mukellef_scope_sql(ctx, mukellef_col="mukellef_id", user_col="user_id"):
+    """
+    Rol kapsamı için WHERE eki ve parametreleri:
+    tam yetkili roller -> kısıt yok, uzman -> atanmış mükellefler, diğerleri -> kendi kayıtları.
+    """
+    if ctx.sees_all_mukellef:
+        return "", []
+    if ctx.role == "uzman":
+        ids = sorted(ctx.assigned_mukellef_ids)
+        if not ids:
+            return " AND 1=0", []
+        return f" AND {mukellef_col} IN ({','.join(['%s'] * len(ids))})", ids
+    return f" AND {user_col} = %s", [ctx.user_id]
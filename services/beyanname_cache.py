@@ -0,0 +1,163 @@
+"""
+Çözülmüş beyanname verileri için süreç içi LRU önbellek.
+
+Rapor ekranları aynı `beyanname.veriler` blob'unu dönem/sekme değiştikçe
+tekrar tekrar çözüyordu. Burada çözülmüş ve JSON'dan ayrıştırılmış veri
+`(beyanname.id, yuklenme_tarihi)` anahtarıyla saklanır; satır yeniden
+yazıldığında yuklenme_tarihi değiştiği için eski kayıt kendiliğinden ıskalanır,
+kaydet/sil işlemleri ayrıca `invalidate()` ile kaydı hemen düşürür.
+
+Önbellek bellek bütçesiyle sınırlıdır (BEYANNAME_CACHE_MB, çözülmüş JSON
+metninin boyutu üzerinden). Dönen veriler paylaşılır; çağıran değiştirmemelidir.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from extensions import fernet
+
+BEYANNAME_CACHE_MB = float(os.getenv("BEYANNAME_CACHE_MB", "64"))
+
+
+def decrypt_veriler(blob):
+    """beyanname.veriler (BYTEA/memoryview) -> ayrıştırılmış JSON ve metin boyutu."""
+    data = blob.tobytes() if isinstance(blob, memoryview) else blob
+    plain = fernet.decrypt(data)
+    return json.loads(plain.decode("utf-8")), len(plain)
+
+
+class BeyannameCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # (id, yuklenme_tarihi) -> (veri, boyut)
+        self._keys_by_id = {}           # id -> {anahtarlar}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key, payload, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (payload, size)
+            self._keys_by_id.setdefault(key[0], set()).add(key)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= entry[1]
+        keys = self._keys_by_id.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_id[key[0]]
+        return True
+
+    def invalidate(self, beyanname_ids):
+        with self._lock:
+            for beyanname_id in beyanname_ids:
+                for key in list(self._keys_by_id.get(beyanname_id, ())):
+                    if self._drop(key):
+                        self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_id.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update({
+                "pid": os.getpid(),
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            })
+        return data
+
+
+_cache = BeyannameCache(int(BEYANNAME_CACHE_MB * 1024 * 1024))
+
+
+def load_payload(cursor, row):
+    """
+    `row` en az id ve yuklenme_tarihi içermelidir. Önbellekte yoksa veriler
+    satırdan (varsa) ya da `cursor` ile tek satırlık sorguyla alınıp çözülür.
+    Blob bulunamazsa None döner.
+    """
+    key = (row["id"], row["yuklenme_tarihi"])
+    payload = _cache.get(key)
+    if payload is not None:
+        return payload
+
+    blob = row["veriler"] if "veriler" in row.keys() else None
+    if blob is None:
+        cursor.execute("SELECT veriler FROM beyanname WHERE id=%s", (row["id"],))
+        fetched = cursor.fetchone()
+        if not fetched:
+            return None
+        blob = fetched["veriler"]
+    payload, size = decrypt_veriler(blob)
+    _cache.put(key, payload, size)
+    return payload
+
+
+def load_payloads(cursor, rows):
+    """
+    Birden çok satır için `load_payload`: önbellekte olmayanların blob'ları tek
+    sorguda alınıp çözülür. `rows` id ve yuklenme_tarihi içermelidir.
+    Dönüş: {beyanname.id: veri}; blob'u bulunamayanlar dönmez.
+    """
+    out, missing = {}, []
+    for row in rows:
+        payload = _cache.get((row["id"], row["yuklenme_tarihi"]))
+        if payload is None:
+            missing.append(row)
+        else:
+            out[row["id"]] = payload
+    if not missing:
+        return out
+
+    marks = ",".join(["%s"] * len(missing))
+    cursor.execute(f"SELECT id, veriler FROM beyanname WHERE id IN ({marks})", [row["id"] for row in missing])
+    blobs = {r["id"]: r["veriler"] for r in cursor.fetchall()}
+    for row in missing:
+        blob = blobs.get(row["id"])
+        if blob is None:
+            continue
+        payload, size = decrypt_veriler(blob)
+        _cache.put((row["id"], row["yuklenme_tarihi"]), payload, size)
+        out[row["id"]] = payload
+    return out
+
+
+def invalidate(*beyanname_ids):
+    """Satır yeniden yazıldığında veya silindiğinde ilgili kayıtları düşürür."""
+    _cache.invalidate(beyanname_ids)
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def get_cache_stats():
+    return _cache.stats()
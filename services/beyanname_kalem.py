@@ -0,0 +1,92 @@
+"""
+Beyanname satırları (kalemler) için çok dönemli okuma.
+
+Raporlar (trend grafiği, KDV dışa aktarımı, dönemsel analiz) bir mükellefin
+birden çok dönemindeki bilanço/gelir/KDV satırlarının tamamına ihtiyaç duyar.
+`kalemleri_getir` seçili beyannameleri tek sorguda bulur ve belgeleri
+`beyanname_cache` üzerinden açar (önbellekte yoksa tek sorgu, belge başına tek
+çözme); satırlar belge türüne göre bilinen bölümlerden alınır.
+"""
+from services.beyanname_cache import load_payloads
+from services.utils import kdv_kolonu, month_key
+
+# Belge türü -> satır listesi içeren bölümler
+KALEM_BOLUMLERI = {
+    "kdv": ("veriler",),
+    "bilanco": ("aktif", "pasif"),
+    "bilanco_enf": ("aktif", "pasif"),
+    "gelir": ("tablo",),
+    "gelir_enf": ("tablo",),
+    "mizan": ("aktif", "pasif", "gelir"),
+}
+
+
+def _in(values):
+    return ",".join(["%s"] * len(values))
+
+
+def _belgeler(cursor, user_id, vkn, donemler, turler):
+    """{(donem, tur): (beyanname satırı, çözülmüş belge)}; aynı dönem/tür için ilk (en küçük id) beyanname."""
+    cursor.execute(f"""
+        SELECT b.id, b.donem, b.tur, b.yuklenme_tarihi
+        FROM beyanname b
+        JOIN mukellef m ON m.id = b.mukellef_id
+        WHERE b.user_id=%s AND m.vergi_kimlik_no=%s
+          AND b.donem IN ({_in(donemler)}) AND b.tur IN ({_in(turler)})
+        ORDER BY b.id
+    """, [user_id, vkn, *donemler, *turler])
+    secilen = {}
+    for row in cursor.fetchall():
+        secilen.setdefault((row["donem"], row["tur"]), row)
+    payloads = load_payloads(cursor, list(secilen.values()))
+    return {key: (row, payloads.get(row["id"])) for key, row in secilen.items()}
+
+
+def kalemleri_getir(cursor, user_id, vkn, donemler, turler, bolumler=None):
+    """
+    Bir mükellefin verilen dönem/türlerdeki kalemlerini getirir.
+    Dönüş: {(donem, tur): {bolum: [satir, ...]}}; satırlar belgedeki sırayla.
+    Aynı dönem/tür için birden fazla beyanname varsa ilki (en küçük id) kullanılır.
+    Dönen satırlar önbellekle paylaşılabilir; çağıran değiştirmemelidir.
+    """
+    donemler, turler = list(donemler), list(turler)
+    if not donemler or not turler:
+        return {}
+
+    sonuc = {}
+    for key, (row, data) in _belgeler(cursor, user_id, vkn, donemler, turler).items():
+        if not isinstance(data, dict):
+            continue
+        for bolum in KALEM_BOLUMLERI.get(row["tur"], ()):
+            if bolumler and bolum not in bolumler:
+                continue
+            satirlar = [satir for satir in data.get(bolum) or [] if isinstance(satir, dict)]
+            if satirlar:
+                sonuc.setdefault(key, {})[bolum] = satirlar
+    return sonuc
+
+
+def kdv_kolonlari(cursor, user_id, vkn, donemler):
+    """
+    KDV raporunun ekran ve dışa aktarım görünümleri için ortak kolonlar ve veri.
+    Dönüş: (kolonlar, kdv_data)
+        kolonlar  [(anahtar, etiket), ...] kronolojik; etiket beyannamenin kendi
+                  dönemi (yoksa kayıttaki dönem) kdv_kolonu biçiminde, anahtar
+                  services.donem anahtarı (tanınmayan dönemler sonda)
+        kdv_data  {alan: {etiket: deger}}
+    """
+    donemler = list(donemler)
+    if not donemler:
+        return [], {}
+
+    etiketler, kdv_data = {}, {}
+    for (donem, _), (row, data) in _belgeler(cursor, user_id, vkn, donemler, ["kdv"]).items():
+        if not isinstance(data, dict):
+            continue
+        etiket = kdv_kolonu(data.get("donem") or donem)
+        etiketler[etiket] = month_key(etiket)
+        for rec in data.get("veriler") or []:
+            if isinstance(rec, dict) and "alan" in rec:
+                kdv_data.setdefault(rec["alan"], {})[etiket] = rec.get("deger")
+    kolonlar = sorted(((anahtar, etiket) for etiket, anahtar in etiketler.items()))
+    return kolonlar, kdv_data
@@ -1,9 +1,14 @@
 import os
+import re
+import time
 import sqlite3
+import threading
+from collections import deque
 import psycopg2
 from psycopg2 import extras
 from contextlib import contextmanager
 from dotenv import load_dotenv
+from flask import g, current_app, has_request_context
 
 load_dotenv(override=True)
 
@@ -52,22 +57,63 @@ if USE_SQLITE:
 else:
     print("Production ortamı algılandı - PostgreSQL kullanılacak")
 
+# Havuz ayarlari (gunicorn worker basina)
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+POOL_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", "30"))
+
 _db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+
+
+# ============================================================
+# Sorgu Dinleyicileri (denetim / hata ayıklama)
+# ============================================================
+# Her execute() çağrısında listener(query, params) çağrılır; sorgu yazıldığı
+# haliyle (PostgreSQL sözdizimi, %s yer tutucular) iletilir.
+_query_listeners = []
 
 
+def add_query_listener(listener):
+    _query_listeners.append(listener)
 
 
+def remove_query_listener(listener):
+    try:
+        _query_listeners.remove(listener)
+    except ValueError:
+        pass
+
+
+def _notify_query(query, params):
+    for listener in list(_query_listeners):
+        listener(query, params)
+
 
 # ============================================================
 # PostgreSQL-benzeri SQLite Wrapper
 # ============================================================
+def _yer_tutuculari_cevir(query, params):
+    """%s -> ?; parametreli sorgularda psycopg2 gibi %% -> % (ör. "anahtar %% 10")."""
+    if params is None:
+        return query.replace("%s", "?")
+    return re.sub(r"%([%s])", lambda m: "?" if m.group(1) == "s" else "%", query)
+
+
 class FakeCursor:
     def __init__(self, sqlite_cursor):
         self.sqlite_cursor = sqlite_cursor
 
     def execute(self, query, params=None):
+        if _query_listeners:
+            _notify_query(query, params)
+
         # PostgreSQL sözdizimini SQLite uyumlu hale getir
-        q = query.replace("%s", "?")
+        q = _yer_tutuculari_cevir(query, params)
         sqlite_params = list(params or ())
 
         # PostgreSQL ANY(list) kullanan sorgulari SQLite IN (...) haline getir.
@@ -84,6 +130,12 @@ class FakeCursor:
 
         self.sqlite_cursor.execute(q, sqlite_params)
 
+    def executemany(self, query, params_seq):
+        params_seq = [list(p) for p in params_seq]
+        if _query_listeners:
+            _notify_query(query, params_seq[0] if params_seq else None)
+        self.sqlite_cursor.executemany(_yer_tutuculari_cevir(query, params_seq), params_seq)
+
     def fetchall(self):
         return [dict(row) for row in self.sqlite_cursor.fetchall()]
 
@@ -101,6 +153,10 @@ class FakeCursor:
     def lastrowid(self):
         return self.sqlite_cursor.lastrowid
 
+    @property
+    def rowcount(self):
+        return self.sqlite_cursor.rowcount
+
     def close(self):
         self.sqlite_cursor.close()
 
@@ -114,13 +170,20 @@ class FakeCursor:
 
 class FakeConnection:
     def __init__(self, path):
-        self.conn = sqlite3.connect(path)
+        # Havuzdaki bağlantı farklı thread'lerde (ama aynı anda tek thread'de) kullanılabilir
+        self.conn = sqlite3.connect(path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
         self.conn.execute("PRAGMA foreign_keys = ON;")
 
     def cursor(self, *args, **kwargs):
         return FakeCursor(self.conn.cursor())
 
+    def begin(self):
+        # sqlite3 transaction'ı yalnızca DML'den önce açar; dışarıda açılan bir SAVEPOINT'in
+        # RELEASE'i commit olur. Birden çok kaydı tek transaction'da toplamak için açıkça başlatılır.
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+
     def commit(self):
         self.conn.commit()
 
@@ -131,38 +194,348 @@ class FakeConnection:
         self.conn.close()
 
 
+_observed_cursor_classes = {}
+
+
+def _observed_cursor_class(factory):
+    cls = _observed_cursor_classes.get(factory)
+    if cls is None:
+        class ObservedCursor(factory):
+            def execute(self, query, vars=None):
+                if _query_listeners:
+                    _notify_query(query, vars)
+                return super().execute(query, vars)
+
+        cls = _observed_cursor_classes[factory] = ObservedCursor
+    return cls
+
+
+class ObservedConnection(psycopg2.extensions.connection):
+    """İstenen cursor_factory ne olursa olsun execute() çağrılarını dinleyicilere bildirir."""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs["cursor_factory"] = _observed_cursor_class(factory)
+        return super().cursor(*args, **kwargs)
+
+
 # ============================================================
-# get_conn() - Ortama Gore Baglanti
+# Baglanti Havuzu
 # ============================================================
-@contextmanager
-def get_conn():
-    # Her çağrıda .env'den taze oku (Flask watchdog yeniden başlatma sorunu için)
-    load_dotenv(override=True)
-    _db_url = os.getenv("DATABASE_URL", "").strip()
-    _use_sqlite = _should_use_sqlite(_db_url)
-
-    if _use_sqlite:
-        _path = _sqlite_path(_db_url)
-        os.makedirs(os.path.dirname(_path) if os.path.dirname(_path) else ".", exist_ok=True)
-        conn = FakeConnection(_path)
+class PoolTimeout(Exception):
+    """Havuzda belirtilen süre içinde boş bağlantı bulunamadı."""
+
+
+# Fork sonrası ebeveynden kalan bağlantılar burada tutulur; GC kapatmaya
+# çalışırsa ebeveynin soketine 'terminate' gönderilir, bu yüzden bilerek sızdırılır.
+_FORK_ORPHANS = []
+
+
+class ConnectionPool:
+    """
+    Süreç başına bağlantı havuzu.
+    - min_size kadar bağlantı sıcak tutulur, max_size doluysa timeout kadar beklenir.
+    - ping_interval'dan uzun süre boşta kalan bağlantı checkout'ta 'SELECT 1' ile yoklanır.
+    - max_idle süresini aşan (min_size üstündeki) boşta bağlantılar kapatılır.
+    - Fork sonrası (gunicorn --preload) çocuk süreç ebeveynin bağlantılarını kullanmaz.
+    """
+
+    def __init__(self, factory, min_size=1, max_size=10, timeout=10.0,
+                 max_idle=300.0, ping_interval=30.0, ping=None):
+        self._factory = factory
+        self._ping = ping
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.ping_interval = ping_interval
+        self._init_state()
+
+    def _init_state(self):
+        self._cond = threading.Condition()
+        self._idle = deque()        # (conn, son_kullanim) - soldaki en eski
+        self._size = 0              # açık bağlantı sayısı (boşta + kullanımda)
+        self._pid = os.getpid()
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "closed": 0,
+            "health_check_failures": 0,
+        }
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            _FORK_ORPHANS.extend(conn for conn, _ in self._idle)
+            self._init_state()
+
+    @staticmethod
+    def _close(conn):
         try:
-            yield conn
-        finally:
             conn.close()
-    else:
-        conn = psycopg2.connect(
-            _db_url,
-            sslmode="require",
-            connect_timeout=5
-        )
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_closed(conn):
+        return bool(getattr(conn, "closed", 0))
+
+    def _healthy(self, conn):
+        if self._is_closed(conn):
+            return False
+        if self._ping is None:
+            return True
         try:
+            self._ping(conn)
+            return True
+        except Exception:
+            return False
+
+    def _reap_idle_locked(self, now):
+        expired = []
+        while (self._idle and self._size > self.min_size
+               and now - self._idle[0][1] > self.max_idle):
+            expired.append(self._idle.popleft()[0])
+            self._size -= 1
+            self._stats["closed"] += 1
+        return expired
+
+    def getconn(self):
+        self._check_fork()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        conn = last_used = None
+        with self._cond:
+            expired = self._reap_idle_locked(start)
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()  # LIFO: en sıcak bağlantı
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"{self.timeout:.1f} sn içinde boş veritabanı bağlantısı bulunamadı.")
+                waited = True
+                self._cond.wait(remaining)
+
+            self._stats["checkouts"] += 1
+            if waited:
+                elapsed = time.monotonic() - start
+                self._stats["waits"] += 1
+                self._stats["wait_time_total"] += elapsed
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], elapsed)
+
+        for old in expired:
+            self._close(old)
+
+        if conn is not None and time.monotonic() - last_used > self.ping_interval:
+            if not self._healthy(conn):
+                self._close(conn)
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                    self._stats["closed"] += 1
+                conn = None
+
+        if conn is None:
+            try:
+                conn = self._factory()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats["created"] += 1
+        return conn
+
+    def putconn(self, conn, discard=False):
+        if self._pid != os.getpid():
+            # Başka süreçte açılmış bağlantı; dokunmadan bırak
+            _FORK_ORPHANS.append(conn)
+            return
+        broken = discard or self._is_closed(conn)
+        if not broken:
+            try:
+                conn.rollback()  # yarım kalan transaction'ı temizle
+            except Exception:
+                broken = True
+        with self._cond:
+            if broken:
+                self._size -= 1
+                self._stats["closed"] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if broken:
+            self._close(conn)
+
+    def closeall(self):
+        with self._cond:
+            conns = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(conns)
+            self._stats["closed"] += len(conns)
+        for conn in conns:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._stats)
+            data.update({
+                "pid": self._pid,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+            })
+        return data
+
+
+def _ping_conn(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1")
+    conn.rollback()
+
+
+def _build_pool(db_url):
+    if _should_use_sqlite(db_url):
+        path = _sqlite_path(db_url)
+        os.makedirs(os.path.dirname(path) if os.path.dirname(path) else ".", exist_ok=True)
+        factory = lambda: FakeConnection(path)
+        ping = None
+    else:
+        def factory():
+            conn = psycopg2.connect(
+                db_url, sslmode="require", connect_timeout=5, connection_factory=ObservedConnection
+            )
             conn.cursor_factory = extras.RealDictCursor
+            return conn
+        ping = _ping_conn
+
+    pool = ConnectionPool(
+        factory,
+        min_size=POOL_MIN_SIZE,
+        max_size=POOL_MAX_SIZE,
+        timeout=POOL_TIMEOUT,
+        max_idle=POOL_MAX_IDLE,
+        ping_interval=POOL_PING_INTERVAL,
+        ping=ping,
+    )
+    pool.db_url = db_url
+    return pool
+
+
+def get_pool():
+    """Süreç genelindeki havuzu döner, yoksa (veya fork sonrası) oluşturur."""
+    global _db_pool
+    pool = _db_pool
+    if pool is not None and pool._pid == os.getpid():
+        return pool
+    with _db_pool_lock:
+        if _db_pool is None or _db_pool._pid != os.getpid():
+            _db_pool = _build_pool(os.getenv("DATABASE_URL", "").strip())
+        return _db_pool
+
+
+def reset_pool():
+    """Havuzu kapatır; bir sonraki get_conn() güncel DATABASE_URL ile yeni havuz kurar."""
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is not None:
+            _db_pool.closeall()
+        _db_pool = None
+
+
+def get_pool_stats():
+    return get_pool().stats()
+
+
+def _after_fork_in_child():
+    global _db_pool, _db_pool_lock
+    _db_pool_lock = threading.Lock()
+    if _db_pool is not None:
+        _FORK_ORPHANS.extend(conn for conn, _ in _db_pool._idle)
+    _db_pool = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+# ============================================================
+# get_conn() - Ortama Gore Baglanti
+# ============================================================
+def _request_scope_enabled():
+    return has_request_context() and current_app.extensions.get("db_request_scope", False)
+
+
+def _safe_rollback(conn):
+    try:
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+@contextmanager
+def get_conn():
+    """
+    Havuzdan bağlantı verir. init_app() ile kayıtlı bir uygulamada istek
+    boyunca tek bağlantı kullanılır (g._db_conn) ve teardown'da havuza iade edilir.
+
+    Her blok kendi bağlantısıyla çalışıyormuş gibi davranır: blok biterken
+    commit edilmemiş iş (veya yutulmuş bir hatanın bıraktığı bozuk transaction)
+    geri alınır; sonraki blok temiz bir transaction'la başlar. İç içe bloklar
+    (istek bağlantısı zaten kullanımdayken) havuzdan ayrı bağlantı alır.
+    """
+    scoped = _request_scope_enabled() and not g.get("_db_conn_busy")
+    if not scoped:
+        pool = get_pool()
+        conn = pool.getconn()
+        discard = False
+        try:
             yield conn
         except Exception:
-            conn.rollback()
+            discard = not _safe_rollback(conn)
             raise
         finally:
-            conn.close()
+            pool.putconn(conn, discard=discard)
+        return
+
+    conn = g.get("_db_conn")
+    if conn is None:
+        g._db_conn_pool = get_pool()
+        conn = g._db_conn = g._db_conn_pool.getconn()
+    g._db_conn_busy = True
+    try:
+        yield conn
+    finally:
+        g._db_conn_busy = False
+        # Havuza iade eder gibi: yarım kalan transaction'ı temizle; temizlenemiyorsa bağlantıyı bırak
+        if not _safe_rollback(conn):
+            g.pop("_db_conn", None)
+            g.pop("_db_conn_pool").putconn(conn, discard=True)
+
+
+def release_request_conn(exc=None):
+    conn = g.pop("_db_conn", None)
+    pool = g.pop("_db_conn_pool", None)
+    if conn is not None and pool is not None:
+        pool.putconn(conn)
+
+
+def init_app(app):
+    """İstek başına tek bağlantı kapsamını etkinleştirir."""
+    app.extensions["db_request_scope"] = True
+    app.teardown_appcontext(release_request_conn)
 
 
 
@@ -184,6 +557,53 @@ def execute(query, params=None):
         conn.commit()
 
 
+def bulk_upsert(cur, table, columns, rows, conflict=None, update=None, page_size=500):
+    """
+    Satırları tek seferde yazar (çağıranın transaction'ı içinde, commit etmez).
+
+        PostgreSQL  execute_values -> page_size satırlık çok satırlı INSERT
+        SQLite      executemany    -> tek transaction içinde hazırlanmış INSERT
+
+    conflict: ON CONFLICT kolonları; update: çakışmada güncellenecek kolonlar
+    (None -> conflict dışındaki tüm kolonlar, boş liste -> DO NOTHING).
+    Yazılan satır sayısını döner.
+    """
+    rows = [tuple(r) for r in rows]
+    if not rows:
+        return 0
+    cols = ", ".join(columns)
+    tail = ""
+    if conflict:
+        if update is None:
+            update = [c for c in columns if c not in conflict]
+        action = (
+            "DO UPDATE SET " + ", ".join(f"{c} = EXCLUDED.{c}" for c in update)
+            if update else "DO NOTHING"
+        )
+        tail = f" ON CONFLICT ({', '.join(conflict)}) {action}"
+
+    if USE_SQLITE:
+        placeholders = ", ".join(["%s"] * len(columns))
+        cur.executemany(f"INSERT INTO {table} ({cols}) VALUES ({placeholders}){tail}", rows)
+    else:
+        extras.execute_values(cur, f"INSERT INTO {table} ({cols}) VALUES %s{tail}", rows, page_size=page_size)
+    return len(rows)
+
+
+def changed_rows(rows, loaded, key_size=1):
+    """
+    Yalnızca yeni veya değeri değişmiş satırlar.
+    rows: (anahtar..., değer...) demetleri; loaded: {anahtar: (değer...)} (tek kolonlu anahtar için skaler).
+    """
+    out = []
+    for row in rows:
+        row = tuple(row)
+        key = row[0] if key_size == 1 else row[:key_size]
+        if loaded.get(key) != row[key_size:]:
+            out.append(row)
+    return out
+
+
 # ============================================================
 # migrate_* Fonksiyonlari
 # ============================================================
@@ -268,6 +688,7 @@ def migrate_users_table():
                         print(f"'{name}' sutunu eklendi.")
                     except Exception as e:
                         print(f"'{name}' sutunu eklenemedi: {e}")
+                        raise
 
         conn.commit()
     print("Users tablosu kontrol edildi.")
@@ -331,6 +752,7 @@ def migrate_mukellef_table():
                         print(f"'{name}' sutunu eklendi.")
                     except Exception as e:
                         print(f"'{name}' sutunu eklenemedi: {e}")
+                        raise
         conn.commit()
     print("Mukellef tablosu kontrol edildi.")
 
@@ -649,6 +1071,7 @@ def migrate_tesvik_kullanim_table():
 
         except Exception as e:
             print(f"Eksik sutun kontrolu hatasi: {e}")
+            raise
 
         # ===========================
         # Unique Constraint
@@ -670,6 +1093,7 @@ def migrate_tesvik_kullanim_table():
                 print("UNIQUE constraint kontrol edildi.")
             except Exception as e:
                 print(f"UNIQUE constraint hatasi: {e}")
+                raise
 
         conn.commit() 
         print("Tesvik_kullanim tablosu kontrol edildi.") 
@@ -763,10 +1187,12 @@ def migrate_donem_matrah_table():
                 conn.commit()
             except Exception as e:
                 print(f"donem_matrah eksik sutun kontrolu hatasi: {e}")
+                raise
 
             print("donem_matrah tablosu kontrol edildi.")
         except Exception as e:
             print(f"migrate_donem_matrah_table hatasi: {e}")
+            raise
  
  
  
@@ -851,6 +1277,7 @@ def migrate_profit_data_table():
             conn.commit()
         except Exception as e:
             print(f"Migrate_profit_data_table hatasi: {e}")
+            raise
 
 def migrate_kdv_mukellef_table():
     """KDV Portalı için ayrıştırılmış mükellef tablosu."""
@@ -918,7 +1345,7 @@ def migrate_kdv_tables():
                 cur.execute("SELECT column_name FROM information_schema.columns WHERE table_name='kdv_files'")
                 cols = {r["column_name"] for r in cur.fetchall()}
             
-            if "amount_guarantee" not in cols:
+            if cols and "amount_guarantee" not in cols:
                 print("Adding amount_guarantee column to kdv_files...")
                 if USE_SQLITE:
                     cur.execute("ALTER TABLE kdv_files ADD COLUMN amount_guarantee REAL DEFAULT 0")
@@ -927,6 +1354,7 @@ def migrate_kdv_tables():
                 conn.commit()
         except Exception as e:
             print(f"Migration error for amount_guarantee: {e}")
+            raise
 
 
             try:
@@ -952,6 +1380,7 @@ def migrate_kdv_tables():
                 amount_tenzil REAL DEFAULT 0,
                 amount_bloke REAL DEFAULT 0,
                 amount_resolved REAL DEFAULT 0,
+                amount_guarantee REAL DEFAULT 0,
                 status TEXT NOT NULL,
                 location TEXT,
                 date TEXT NOT NULL,
@@ -1142,6 +1571,7 @@ def migrate_kdv_documents_table():
                 conn.commit()
         except Exception as e:
             print(f"migrate_kdv_documents_table hatasi: {e}")
+            raise
 
 def migrate_kdv_notes_table():
     """KDV dosyaları için hızlı bilgi/notlar tablosunu oluşturur."""
@@ -1225,3 +1655,336 @@ def migrate_beyanname_table():
             """)
         conn.commit()
     print("beyanname tablosu kontrol edildi.")
+
+def migrate_upload_jobs_table():
+    """Çoklu yükleme (/yukle-coklu) arka plan işlerinin durum tablosunu oluşturur."""
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS upload_jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            done INTEGER NOT NULL DEFAULT 0,
+            results TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        """)
+        conn.commit()
+    print("upload_jobs tablosu kontrol edildi.")
+
+def migrate_beyanname_kalem_table():
+    """
+    Sürüm 4 beyanname_kalem satır deposunu kurup dolduruyordu. Raporlar
+    bölümlerin tamamını beyanname_cache üzerinden okuduğu için depo kaldırıldı
+    (migrate_drop_beyanname_kalem); sürüm numarası korunur, adım bir şey yapmaz.
+    """
+
+def migrate_kdv_files_typed_cols():
+    """
+    kdv_files için panel istatistiklerinde kullanılan tipli tarih kolonlarını
+    (completed_on, guarantee_start, period_month) ekler ve boş olanları doldurur.
+    """
+    from services.kdv_stats import typed_columns
+
+    with get_conn() as conn:
+        cur = conn.cursor()
+        if USE_SQLITE:
+            cur.execute("PRAGMA table_info(kdv_files)")
+            existing = {r["name"] for r in cur.fetchall()}
+        else:
+            cur.execute("SELECT column_name FROM information_schema.columns WHERE table_name='kdv_files'")
+            existing = {r["column_name"].lower() for r in cur.fetchall()}
+
+        for col in ["completed_on", "guarantee_start", "period_month"]:
+            if col not in existing:
+                print(f"'{col}' sutunu kdv_files tablosuna ekleniyor...")
+                cur.execute(f"ALTER TABLE kdv_files ADD COLUMN {col} DATE")
+        conn.commit()
+
+        cur.execute("""
+            SELECT id, date, guarantee_date, completed_at, period FROM kdv_files
+            WHERE period_month IS NULL OR guarantee_start IS NULL
+               OR (completed_at IS NOT NULL AND completed_on IS NULL)
+        """)
+        rows = cur.fetchall()
+        guncellenen = 0
+        for row in rows:
+            degerler = typed_columns(row)
+            if not any(degerler):
+                continue
+            cur.execute(
+                "UPDATE kdv_files SET completed_on = %s, guarantee_start = %s, period_month = %s WHERE id = %s",
+                (*degerler, row["id"]),
+            )
+            guncellenen += 1
+        conn.commit()
+    print(f"kdv_files tipli tarih kolonlari kontrol edildi. ({guncellenen} satir guncellendi)")
+
+# Rotaların gerçek erişim kalıplarına göre ikincil indeksler: (ad, tablo, kolonlar).
+# UNIQUE kısıtları zaten indeks oluşturur; onların kapsadığı kalıplar burada yok:
+#   beyanname (user_id, mukellef_id, donem, tur), mukellef (user_id, vergi_kimlik_no),
+#   kdv_user_assignments (user_id, mukellef_id), donem_matrah (user_id, mukellef_id, donem_text),
+#   tesvik_kullanim (user_id, belge_no, hesap_donemi, donem_turu)
+HOT_INDEXES = [
+    # VKN ile kullanıcıdan bağımsız arama (rapor/KDV eşleştirme) ve ünvana göre listeler
+    ("idx_mukellef_vkn", "mukellef", "vergi_kimlik_no"),
+    ("idx_mukellef_user_unvan", "mukellef", "user_id, unvan"),
+    # Mükellef + dönem/tür (VKN join'li raporlar, mükellef silmede cascade)
+    ("idx_beyanname_mukellef_donem", "beyanname", "mukellef_id, donem, tur"),
+    # KDV dosya listeleri, mükellef özeti, aktif/durum sayımları
+    ("idx_kdv_files_mukellef_active", "kdv_files", "mukellef_id, is_active, status"),
+    ("idx_kdv_files_user_active", "kdv_files", "user_id, is_active"),
+    ("idx_kdv_files_active_period", "kdv_files", "is_active, period_month"),
+    # Uzman kapsamı: mukellef_id üzerinden join
+    ("idx_kdv_user_assignments_mukellef", "kdv_user_assignments", "mukellef_id, user_id"),
+    # Dosya detayı: geçmiş, belgeler, notlar
+    ("idx_kdv_history_file", "kdv_history", "file_id, id"),
+    ("idx_kdv_documents_file", "kdv_documents", "file_id, id"),
+    ("idx_kdv_notes_file", "kdv_notes", "file_id, created_at"),
+    ("idx_kdv_bank_guarantees_mukellef", "kdv_bank_guarantees", "mukellef_id, status"),
+    # Teşvik belgeleri: mükellef listesi ve belge no ile arama
+    ("idx_tesvik_belgeleri_user_mukellef", "tesvik_belgeleri", "user_id, mukellef_id"),
+    ("idx_tesvik_belgeleri_user_belge", "tesvik_belgeleri", "user_id, belge_no"),
+    ("idx_login_logs_user_time", "login_logs", "user_id, login_time"),
+]
+
+def migrate_hot_indexes():
+    """HOT_INDEXES listesindeki ikincil indeksleri (yoksa) oluşturur."""
+    olusturulan = 0
+    with get_conn() as conn:
+        cur = conn.cursor()
+        for name, table, columns in HOT_INDEXES:
+            try:
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+                conn.commit()
+                olusturulan += 1
+            except Exception as e:
+                conn.rollback()
+                print(f"{name} indeksi olusturulamadi: {e}")
+    print(f"Indeksler kontrol edildi. ({olusturulan}/{len(HOT_INDEXES)})")
+    if olusturulan < len(HOT_INDEXES):
+        raise RuntimeError(f"{len(HOT_INDEXES) - olusturulan} indeks olusturulamadi")
+
+def migrate_guest_workspace_tables():
+    """
+    Ziyaretçi çalışma alanı deposu (services/guest_workspace.py).
+    Çerezde yalnızca alan kimliği taşınır; belgeler ve dönem havuzu burada durur.
+    """
+    with get_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS guest_workspace (
+                id TEXT PRIMARY KEY,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS guest_workspace_item (
+                workspace_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                item_id INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (workspace_id, kind, item_id)
+            );
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS guest_workspace_seq (
+                workspace_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                value INTEGER NOT NULL,
+                PRIMARY KEY (workspace_id, name)
+            );
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_guest_workspace_last_seen ON guest_workspace (last_seen)")
+            conn.commit()
+            print("Ziyaretçi çalışma alanı tabloları kontrol edildi.")
+        except Exception as e:
+            conn.rollback()
+            print(f"Ziyaretçi çalışma alanı tabloları oluşturulamadı: {e}")
+            raise
+
+def migrate_tesvik_katki_defteri():
+    """
+    Teşvik katkı defteri: belge + dönem anahtarı başına kümülatif katkılar.
+    Mevcut tesvik_kullanim kayıtlarından doldurma, dönem anahtarı kolonuyla
+    birlikte migrate_donem_anahtari'nda yapılır.
+    """
+    num_type = "REAL" if USE_SQLITE else "DOUBLE PRECISION"
+    with get_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS tesvik_katki_defteri (
+                user_id INTEGER NOT NULL,
+                belge_no TEXT NOT NULL,
+                donem_anahtari INTEGER NOT NULL,
+                hesap_donemi INTEGER NOT NULL,
+                donem_turu TEXT,
+                cari_yatirim_katki {num_type} DEFAULT 0.0,
+                cari_diger_katki {num_type} DEFAULT 0.0,
+                yanan_katki_tutari {num_type} DEFAULT 0.0,
+                kum_yatirim_katki {num_type} DEFAULT 0.0,
+                kum_diger_katki {num_type} DEFAULT 0.0,
+                kum_yanan_katki {num_type} DEFAULT 0.0,
+                kalan_katki_tutari {num_type} DEFAULT 0.0,
+                PRIMARY KEY (user_id, belge_no, donem_anahtari)
+            );
+            """)
+            conn.commit()
+            print("Tesvik_katki_defteri tablosu kontrol edildi.")
+        except Exception as e:
+            conn.rollback()
+            print(f"Tesvik_katki_defteri tablosu oluşturulamadı: {e}")
+            raise
+
+# Kanonik dönem anahtarı (services/donem.py) tutan tablolar: (tablo, indeks adı, indeks kolonları)
+DONEM_ANAHTARI_TABLOLARI = [
+    ("beyanname", "idx_beyanname_mukellef_donem_anahtari", "mukellef_id, tur, donem_anahtari"),
+    ("kdv_files", "idx_kdv_files_active_donem_anahtari", "is_active, donem_anahtari"),
+    ("donem_matrah", "idx_donem_matrah_donem_anahtari", "user_id, mukellef_id, donem_anahtari"),
+    ("tesvik_kullanim", "idx_tesvik_kullanim_donem_anahtari", "user_id, belge_no, donem_anahtari"),
+]
+
+def _donem_anahtarlarini_doldur(cur, table):
+    """donem_anahtari boş satırları metin dönem kolonlarından doldurur; güncellenen satır sayısını döner."""
+    from services import donem
+
+    if table in ("beyanname", "kdv_files"):
+        kolon = "donem" if table == "beyanname" else "period"
+        cur.execute(f"SELECT id, {kolon} FROM {table} WHERE donem_anahtari IS NULL")
+        rows = [(row["id"], donem.metin_anahtari(row[kolon])) for row in cur.fetchall()]
+    elif table == "tesvik_kullanim":
+        # Defterle aynı kural: donem_text öncelikli (services.donem.kullanim_donemi)
+        cur.execute(f"SELECT id, donem_text, hesap_donemi, donem_turu FROM {table} WHERE donem_anahtari IS NULL")
+        rows = [
+            (row["id"], donem.kullanim_anahtari(row["donem_text"], row["hesap_donemi"], row["donem_turu"]))
+            for row in cur.fetchall()
+        ]
+    else:
+        cur.execute(f"SELECT id, hesap_donemi, donem_turu FROM {table} WHERE donem_anahtari IS NULL")
+        rows = [(row["id"], donem.tesvik_anahtari(row["hesap_donemi"], row["donem_turu"])) for row in cur.fetchall()]
+    rows = [(anahtar, row_id) for row_id, anahtar in rows if anahtar is not None]
+    if not rows:
+        return 0
+    if USE_SQLITE:
+        cur.executemany(f"UPDATE {table} SET donem_anahtari = %s WHERE id = %s", rows)
+    else:
+        extras.execute_values(
+            cur,
+            f"UPDATE {table} AS t SET donem_anahtari = v.anahtar FROM (VALUES %s) AS v(anahtar, id) WHERE t.id = v.id",
+            rows, page_size=500,
+        )
+    return len(rows)
+
+def _katki_defterini_yeniden_yaz(cur):
+    """Tüm belgelerin katkı defterini tesvik_kullanim'dan baştan yazar; belge sayısını döner."""
+    from services.tesvik_data import defter_guncelle
+
+    cur.execute("DELETE FROM tesvik_katki_defteri")
+    cur.execute("SELECT DISTINCT user_id, belge_no FROM tesvik_kullanim WHERE belge_no IS NOT NULL")
+    belgeler = cur.fetchall()
+    for row in belgeler:
+        defter_guncelle(cur, row["user_id"], row["belge_no"])
+    return len(belgeler)
+
+def migrate_donem_anahtari():
+    """
+    beyanname, kdv_files, donem_matrah ve tesvik_kullanim tablolarına indeksli
+    donem_anahtari kolonunu ekler ve mevcut satırları doldurur. Katkı defteri
+    aynı anahtarla yeniden yazılır (eski defter yıl × 100 + sıra kullanıyordu).
+    """
+    with get_conn() as conn:
+        cur = conn.cursor()
+        for table, index_name, index_cols in DONEM_ANAHTARI_TABLOLARI:
+            try:
+                if USE_SQLITE:
+                    cur.execute(f"PRAGMA table_info({table})")
+                    existing = {r["name"] for r in cur.fetchall()}
+                else:
+                    cur.execute("SELECT column_name FROM information_schema.columns WHERE table_name=%s", (table,))
+                    existing = {r["column_name"].lower() for r in cur.fetchall()}
+                if "donem_anahtari" not in existing:
+                    print(f"'donem_anahtari' sutunu {table} tablosuna ekleniyor...")
+                    cur.execute(f"ALTER TABLE {table} ADD COLUMN donem_anahtari INTEGER")
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({index_cols})")
+                guncellenen = _donem_anahtarlarini_doldur(cur, table)
+                conn.commit()
+                print(f"{table}.donem_anahtari kontrol edildi. ({guncellenen} satir guncellendi)")
+            except Exception as e:
+                conn.rollback()
+                print(f"{table}.donem_anahtari eklenemedi: {e}")
+                raise
+
+        try:
+            belge_sayisi = _katki_defterini_yeniden_yaz(cur)
+            conn.commit()
+            print(f"Katkı defteri {belge_sayisi} belge için yeniden yazıldı.")
+        except Exception as e:
+            conn.rollback()
+            print(f"Katkı defteri yeniden yazılamadı: {e}")
+            raise
+
+def migrate_drop_beyanname_kalem():
+    """Hiçbir raporun okumadığı beyanname_kalem tablosunu (ve indekslerini) kaldırır."""
+    with get_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("DROP TABLE IF EXISTS beyanname_kalem")
+            conn.commit()
+            print("beyanname_kalem tablosu kaldirildi.")
+        except Exception as e:
+            conn.rollback()
+            print(f"beyanname_kalem tablosu kaldirilamadi: {e}")
+            raise
+
+def migrate_kdv_files_user_donem_index():
+    """
+    KDV paneli trendi kullanıcı kapsamında (user_id = ? ... GROUP BY donem_anahtari)
+    kdv_files'ı taramasın. donem_anahtari kolonu 19. adımda geldiği için
+    HOT_INDEXES'te değil, ayrı adımdadır.
+    """
+    with get_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS idx_kdv_files_user_donem_anahtari ON kdv_files (user_id, donem_anahtari)"
+            )
+            conn.commit()
+            print("idx_kdv_files_user_donem_anahtari kontrol edildi.")
+        except Exception as e:
+            conn.rollback()
+            print(f"idx_kdv_files_user_donem_anahtari olusturulamadi: {e}")
+            raise
+
+def migrate_kullanim_donem_anahtari():
+    """
+    tesvik_kullanim.donem_anahtari ilk doldurmada yalnız hesap_donemi/donem_turu
+    kolonlarından hesaplanmıştı; önceki katkı sorgusu ise donem_text'e bakıyordu.
+    Anahtarlar donem_text öncelikli kuralla (services.donem.kullanim_donemi)
+    yeniden hesaplanır ve katkı defteri baştan yazılır.
+    """
+    from services import donem
+
+    with get_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT id, donem_text, hesap_donemi, donem_turu, donem_anahtari FROM tesvik_kullanim")
+            rows = []
+            for row in cur.fetchall():
+                anahtar = donem.kullanim_anahtari(row["donem_text"], row["hesap_donemi"], row["donem_turu"])
+                if anahtar is not None and anahtar != row["donem_anahtari"]:
+                    rows.append((anahtar, row["id"]))
+            if rows:
+                cur.executemany("UPDATE tesvik_kullanim SET donem_anahtari = %s WHERE id = %s", rows)
+            belge_sayisi = _katki_defterini_yeniden_yaz(cur)
+            conn.commit()
+            print(f"tesvik_kullanim donem anahtarlari duzeltildi ({len(rows)} satir), defter {belge_sayisi} belge için yeniden yazıldı.")
+        except Exception as e:
+            conn.rollback()
+            print(f"tesvik_kullanim donem anahtarlari duzeltilemedi: {e}")
+            raise
@@ -0,0 +1,140 @@
+"""
+Dönem ayrıştırma ve kanonik dönem anahtarı.
+
+Dönemler tablolarda serbest metin olarak durur: beyanname.donem ("Ocak / 2024",
+"01 / 2024", "2024"), kdv_files.period ("03/2024"), rapor kolonları
+("2024/OCAK"), teşvik tarafında hesap_donemi + donem_turu ("2. Geçici",
+"KURUMLAR"). Bu modül hepsini kronolojik sıralanan tek bir tamsayıya çevirir:
+
+    anahtar = (yıl × 100 + dönem sonu ayı) × 10 + tür
+
+    AYLIK=1       ay 1-12
+    GECICI=2      n. geçici dönem -> ay 3n
+    YILLIK=3      yıllık / kurumlar beyannamesi -> ay 12
+    BILINMEYEN=9  türü tanınmayan dönem -> ay 13 (yılın en sonuna)
+
+Ör. 03/2024 -> 2024031, 2024 2. Geçici -> 2024062, 2024 KURUMLAR -> 2024123.
+Aynı ayda biten dönemlerde aylık < geçici < yıllık sırası korunur.
+
+beyanname, kdv_files, donem_matrah ve tesvik_kullanim tablolarında indeksli
+`donem_anahtari` kolonu olarak saklanır (yazan her uç nokta doldurur);
+sıralama ve "X döneminden önceki dönemler" gibi süzmeler SQL'de yapılır.
+"""
+import re
+
+AYLIK = 1
+GECICI = 2
+YILLIK = 3
+BILINMEYEN = 9
+
+BILINMEYEN_AY = 13
+
+AY_ADLARI = {
+    "OCAK": 1, "SUBAT": 2, "MART": 3, "NISAN": 4, "MAYIS": 5, "HAZIRAN": 6,
+    "TEMMUZ": 7, "AGUSTOS": 8, "EYLUL": 9, "EKIM": 10, "KASIM": 11, "ARALIK": 12,
+}
+
+_TR_ASCII = str.maketrans("ŞĞİÜÖÇşğıüöç", "SGIUOCsgiuoc")
+_YIL = re.compile(r"\d{4}")
+_YIL_VE_TUR = re.compile(r"(\d{4})\s*-\s*(.+)")
+_GECICI_NO = re.compile(r"[1-4]")
+
+
+def _ascii_upper(text):
+    return str(text or "").strip().translate(_TR_ASCII).upper()
+
+
+def anahtar(yil, ay, tur):
+    return (int(yil) * 100 + int(ay)) * 10 + int(tur)
+
+
+def coz(donem_anahtari):
+    """Anahtar -> (yıl, dönem sonu ayı, tür)."""
+    yil_ay, tur = divmod(int(donem_anahtari), 10)
+    yil, ay = divmod(yil_ay, 100)
+    return yil, ay, tur
+
+
+def ay_no(text):
+    """'03', '3', 'Mart', 'MART', 'Ağustos' -> 1-12; tanınmazsa None."""
+    s = _ascii_upper(text)
+    if s.isdigit():
+        return int(s) if 1 <= int(s) <= 12 else None
+    return AY_ADLARI.get(s)
+
+
+def ay_anahtari(yil, ay):
+    return anahtar(yil, ay, AYLIK)
+
+
+def yil_anahtari(yil):
+    return anahtar(yil, 12, YILLIK)
+
+
+def gecici_no(donem_turu):
+    """'2. Geçici', '2. Dönem' -> 2; dönem türünde 1-4 yoksa None."""
+    m = _GECICI_NO.search(str(donem_turu or ""))
+    return int(m.group()) if m else None
+
+
+def tesvik_anahtari(hesap_donemi, donem_turu):
+    """hesap_donemi + donem_turu ('1. Geçici' ... '4. Geçici', 'KURUMLAR'); yıl geçersizse None."""
+    try:
+        yil = int(hesap_donemi)
+    except (TypeError, ValueError):
+        return None
+    if "KURUMLAR" in _ascii_upper(donem_turu):
+        return yil_anahtari(yil)
+    n = gecici_no(donem_turu)
+    if n:
+        return anahtar(yil, 3 * n, GECICI)
+    return anahtar(yil, BILINMEYEN_AY, BILINMEYEN)
+
+
+def kullanim_donemi(donem_text, hesap_donemi=None, donem_turu=None):
+    """
+    tesvik_kullanim satırının dönemi (yıl, tür): '2024 - 2. Geçici' biçimindeki
+    donem_text varsa o, yoksa hesap_donemi/donem_turu kolonları. Defter anahtarı,
+    önceki katkı sorgusu ve ziyaretçi alanı aynı kuralı kullanır.
+    """
+    m = _YIL_VE_TUR.fullmatch(str(donem_text or "").strip())
+    if m:
+        return m.group(1), m.group(2).strip()
+    return hesap_donemi, donem_turu
+
+
+def kullanim_anahtari(donem_text, hesap_donemi=None, donem_turu=None):
+    return tesvik_anahtari(*kullanim_donemi(donem_text, hesap_donemi, donem_turu))
+
+
+def tarih_gecici_anahtari(tarih):
+    """Tarihin düştüğü geçici vergi döneminin anahtarı (date/datetime); tarih yoksa None."""
+    if not tarih:
+        return None
+    return anahtar(tarih.year, ((tarih.month - 1) // 3 + 1) * 3, GECICI)
+
+
+def metin_anahtari(metin):
+    """
+    Serbest metin dönem -> anahtar; çözülemezse None.
+    '01/2024', '01 / 2024', 'Ocak / 2024', '2024/OCAK' aylık; '2024' yıllık;
+    '2024 - 2. Geçici', '2024 - KURUMLAR' teşvik dönemi.
+    """
+    text = str(metin or "").strip()
+    if _YIL.fullmatch(text):
+        return yil_anahtari(text)
+    parts = [p.strip() for p in text.split("/") if p.strip()]
+    if len(parts) == 2:
+        if _YIL.fullmatch(parts[1]):
+            ay, yil = parts[0], parts[1]
+        elif _YIL.fullmatch(parts[0]):
+            yil, ay = parts
+        else:
+            return None
+        n = ay_no(ay)
+        return ay_anahtari(yil, n) if n else None
+    m = _YIL_VE_TUR.fullmatch(text)
+    if m:
+        return tesvik_anahtari(m.group(1), m.group(2))
+    return None
+
@@ -0,0 +1,216 @@
+"""
+Ziyaretçi (giriş yapmamış) çalışma alanının sunucu tarafı deposu.
+
+İndirimli KV hesaplama aracında ziyaretçinin belgeleri, dönem kullanımları ve
+dönem matrah havuzu eskiden bütünüyle Flask session çerezinde taşınıyordu.
+Artık ana veritabanındaki tablolarda tutulur; çerezde yalnızca rastgele bir
+çalışma alanı kimliği (`session["guest_ws"]`) bulunur:
+
+    guest_workspace       kimlik, oluşturulma ve son erişim zamanı
+    guest_workspace_item  (alan, tür, kayıt id) başına bir JSON satırı
+    guest_workspace_seq   alan başına id sayaçları
+
+Okuma/yazma kayıt bazındadır: bir belgeyi güncellemek yalnızca o satırı
+yazar. Çalışma alanı ilk yazmada oluşturulur; hiç yazmayan ziyaretçi için
+tablolara gidilmez. GUEST_WORKSPACE_TTL_DAYS boyunca erişilmeyen alanlar
+`gc()` ile silinir (yeni alan açılırken süreç başına saatte en fazla bir kez
+kendiliğinden çalışır).
+"""
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import g, session
+
+from services.db import bulk_upsert, get_conn
+from services.query_budget import uncounted
+
+DOCS = "tesvik_docs"
+DONEM_MATRAH = "donem_matrah"
+
+# Eski çerez oturumundaki anahtarlar -> tür / sayaç adı
+LEGACY_LIST_KEYS = {"guest_tesvik_docs": DOCS, "guest_donem_matrah_list": DONEM_MATRAH}
+LEGACY_SEQ_KEYS = ("guest_tesvik_next_id", "guest_kullanim_next_id", "guest_donem_next_id")
+
+SESSION_KEY = "guest_ws"
+GUEST_WORKSPACE_TTL_DAYS = int(os.getenv("GUEST_WORKSPACE_TTL_DAYS", "7"))
+TOUCH_INTERVAL = 3600
+GC_INTERVAL = 3600
+
+_gc_lock = threading.Lock()
+_last_gc = [0.0]
+
+
+def _now_str(delta=timedelta(0)):
+    return (datetime.now(timezone.utc) + delta).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _cache():
+    if "_guest_ws_cache" not in g:
+        g._guest_ws_cache = {}
+    return g._guest_ws_cache
+
+
+def _workspace_id(create=False):
+    ws_id = session.get(SESSION_KEY)
+    if ws_id:
+        _touch(ws_id)
+        return ws_id
+    legacy = any(key in session for key in (*LEGACY_LIST_KEYS, *LEGACY_SEQ_KEYS))
+    if not create and not legacy:
+        return None
+
+    ws_id = secrets.token_urlsafe(24)
+    # Alan açılışı, eski çerezin aktarımı ve temizlik isteğin sorgu bütçesine sayılmaz
+    with uncounted():
+        with get_conn() as conn:
+            c = conn.cursor()
+            now = _now_str()
+            c.execute(
+                "INSERT INTO guest_workspace (id, created_at, last_seen) VALUES (%s, %s, %s)",
+                (ws_id, now, now),
+            )
+            if legacy:
+                _import_legacy(c, ws_id)
+            conn.commit()
+        _maybe_gc()
+    session[SESSION_KEY] = ws_id
+    session["guest_ws_seen"] = int(time.time())
+    return ws_id
+
+
+def _touch(ws_id):
+    # Son erişim en fazla saatte bir yazılır; her istekte UPDATE atılmaz
+    now = int(time.time())
+    if now - int(session.get("guest_ws_seen") or 0) < TOUCH_INTERVAL:
+        return
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE guest_workspace SET last_seen = %s WHERE id = %s", (_now_str(), ws_id))
+        conn.commit()
+    session["guest_ws_seen"] = now
+
+
+def _import_legacy(c, ws_id):
+    """Çerezde kalmış eski çalışma alanını depoya taşır ve çerezden siler."""
+    items = [
+        (ws_id, kind, int(item["id"]), json.dumps(item, ensure_ascii=False, default=str))
+        for key, kind in LEGACY_LIST_KEYS.items()
+        for item in session.pop(key, None) or []
+        if isinstance(item, dict) and item.get("id") is not None
+    ]
+    seqs = [(ws_id, name, int(session.pop(name))) for name in LEGACY_SEQ_KEYS if session.get(name)]
+    bulk_upsert(c, "guest_workspace_item", ["workspace_id", "kind", "item_id", "data"], items,
+                conflict=["workspace_id", "kind", "item_id"], update=[])
+    bulk_upsert(c, "guest_workspace_seq", ["workspace_id", "name", "value"], seqs)
+
+
+def _load(kind):
+    cache = _cache()
+    if kind in cache:
+        return cache[kind]
+    items = {}
+    ws_id = _workspace_id()
+    if ws_id:
+        with get_conn() as conn:
+            c = conn.cursor()
+            c.execute(
+                "SELECT item_id, data FROM guest_workspace_item WHERE workspace_id = %s AND kind = %s ORDER BY item_id",
+                (ws_id, kind),
+            )
+            items = {row["item_id"]: json.loads(row["data"]) for row in c.fetchall()}
+    cache[kind] = items
+    return items
+
+
+def list_items(kind):
+    """Türün kayıtları (id sırasıyla); çalışma alanı yoksa boş liste."""
+    return list(_load(kind).values())
+
+
+def get_item(kind, item_id):
+    try:
+        return _load(kind).get(int(item_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def save_item(kind, item):
+    """Tek kaydı ekler veya günceller (item["id"] zorunlu)."""
+    ws_id = _workspace_id(create=True)
+    item_id = int(item["id"])
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO guest_workspace_item (workspace_id, kind, item_id, data) VALUES (%s, %s, %s, %s)"
+            " ON CONFLICT (workspace_id, kind, item_id) DO UPDATE SET data = EXCLUDED.data",
+            (ws_id, kind, item_id, json.dumps(item, ensure_ascii=False, default=str)),
+        )
+        conn.commit()
+    _load(kind)[item_id] = item
+
+
+def delete_item(kind, item_id):
+    """Kaydı siler; bulunamazsa False."""
+    items = _load(kind)
+    item_id = int(item_id)
+    if item_id not in items:
+        return False
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(
+            "DELETE FROM guest_workspace_item WHERE workspace_id = %s AND kind = %s AND item_id = %s",
+            (session.get(SESSION_KEY), kind, item_id),
+        )
+        conn.commit()
+    del items[item_id]
+    return True
+
+
+def next_id(name):
+    """Çalışma alanına özel artan id (1'den başlar)."""
+    ws_id = _workspace_id(create=True)
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO guest_workspace_seq (workspace_id, name, value) VALUES (%s, %s, 1)"
+            " ON CONFLICT (workspace_id, name) DO UPDATE SET value = guest_workspace_seq.value + 1",
+            (ws_id, name),
+        )
+        c.execute("SELECT value FROM guest_workspace_seq WHERE workspace_id = %s AND name = %s", (ws_id, name))
+        value = c.fetchone()["value"]
+        conn.commit()
+    return int(value)
+
+
+def gc():
+    """Süresi dolan çalışma alanlarını (kayıt ve sayaçlarıyla) siler; silinen alan sayısını döner."""
+    cutoff = _now_str(-timedelta(days=GUEST_WORKSPACE_TTL_DAYS))
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id FROM guest_workspace WHERE last_seen < %s", (cutoff,))
+        expired = [row["id"] for row in c.fetchall()]
+        if expired:
+            marks = ",".join(["%s"] * len(expired))
+            c.execute(f"DELETE FROM guest_workspace_item WHERE workspace_id IN ({marks})", expired)
+            c.execute(f"DELETE FROM guest_workspace_seq WHERE workspace_id IN ({marks})", expired)
+            c.execute(f"DELETE FROM guest_workspace WHERE id IN ({marks})", expired)
+        conn.commit()
+    return len(expired)
+
+
+def _maybe_gc():
+    now = time.monotonic()
+    with _gc_lock:
+        if now - _last_gc[0] < GC_INTERVAL:
+            return
+        _last_gc[0] = now
+    try:
+        removed = gc()
+        if removed:
+            print(f"{removed} süresi dolmuş ziyaretçi çalışma alanı silindi.")
+    except Exception as e:
+        print(f"Ziyaretçi çalışma alanı temizliği başarısız: {e}")
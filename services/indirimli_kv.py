@@ -0,0 +1,152 @@
+"""
+İndirimli kurumlar vergisi hesap motoru (Flask / veritabanı bağımsız).
+
+Formdaki (templates/calculators/indirimlikurumlar.html) klasik akışın sunucu
+tarafı karşılığıdır:
+
+    vergi farkı oranı  = Σ satış payı × genel KV oranı × vergi indirim oranı
+    cari katkı         = min(kalan katkı, yatırım kazancı × vergi farkı oranı)
+    indirimli matrah   = cari katkı / vergi farkı oranı
+    indirimli KV       = indirimli matrah × Σ satış payı × genel oran × (1 - indirim)
+
+`KatkiGecmisi` bir belgenin dönem kayıtlarını dönem sırasına dizilmiş diziler
+ve kümülatif toplamlar olarak tutar; "X döneminden önceki katkılar" ikili
+aramayla O(log n) bulunur. `senaryo_projeksiyonu` kalan katkının gelecek
+yıllara dağılımını çok sayıda kazanç senaryosu için tek çağrıda (NumPy,
+senaryolar boyunca vektörel) hesaplar.
+"""
+import numpy as np
+
+from services.donem import tesvik_anahtari
+
+# Genel KV oranları (ihracat / imalat / diğer)
+KV_ORANLARI = {"ihracat": 0.20, "imalat": 0.24, "diger": 0.25}
+
+
+def donem_anahtari(hesap_donemi, donem_turu):
+    """Dönemleri kronolojik sıralayan tamsayı anahtar (services.donem)."""
+    return tesvik_anahtari(hesap_donemi, donem_turu)
+
+
+class KatkiGecmisi:
+    """
+    Bir belgenin dönem bazında kullandığı katkılar.
+
+    donemler: (hesap_donemi, donem_turu, cari_yatirim_katki, cari_diger_katki)
+    demetleri; sıra önemli değildir, aynı dönem birden fazla kez geçebilir.
+    """
+
+    def __init__(self, donemler=()):
+        rows = [
+            (donem_anahtari(yil, turu), float(yatirim or 0), float(diger or 0))
+            for yil, turu, yatirim, diger in donemler
+        ]
+        rows.sort(key=lambda r: r[0])
+        self.anahtarlar = np.array([r[0] for r in rows], dtype=np.int64)
+        self.kum_yatirim = np.concatenate(([0.0], np.cumsum([r[1] for r in rows], dtype=np.float64)))
+        self.kum_diger = np.concatenate(([0.0], np.cumsum([r[2] for r in rows], dtype=np.float64)))
+
+    def __len__(self):
+        return len(self.anahtarlar)
+
+    def onceki(self, hesap_donemi, donem_turu):
+        """Verilen dönemden ÖNCEKİ dönemlerde kullanılan (yatırım, diğer) katkı toplamları."""
+        i = int(np.searchsorted(self.anahtarlar, donem_anahtari(hesap_donemi, donem_turu), side="left"))
+        return float(self.kum_yatirim[i]), float(self.kum_diger[i])
+
+    def toplam(self):
+        """Tüm dönemlerde kullanılan (yatırım, diğer) katkı toplamları."""
+        return float(self.kum_yatirim[-1]), float(self.kum_diger[-1])
+
+
+def vergi_oranlari(vergi_indirim_orani, satis_paylari=None):
+    """
+    (genel ağırlıklı KV oranı, vergi farkı oranı) — oranlar 0-1 aralığında.
+    satis_paylari: {"ihracat", "imalat", "diger"} payları; verilmezse tamamı diğer.
+    """
+    paylar = satis_paylari or {"diger": 1.0}
+    genel = sum(np.asarray(paylar.get(k, 0.0), dtype=np.float64) * oran for k, oran in KV_ORANLARI.items())
+    return genel, genel * np.asarray(vergi_indirim_orani, dtype=np.float64)
+
+
+def donem_hesapla(kalan_katki, yatirim_kazanci, vergi_indirim_orani, satis_paylari=None, kv_matrah=None):
+    """
+    Tek dönem (klasik akış, yatırım kazancı) sonucu. Tüm argümanlar skaler veya
+    aynı şekle yayınlanabilen diziler olabilir; sonuç sözlüğündeki değerler de öyle döner.
+    """
+    kalan = np.maximum(0.0, np.asarray(kalan_katki, dtype=np.float64))
+    kazanc = np.maximum(0.0, np.asarray(yatirim_kazanci, dtype=np.float64))
+    indirim = np.asarray(vergi_indirim_orani, dtype=np.float64)
+    genel_oran, fark = vergi_oranlari(indirim, satis_paylari)
+
+    cari = np.minimum(kalan, kazanc * fark)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        matrah = np.where(fark > 0, cari / fark, 0.0)
+    indirimli_kv = matrah * genel_oran * (1 - indirim)
+    toplam_matrah = kazanc if kv_matrah is None else np.asarray(kv_matrah, dtype=np.float64)
+    genel_kv = np.maximum(0.0, toplam_matrah - matrah) * genel_oran
+    return {
+        "cari_yatirim_katki": cari,
+        "indirimli_matrah": matrah,
+        "indirimli_kv": indirimli_kv,
+        "odenecek_toplam_kv": indirimli_kv + genel_kv,
+        "indirimli_kv_oran": genel_oran * (1 - indirim) * 100,
+        "kalan_katki_tutari": kalan - cari,
+    }
+
+
+def kazanc_gridi(baz_kazanclar, buyume_oranlari, yil_sayisi):
+    """
+    Senaryo kazanç matrisi (S × yil_sayisi): her baz kazanç × her büyüme oranı
+    için kazanc[t] = baz × (1 + büyüme) ** t. S = len(baz) × len(büyüme).
+    """
+    baz = np.asarray(baz_kazanclar, dtype=np.float64).reshape(-1, 1, 1)
+    buyume = np.asarray(buyume_oranlari, dtype=np.float64).reshape(1, -1, 1)
+    t = np.arange(int(yil_sayisi), dtype=np.float64).reshape(1, 1, -1)
+    return (baz * (1.0 + buyume) ** t).reshape(-1, int(yil_sayisi))
+
+
+def senaryo_projeksiyonu(kalan_katki, kazanclar, vergi_indirim_orani, satis_paylari=None, kullanilabilir_yil=None):
+    """
+    Kalan katkının gelecek yıllarda tükenişi, tüm senaryolar için birlikte.
+
+    kazanclar: (S × Y) yıllık yatırım kazancı matrisi (ör. `kazanc_gridi`).
+    kullanilabilir_yil: ilk kaç yılda indirim uygulanabilir (2025/9903 süre
+    sınırı gibi); None ise tüm yıllar.
+
+    Yıllar üzerinde döngü, senaryolar üzerinde vektörel çalışır. Dönen
+    sözlükte yıllık değerler (S × Y), özetler (S,) boyutludur. Katkı, vazgeçilen
+    vergi olduğundan `toplam_katki` aynı zamanda toplam vergi avantajıdır;
+    `bitis_yili` katkının tükendiği yıl indeksi, tükenmiyorsa -1.
+    """
+    kazanclar = np.atleast_2d(np.maximum(0.0, np.asarray(kazanclar, dtype=np.float64)))
+    senaryo, yil = kazanclar.shape
+    indirim = float(vergi_indirim_orani)
+    genel_oran, fark = vergi_oranlari(indirim, satis_paylari)
+    genel_oran, fark = float(genel_oran), float(fark)
+
+    tavan = kazanclar * fark
+    if kullanilabilir_yil is not None:
+        tavan[:, max(0, int(kullanilabilir_yil)):] = 0.0
+
+    kalan = np.full(senaryo, max(0.0, float(kalan_katki)))
+    cari = np.zeros_like(kazanclar)
+    kalan_yillik = np.zeros_like(kazanclar)
+    for t in range(yil):
+        cari[:, t] = np.minimum(kalan, tavan[:, t])
+        kalan -= cari[:, t]
+        kalan_yillik[:, t] = kalan
+
+    matrah = cari / fark if fark > 0 else np.zeros_like(cari)
+    indirimli_kv = matrah * genel_oran * (1 - indirim)
+    tukendi = kalan_yillik <= 0.01
+    return {
+        "cari_katki": cari,
+        "indirimli_matrah": matrah,
+        "indirimli_kv": indirimli_kv,
+        "odenecek_kv": indirimli_kv + np.maximum(0.0, kazanclar - matrah) * genel_oran,
+        "kalan_katki": kalan_yillik,
+        "toplam_katki": cari.sum(axis=1),
+        "kalan_son": kalan,
+        "bitis_yili": np.where(tukendi.any(axis=1), tukendi.argmax(axis=1), -1),
+    }
@@ -0,0 +1,200 @@
+"""
+KDV iade paneli istatistikleri.
+
+kdv_files tarihleri metin olarak tutulur ("15.03.2024", "15.03.2024 10:30").
+Panel sorguları için her satırın tipli kopyaları ayrıca saklanır:
+
+    completed_on    DATE  <- completed_at
+    guarantee_start DATE  <- guarantee_date, yoksa date
+    period_month    DATE  <- period ("03/2024" -> 2024-03-01)
+    donem_anahtari  INT   <- period (services.donem; beyanname ile aynı anahtar)
+
+Yazan her uç nokta `sync_kdv_file_dates` çağırır. İstatistikler tek bir
+SUM/COUNT ... FILTER sorgusu ve altı aylık trend (yalnızca aylık dönemler)
+için bir GROUP BY ile veritabanında hesaplanır; sonuç yetki kapsamı (rol, kullanıcı, atanmış
+mükellefler) ve mükellef filtresi için kısa süre (KDV_STATS_TTL) önbelleklenir.
+"""
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from services import donem
+from services.auth_context import mukellef_scope_sql
+
+KDV_STATS_TTL = float(os.getenv("KDV_STATS_TTL", "30"))
+
+COMPLETED_STATUSES = ("İade Tamamlandı", "İade Alındı")
+MISSING_DOCS_STATUS = "Eksiklik yazısı geldi"
+
+# Teminat süresi (gün) ve uyarı penceresi (gün)
+GUARANTEE_DAYS = 180
+GUARANTEE_ALERT_DAYS = 30
+
+TR_MONTHS = {"01": "Oca", "02": "Şub", "03": "Mar", "04": "Nis", "05": "May", "06": "Haz",
+             "07": "Tem", "08": "Ağu", "09": "Eyl", "10": "Eki", "11": "Kas", "12": "Ara"}
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def parse_tr_date(value):
+    """'15.03.2024', '15.03.2024 10:30' veya '2024-03-15' -> date; çözülemezse None."""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip().split(" ")[0].split("T")[0]
+    for fmt in ("%d.%m.%Y", "%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_period_month(period):
+    """'03/2024', 'Mart / 2024' -> 2024-03-01; aylık dönem değilse None."""
+    anahtar = donem.metin_anahtari(period)
+    if anahtar is None:
+        return None
+    yil, ay, tur = donem.coz(anahtar)
+    return date(yil, ay, 1) if tur == donem.AYLIK else None
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def typed_columns(row):
+    """kdv_files satırının (date, guarantee_date, completed_at, period) tipli karşılıkları."""
+    return (
+        _iso(parse_tr_date(row["completed_at"])),
+        _iso(parse_tr_date(row["guarantee_date"]) or parse_tr_date(row["date"])),
+        _iso(parse_period_month(row["period"])),
+    )
+
+
+def sync_kdv_file_dates(cur, file_ids):
+    """Verilen kdv_files satırlarının tipli tarih kolonlarını yeniler ve istatistik önbelleğini boşaltır."""
+    if isinstance(file_ids, (int, str)):
+        file_ids = [file_ids]
+    for file_id in file_ids:
+        cur.execute("SELECT date, guarantee_date, completed_at, period FROM kdv_files WHERE id = %s", (file_id,))
+        row = cur.fetchone()
+        if not row:
+            continue
+        cur.execute(
+            "UPDATE kdv_files SET completed_on = %s, guarantee_start = %s, period_month = %s, donem_anahtari = %s"
+            " WHERE id = %s",
+            (*typed_columns(row), donem.metin_anahtari(row["period"]), file_id),
+        )
+    invalidate_stats()
+
+
+def invalidate_stats():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _scope_sql(ctx, mukellef_id):
+    sql, params = mukellef_scope_sql(ctx)
+    if mukellef_id:
+        sql += " AND mukellef_id = %s"
+        params.append(mukellef_id)
+    return sql, params
+
+
+def _month_start(d):
+    return d.replace(day=1)
+
+
+def _add_months(d, n):
+    month = d.month - 1 + n
+    return date(d.year + month // 12, month % 12 + 1, 1)
+
+
+def compute_stats(cur, ctx, mukellef_id=None, today=None):
+    """Panel rakamları (tutarlar, sayılar, altı aylık trend); aktiviteler hariç."""
+    today = today or date.today()
+    curr_start = _month_start(today)
+    prev_start = _add_months(curr_start, -1)
+    next_start = _add_months(curr_start, 1)
+    # Bitişe (başlangıç + 180 gün) kalan tam gün sayısı 30 veya altındaysa uyarı
+    guarantee_cutoff = today + timedelta(days=GUARANTEE_ALERT_DAYS + 1 - GUARANTEE_DAYS)
+    scope_sql, scope_params = _scope_sql(ctx, mukellef_id)
+
+    done = ", ".join(["%s"] * len(COMPLETED_STATUSES))
+    cur.execute(f"""
+        SELECT
+            COALESCE(SUM(amount_request) FILTER (WHERE is_active = TRUE AND status NOT IN ({done})), 0) AS pending_amount,
+            COUNT(*) FILTER (WHERE is_active = TRUE AND status = %s) AS missing_docs_count,
+            COALESCE(SUM(amount_request) FILTER (
+                WHERE status IN ({done}) AND completed_on >= %s AND completed_on < %s), 0) AS completed_amount,
+            COALESCE(SUM(amount_request) FILTER (
+                WHERE status IN ({done}) AND completed_on >= %s AND completed_on < %s), 0) AS completed_prev,
+            COALESCE(SUM(amount_request) FILTER (
+                WHERE is_active = TRUE AND (subject LIKE '%%Teminat%%' OR type LIKE '%%Teminat%%')
+                  AND guarantee_start <= %s), 0) AS guarantee_amount,
+            COUNT(*) FILTER (
+                WHERE is_active = TRUE AND (subject LIKE '%%Teminat%%' OR type LIKE '%%Teminat%%')
+                  AND guarantee_start <= %s) AS guarantee_alert_count
+        FROM kdv_files
+        WHERE 1=1 {scope_sql}
+    """, (
+        *COMPLETED_STATUSES, MISSING_DOCS_STATUS,
+        *COMPLETED_STATUSES, curr_start.isoformat(), next_start.isoformat(),
+        *COMPLETED_STATUSES, prev_start.isoformat(), curr_start.isoformat(),
+        guarantee_cutoff.isoformat(), guarantee_cutoff.isoformat(),
+        *scope_params,
+    ))
+    row = cur.fetchone()
+
+    # Son altı ayın (dosyası olan) dönem toplamları; geçici/yıllık dönemler
+    # aynı ay etiketine düşeceği için trend yalnızca aylık dönemleri sayar
+    cur.execute(f"""
+        SELECT donem_anahtari, COALESCE(SUM(amount_request), 0) AS total
+        FROM kdv_files
+        WHERE is_active = TRUE AND donem_anahtari IS NOT NULL AND donem_anahtari %% 10 = %s {scope_sql}
+        GROUP BY donem_anahtari
+        ORDER BY donem_anahtari DESC
+        LIMIT 6
+    """, (donem.AYLIK, *scope_params))
+    trend = list(reversed(cur.fetchall()))
+
+    trend_labels, trend_data = [], []
+    for tr in trend:
+        yil, ay, _ = donem.coz(tr["donem_anahtari"])
+        trend_labels.append(f"{TR_MONTHS.get(f'{ay:02d}', ay)} {yil % 100:02d}")
+        trend_data.append(float(tr["total"]))
+
+    return {
+        "pending_amount": float(row["pending_amount"]),
+        "completed_amount": float(row["completed_amount"]),
+        "completed_prev": float(row["completed_prev"]),
+        "current_month_name": TR_MONTHS.get(curr_start.strftime("%m")),
+        "prev_month_name": TR_MONTHS.get(prev_start.strftime("%m")),
+        "missing_docs_count": int(row["missing_docs_count"]),
+        "guarantee_amount": float(row["guarantee_amount"]),
+        "guarantee_alert_count": int(row["guarantee_alert_count"]),
+        "trend_labels": trend_labels,
+        "trend_data": trend_data,
+    }
+
+
+def get_stats_cached(cur, ctx, mukellef_id=None):
+    """compute_stats sonucunu yetki kapsamı ve mükellef filtresi için TTL süresince saklar."""
+    key = (ctx.role, ctx.user_id, ctx.assigned_mukellef_ids, str(mukellef_id or ""), date.today())
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None and now - hit[0] < KDV_STATS_TTL:
+            return hit[1]
+    stats = compute_stats(cur, ctx, mukellef_id)
+    with _cache_lock:
+        for stale in [k for k, (ts, _) in _cache.items() if now - ts >= KDV_STATS_TTL]:
+            del _cache[stale]
+        _cache[key] = (now, stats)
+    return stats
@@ -0,0 +1,211 @@
+"""
+Sürümlü şema göçleri.
+
+Her adım (sürüm, ad, fonksiyon) sırasıyla bir kez uygulanır ve `schema_version`
+tablosuna yazılır. Worker açılışında tek sorguyla en yüksek sürüme bakılır;
+şema güncelse hiçbir migrate_* fonksiyonu çalışmaz. Eksik adım varsa göçler
+kilit altında uygulanır (PostgreSQL: advisory lock, SQLite: dosya kilidi),
+böylece aynı anda açılan worker'lar birbirini beklemiş olur.
+
+Yeni bir şema değişikliği için services/db.py'ye idempotent bir migrate_*
+fonksiyonu ekleyip MIGRATIONS listesinin SONUNA yeni sürüm numarasıyla
+eklenir; mevcut adımların sırası ve numarası değiştirilmez. Adım başarısız
+olursa hatayı yutmamalı, yükseltmelidir: sürüm ancak adım hatasız bitince
+yazılır, aksi halde göçler o adımda durur ve sonraki çalıştırmada yeniden denenir.
+
+Göçleri deploy öncesi çalıştırmak için: python tools/migrate.py
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+from werkzeug.security import generate_password_hash
+
+from services.db import (
+    USE_SQLITE, _sqlite_path, get_conn, get_pool,
+    migrate_users_table, migrate_login_logs_table, migrate_beyanname_table, migrate_beyanname_kalem_table,
+    migrate_upload_jobs_table, migrate_tesvik_columns, migrate_tesvik_kullanim_table,
+    migrate_donem_matrah_table, migrate_profit_data_table, migrate_kdv_mukellef_table, migrate_kdv_tables,
+    migrate_kdv_documents_table, migrate_kdv_notes_table, migrate_kdv_files_typed_cols,
+    migrate_mukellef_table, migrate_hot_indexes, migrate_guest_workspace_tables,
+    migrate_tesvik_katki_defteri, migrate_donem_anahtari, migrate_kullanim_donem_anahtari,
+    migrate_drop_beyanname_kalem, migrate_kdv_files_user_donem_index,
+)
+
+# pg_advisory_lock anahtarı (uygulamaya özgü sabit)
+MIGRATION_LOCK_KEY = 728351046
+
+MIGRATIONS = [
+    (1, "users", migrate_users_table),
+    (2, "login_logs", migrate_login_logs_table),
+    (3, "beyanname", migrate_beyanname_table),
+    (4, "beyanname_kalem", migrate_beyanname_kalem_table),
+    (5, "upload_jobs", migrate_upload_jobs_table),
+    (6, "tesvik_belgeleri", migrate_tesvik_columns),
+    (7, "tesvik_kullanim", migrate_tesvik_kullanim_table),
+    (8, "donem_matrah", migrate_donem_matrah_table),
+    (9, "profit_data", migrate_profit_data_table),
+    (10, "kdv_mukellef", migrate_kdv_mukellef_table),
+    (11, "kdv_tables", migrate_kdv_tables),
+    (12, "kdv_documents", migrate_kdv_documents_table),
+    (13, "kdv_notes", migrate_kdv_notes_table),
+    (14, "kdv_files_typed_cols", migrate_kdv_files_typed_cols),
+    (15, "mukellef", migrate_mukellef_table),
+    (16, "hot_indexes", migrate_hot_indexes),
+    (17, "guest_workspace", migrate_guest_workspace_tables),
+    (18, "tesvik_katki_defteri", migrate_tesvik_katki_defteri),
+    (19, "donem_anahtari", migrate_donem_anahtari),
+    (20, "kullanim_donem_anahtari", migrate_kullanim_donem_anahtari),
+    (21, "drop_beyanname_kalem", migrate_drop_beyanname_kalem),
+    (22, "kdv_files_user_donem_index", migrate_kdv_files_user_donem_index),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+_local_lock = threading.Lock()
+
+
+def current_version():
+    """Uygulanmış en yüksek sürüm; schema_version tablosu yoksa 0."""
+    with get_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT MAX(version) AS version FROM schema_version")
+            row = cur.fetchone()
+        except Exception:
+            conn.rollback()
+            return 0
+        conn.rollback()
+    return (row["version"] if row else None) or 0
+
+
+def applied_versions():
+    with get_conn() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT version, name, applied_at FROM schema_version ORDER BY version")
+            return cur.fetchall()
+        except Exception:
+            conn.rollback()
+            return []
+
+
+def _ensure_version_table():
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+        conn.commit()
+
+
+@contextmanager
+def _sqlite_file_lock():
+    path = _sqlite_path(get_pool().db_url) + ".migrate.lock"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+") as fh:
+        if os.name == "nt":
+            import msvcrt
+            fh.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def _pg_advisory_lock():
+    # Kilit oturuma bağlıdır; göçler havuzdan başka bağlantılar kullanır
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        conn.commit()
+        try:
+            yield
+        finally:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+            conn.commit()
+    finally:
+        pool.putconn(conn)
+
+
+@contextmanager
+def migration_lock():
+    with _local_lock:
+        lock = _sqlite_file_lock() if USE_SQLITE else _pg_advisory_lock()
+        with lock:
+            yield
+
+
+def bootstrap_admin_from_env():
+    username = os.getenv("ADMIN_USERNAME")
+    password = os.getenv("ADMIN_PASSWORD")
+    if not username or not password: return
+
+    hashed_pw = generate_password_hash(password)
+    with get_conn() as conn:
+        with conn.cursor() as c:
+            c.execute("SELECT password FROM users WHERE username = %s", (username,))
+            row = c.fetchone()
+            if not row:
+                c.execute("INSERT INTO users (username, password, is_approved, role, has_kdv_access) VALUES (%s, %s, 1, 'admin', 1)", (username, hashed_pw))
+                print(f"Admin hesabı oluşturuldu: {username}")
+            else:
+                # Eger kullanıcı varsa bilgilerini guncelle
+                c.execute("UPDATE users SET password = %s, role = 'admin', has_kdv_access = 1 WHERE username = %s", (hashed_pw, username))
+                print(f"Admin hesabı güncellendi: {username}")
+        conn.commit()
+
+
+def run_migrations(bootstrap_admin=True):
+    """
+    Eksik adımları uygular, uygulanan sürümlerin listesini döner.
+    Şema güncelse tek sorgu çalışır ve boş liste döner (admin bootstrap dahil hiçbir şey yapılmaz).
+    """
+    if current_version() >= LATEST_VERSION:
+        return []
+
+    applied = []
+    with migration_lock():
+        _ensure_version_table()
+        # Kilidi beklerken başka bir worker göçleri bitirmiş olabilir
+        done = {row["version"] for row in applied_versions()}
+        for version, name, step in MIGRATIONS:
+            if version in done:
+                continue
+            print(f"Sema gocu {version} ({name}) uygulaniyor...")
+            try:
+                step()
+            except Exception as e:
+                # Sürüm yazılmaz; adım bir sonraki açılışta (veya tools/migrate.py ile) yeniden denenir
+                raise RuntimeError(f"Sema gocu {version} ({name}) basarisiz: {e}") from e
+            with get_conn() as conn:
+                cur = conn.cursor()
+                cur.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)", (version, name))
+                conn.commit()
+            applied.append(version)
+
+        if applied and bootstrap_admin:
+            bootstrap_admin_from_env()
+    return applied
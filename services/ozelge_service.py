@@ -1,6 +1,10 @@
+import hashlib
 import json
+import os
 import re
+import threading
 import unicodedata
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
@@ -446,21 +450,28 @@ def item_sort_key(item):
     return (date_sort, item.get("title") or "")
 
 
-def rank_ozelge(item, query):
-    q = normalize_search_text(query)
+# rank_ozelge'in puanladığı alanlar: alan adı -> öğeden normalize metni üreten fonksiyon
+RANK_FIELDS = {
+    "title": lambda item: item.get("title"),
+    "topics": lambda item: " ".join(item.get("topics", [])),
+    "summary": lambda item: item.get("summary"),
+    "soru": lambda item: item.get("soru_ozeti"),
+    "cevap": lambda item: item.get("cevap_ozeti"),
+    "no": lambda item: item.get("ozelge_no") or item.get("code"),
+    "date": lambda item: item.get("date"),
+    "text": lambda item: item.get("search_text"),
+}
+
+
+def normalized_fields(item):
+    return {name: normalize_search_text(getter(item)) for name, getter in RANK_FIELDS.items()}
+
+
+def score_fields(fields, q):
+    """Normalize edilmiş sorgu `q` için önceden normalize edilmiş alanları puanlar."""
     if not q:
         return 0
     words = [w for w in q.split() if len(w) > 1]
-    fields = {
-        "title": normalize_search_text(item.get("title")),
-        "topics": normalize_search_text(" ".join(item.get("topics", []))),
-        "summary": normalize_search_text(item.get("summary")),
-        "soru": normalize_search_text(item.get("soru_ozeti")),
-        "cevap": normalize_search_text(item.get("cevap_ozeti")),
-        "no": normalize_search_text(item.get("ozelge_no") or item.get("code")),
-        "date": normalize_search_text(item.get("date")),
-        "text": normalize_search_text(item.get("search_text")),
-    }
     score = 0
     if q in fields["title"]:
         score += 90
@@ -494,6 +505,10 @@ def rank_ozelge(item, query):
     return score
 
 
+def rank_ozelge(item, query):
+    return score_fields(normalized_fields(item), normalize_search_text(query))
+
+
 def search_ozelgeler(items, query):
     if not query:
         return sorted(items, key=item_sort_key, reverse=True)
@@ -502,6 +517,74 @@ def search_ozelgeler(items, query):
     return [item for _, item in sorted(ranked, key=lambda pair: (pair[0], item_sort_key(pair[1])), reverse=True)]
 
 
+class OzelgeRepository:
+    """
+    ozelgeler_index.json'un bellekteki hali: tarihe göre sıralı öğeler,
+    slug -> öğe sözlüğü, önceden normalize edilmiş arama alanları ve
+    normalize token -> öğe sırası ters indeksi. Dosya değişince yeniden kurulur.
+    """
+
+    def __init__(self, data, mtime):
+        self.mtime = mtime
+        self.items = sorted(data.get("items", []), key=item_sort_key, reverse=True)
+        self.data = dict(data, items=self.items)
+        self.by_slug = {}
+        for item in self.items:
+            self.by_slug.setdefault(item.get("slug"), item)
+        self.fields = [normalized_fields(item) for item in self.items]
+        self.position = {id(item): pos for pos, item in enumerate(self.items)}
+
+        self.postings = {}
+        for pos, fields in enumerate(self.fields):
+            for value in fields.values():
+                for token in value.split():
+                    self.postings.setdefault(token, set()).add(pos)
+        self.vocabulary = list(self.postings)
+
+        self.topics = sorted({topic for item in self.items for topic in item.get("topics", [])})
+        self.by_topic = {}
+        for item in self.items:
+            for topic in item.get("topics", []):
+                self.by_topic.setdefault(topic, []).append(item)
+
+    def get(self, slug):
+        return self.by_slug.get(slug)
+
+    def _candidates(self, q):
+        """
+        En az bir sorgu kelimesini (alt dizgi olarak) içeren öğelerin sıraları.
+        Boşluksuz bir kelime normalize alanda ancak tek bir token'ın içinde
+        geçebileceğinden, puanı > 0 olabilecek her öğe bu kümededir.
+        """
+        found = set()
+        for word in set(q.split()):
+            for token in self.vocabulary:
+                if word in token:
+                    found |= self.postings[token]
+        return found
+
+    def search(self, query, items=None):
+        """search_ozelgeler ile aynı sonuç; `items` verilirse yalnız o öğeler içinde arar."""
+        if items is None:
+            items = self.items
+        if not query:
+            return sorted(items, key=item_sort_key, reverse=True)
+        q = normalize_search_text(query)
+        candidates = self._candidates(q)
+        ranked = []
+        for item in items:
+            pos = self.position.get(id(item))
+            if pos is None:
+                score = rank_ozelge(item, query)
+            elif pos in candidates:
+                score = score_fields(self.fields[pos], q)
+            else:
+                continue
+            if score > 0:
+                ranked.append((score, item))
+        return [item for _, item in sorted(ranked, key=lambda pair: (pair[0], item_sort_key(pair[1])), reverse=True)]
+
+
 def read_ocr_text(root, pdf_stem):
     text_path = root / "services" / "ocr_text" / f"{pdf_stem}.txt"
     if not text_path.exists():
@@ -530,13 +613,208 @@ def extract_text_from_pdf(pdf_path, max_pages=None):
         return "", 0, f"hata: {type(exc).__name__}"
 
 
-def build_ozelge_index(root_path):
+class SubstringIndex:
+    """
+    Metin kümesi üzerinde karakter n-gram ters indeksi. `containing(s)` sorusu
+    tüm metinleri taramak yerine s'nin n-gram posting'lerinin kesişimindeki
+    az sayıda metinde `s in metin` doğrulaması yapar (sonuç birebir aynıdır).
+    """
+
+    def __init__(self, texts, n=3):
+        self.texts = texts
+        self.n = n
+        self.postings = {}
+        for name, text in texts.items():
+            for gram in {text[i:i + n] for i in range(len(text) - n + 1)}:
+                self.postings.setdefault(gram, []).append(name)
+        self._memo = {}
+
+    def containing(self, value):
+        found = self._memo.get(value)
+        if found is not None:
+            return found
+        if len(value) < self.n:
+            pool = self.texts
+        else:
+            grams = {value[i:i + self.n] for i in range(len(value) - self.n + 1)}
+            lists = sorted((self.postings.get(g, ()) for g in grams), key=len)
+            pool = set(lists[0])
+            for names in lists[1:]:
+                if not pool:
+                    break
+                pool.intersection_update(names)
+        found = frozenset(name for name in pool if value in self.texts[name])
+        self._memo[value] = found
+        return found
+
+
+def match_ocr_files(yeni_data, ocr_texts, tr_normalize):
+    """
+    ozelgeler_yeni.json kayıtlarını OCR metin dosyalarıyla eşler: {kayıt_idx: pdf_adı}.
+
+    Puanlama ve açgözlü atama eski N×M çapraz çarpımla aynıdır; fakat her
+    (kayıt, dosya) çifti taranmaz. Özelge no / parça / tarih / anahtar kelime
+    eşleşmeleri n-gram indeksinden aday dosya olarak gelir, puanı 0 olan
+    çiftler yalnızca atama sırası için dikkate alınır.
+    """
+    file_order = list(ocr_texts)
+    file_rank = {name: pos for pos, name in enumerate(file_order)}
+    file_stems = [(name, name.replace(".txt", "").lower()) for name in file_order]
+    index = SubstringIndex(ocr_texts)
+
+    positive = []
+    for idx, item in enumerate(yeni_data):
+        ozelge_no = item.get("ozelge_no", "")
+        tarih = item.get("tarih", "")
+        konu = item.get("konu", "")
+        mukellef_sorusu = item.get("mukellef_sorusu", "")
+
+        no_clean = re.sub(r'[^a-zA-Z0-9]', '', ozelge_no).lower()
+        parts = [p for p in re.split(r'[^a-zA-Z0-9]', ozelge_no) if len(p) >= 2]
+        tarih_clean = tarih.replace(".", "/")
+
+        norm_konu = tr_normalize(konu)
+        norm_soru = tr_normalize(mukellef_sorusu)
+        combined_words = re.split(r'\s+', norm_konu + ' ' + norm_soru)
+        keywords = [w for w in combined_words if len(w) > 4]
+
+        scores = {}
+        if no_clean:
+            for name in index.containing(no_clean):
+                scores[name] = scores.get(name, 0) + 1000
+        for part in parts:
+            for name in index.containing(part.lower()):
+                scores[name] = scores.get(name, 0) + len(part) * 10
+        if parts:
+            last = parts[-1].lower()
+            for name, stem in file_stems:
+                if stem in last or last in stem:
+                    scores[name] = scores.get(name, 0) + 500
+        if tarih:
+            for name in index.containing(tarih) | index.containing(tarih_clean):
+                scores[name] = scores.get(name, 0) + 300
+        for word in keywords:
+            for name in index.containing(word):
+                scores[name] = scores.get(name, 0) + 1
+
+        positive.extend((score, idx, name) for name, score in scores.items() if score > 0)
+
+    # Eşit puanlarda eski sıralama (kayıt sırası, sonra dosya sırası) korunur
+    positive.sort(key=lambda x: (-x[0], x[1], file_rank[x[2]]))
+
+    final_mapping = {}
+    used_files = set()
+    for score, idx, filename in positive:
+        if idx not in final_mapping and filename not in used_files:
+            used_files.add(filename)
+            final_mapping[idx] = filename.replace(".txt", ".pdf")
+
+    # Puanı 0 olan çiftler: eşleşmeyen kayıtlara sıradaki boş dosya
+    free_files = (name for name in file_order if name not in used_files)
+    for idx in range(len(yeni_data)):
+        if idx in final_mapping:
+            continue
+        filename = next(free_files, None)
+        if filename is None:
+            break
+        final_mapping[idx] = filename.replace(".txt", ".pdf")
+    return final_mapping
+
+
+OZELGE_BUILD_CACHE = "ozelgeler_build_cache.json"
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scan_pdf(path, text_pages=0):
+    """
+    Tek PDF için sayfa sayısı (text_pages=0) ya da ilk `text_pages` sayfanın metni.
+    Süreç havuzunda çalıştığı için modül seviyesinde ve yan etkisizdir.
+    """
+    if text_pages:
+        text, pages, status = extract_text_from_pdf(path, max_pages=text_pages)
+        return {"pages": pages, "text": text, "status": status}
+    pages = 0
+    if PdfReader is not None:
+        try:
+            pages = len(PdfReader(str(path)).pages)
+        except Exception:
+            pass
+    return {"pages": pages}
+
+
+def _load_build_cache(cache_path):
+    try:
+        data = json.loads(cache_path.read_text(encoding="utf-8"))
+        return data.get("entries", {}) if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def _save_build_cache(cache_path, entries):
+    tmp_path = cache_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps({"entries": entries}, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, cache_path)
+
+
+def scan_pdfs(paths, cache_path=None, text_pages=0, workers=None, stats=None):
+    """
+    PDF'leri (gerekirse süreç havuzunda) tarar: {yol: scan_pdf sonucu}.
+    Sonuçlar dosya içeriğinin hash'i ile önbelleğe yazılır; yeniden kurulumda
+    yalnızca yeni/değişen dosyalar işlenir. Önbellek her birkaç sonuçta bir
+    diske yazıldığı için yarıda kalan kurulum kaldığı yerden devam eder.
+    """
+    entries = _load_build_cache(cache_path) if cache_path else {}
+    cacheable = PdfReader is not None
+    results, pending = {}, []
+    for path in dict.fromkeys(paths):
+        key = f"{file_digest(path)}:{text_pages}"
+        if cacheable and key in entries:
+            results[path] = entries[key]
+        else:
+            pending.append((path, key))
+
+    if stats is not None:
+        stats["cached"] = len(results)
+        stats["processed"] = len(pending)
+
+    def store(path, key, result, done):
+        results[path] = result
+        if cache_path and cacheable:
+            entries[key] = result
+            if done % 16 == 0:
+                _save_build_cache(cache_path, entries)
+
+    if workers is None:
+        workers = int(os.getenv("OZELGE_BUILD_WORKERS", "0")) or os.cpu_count() or 1
+    if len(pending) > 1 and workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            futures = [(path, key, pool.submit(scan_pdf, path, text_pages)) for path, key in pending]
+            for done, (path, key, future) in enumerate(futures, 1):
+                store(path, key, future.result(), done)
+    else:
+        for done, (path, key) in enumerate(pending, 1):
+            store(path, key, scan_pdf(path, text_pages), done)
+
+    if cache_path and cacheable and pending:
+        _save_build_cache(cache_path, entries)
+    return results
+
+
+def build_ozelge_index(root_path, workers=None, use_cache=True, stats=None):
     root = Path(root_path)
     source_dir = _first_existing(root / "services" / "ozelgeler", root / "ozelgeler")
     data_dir = root / "static" / "data"
     data_dir.mkdir(parents=True, exist_ok=True)
 
     yeni_json_path = data_dir / "ozelgeler_yeni.json"
+    cache_path = data_dir / OZELGE_BUILD_CACHE if use_cache else None
 
     yeni_data = None
     if yeni_json_path.exists():
@@ -598,68 +876,21 @@ def build_ozelge_index(root_path):
             except Exception:
                 pass
 
-        all_pairs = []
-        for idx, item in enumerate(yeni_data):
-            ozelge_no = item.get("ozelge_no", "")
-            tarih = item.get("tarih", "")
-            konu = item.get("konu", "")
-            mukellef_sorusu = item.get("mukellef_sorusu", "")
-
-            no_clean = re.sub(r'[^a-zA-Z0-9]', '', ozelge_no).lower()
-            parts = [p for p in re.split(r'[^a-zA-Z0-9]', ozelge_no) if len(p) >= 2]
-            tarih_clean = tarih.replace(".", "/")
-            
-            norm_konu = tr_normalize(konu)
-            norm_soru = tr_normalize(mukellef_sorusu)
-            combined_words = re.split(r'\s+', norm_konu + ' ' + norm_soru)
-            keywords = [w for w in combined_words if len(w) > 4]
-
-            for filename, ocr_clean in ocr_texts.items():
-                score = 0
-                if no_clean and no_clean in ocr_clean:
-                    score += 1000
-                for part in parts:
-                    if part.lower() in ocr_clean:
-                        score += len(part) * 10
-                
-                stem = filename.replace(".txt", "").lower()
-                if parts and (stem in parts[-1].lower() or parts[-1].lower() in stem):
-                    score += 500
-                    
-                if tarih and (tarih in ocr_clean or tarih_clean in ocr_clean):
-                    score += 300
-                    
-                content_score = sum(1 for w in keywords if w in ocr_clean)
-                score += content_score
-
-                all_pairs.append((score, idx, filename))
-
-        all_pairs.sort(key=lambda x: x[0], reverse=True)
-
-        final_mapping = {}
-        assigned_idx = set()
-        used_files = set()
-
-        for score, idx, filename in all_pairs:
-            if idx not in assigned_idx and filename not in used_files:
-                assigned_idx.add(idx)
-                used_files.add(filename)
-                final_mapping[idx] = filename.replace(".txt", ".pdf")
+        final_mapping = match_ocr_files(yeni_data, ocr_texts, tr_normalize)
+        filenames = [final_mapping.get(idx) or "10.pdf" for idx in range(len(yeni_data))]
+        scans = scan_pdfs(
+            [source_dir / name for name in filenames if (source_dir / name).exists()],
+            cache_path=cache_path, workers=workers, stats=stats,
+        )
 
         items = []
-        for idx, item in enumerate(yeni_data):
-            filename = final_mapping.get(idx) or "10.pdf"
+        for item, filename in zip(yeni_data, filenames):
             pdf_path = source_dir / filename
             pages = 0
             file_size = 0
             if pdf_path.exists():
                 file_size = pdf_path.stat().st_size
-                if PdfReader is not None:
-                    try:
-                        reader = PdfReader(str(pdf_path))
-                        pages = len(reader.pages)
-                    except Exception:
-                        pass
+                pages = scans[pdf_path]["pages"]
 
             code = display_code(filename)
             slug = slugify(f"{code}-{item.get('konu', '')}")
@@ -698,9 +929,12 @@ def build_ozelge_index(root_path):
             items.append(built_item)
     else:
         items = []
-        for pdf in sorted(source_dir.glob("*.pdf"), key=lambda p: p.name.lower()):
+        pdfs = sorted(source_dir.glob("*.pdf"), key=lambda p: p.name.lower())
+        scans = scan_pdfs(pdfs, cache_path=cache_path, text_pages=2, workers=workers, stats=stats)
+        for pdf in pdfs:
             ocr_text = read_ocr_text(root, pdf.stem)
-            extracted_text, pages, pdf_status = extract_text_from_pdf(pdf, max_pages=2)
+            scan = scans[pdf]
+            extracted_text, pages, pdf_status = scan["text"], scan["pages"], scan["status"]
             text = ocr_text or extracted_text
             status = "ocr_metin_var" if ocr_text else pdf_status
             metadata = extract_metadata(text, pdf.name)
@@ -743,22 +977,41 @@ def build_ozelge_index(root_path):
 
 
 
-def load_ozelge_index(root_path):
-    root = Path(root_path)
-    index_path = root / "static" / "data" / "ozelgeler_index.json"
-    if not index_path.exists():
-        return build_ozelge_index(root_path)
+_repository_cache = {}
+_repository_lock = threading.Lock()
+
+
+def get_ozelge_repository(root_path):
+    """Önbellekteki OzelgeRepository'yi döner; indeks dosyası değiştiyse yeniden yükler."""
+    index_path = Path(root_path) / "static" / "data" / "ozelgeler_index.json"
     try:
-        data = json.loads(index_path.read_text(encoding="utf-8"))
-    except Exception:
-        return build_ozelge_index(root_path)
-    data["items"] = sorted(data.get("items", []), key=item_sort_key, reverse=True)
-    return data
+        mtime = index_path.stat().st_mtime
+    except OSError:
+        mtime = None
+
+    repo = _repository_cache.get(index_path)
+    if repo is not None and mtime is not None and repo.mtime == mtime:
+        return repo
+
+    with _repository_lock:
+        repo = _repository_cache.get(index_path)
+        if repo is None or mtime is None or repo.mtime != mtime:
+            try:
+                data = json.loads(index_path.read_text(encoding="utf-8"))
+            except Exception:
+                data = build_ozelge_index(root_path)
+            try:
+                mtime = index_path.stat().st_mtime
+            except OSError:
+                mtime = None
+            repo = OzelgeRepository(data, mtime)
+            _repository_cache[index_path] = repo
+    return repo
+
+
+def load_ozelge_index(root_path):
+    return dict(get_ozelge_repository(root_path).data)
 
 
 def get_ozelge_by_slug(root_path, slug):
-    data = load_ozelge_index(root_path)
-    for item in data.get("items", []):
-        if item.get("slug") == slug:
-            return item
-    return None
+    return get_ozelge_repository(root_path).get(slug)
@@ -1,10 +1,10 @@
 import re
 import pandas as pd
-import pdfplumber
 import difflib
 import unicodedata
 import json
 from .utils import to_float_turkish
+from .pdf_text import extract_text
 from hesaplar import BILANCO_HESAPLARI
 from gelir import GELIR_TABLOSU_HESAPLARI
 
@@ -343,11 +343,7 @@ def get_bilanco_total_from_text(full_text, block_name="AKTİF"):
     return totals
 
 def parse_bilanco_from_pdf(pdf_path: str, text_content=None) -> dict:
-    if text_content:
-        full_text = text_content
-    else:
-        with pdfplumber.open(pdf_path) as pdf:
-            full_text = "\n".join([page.extract_text() or "" for page in pdf.pages])
+    full_text = text_content or extract_text(pdf_path)
 
     if "PASİF" in full_text and "AKTİF" in full_text:
         aktif_text, rest_text = re.split(r"PASİF\s*(?:\n|$)", full_text, 1)
@@ -432,11 +428,7 @@ def koddan_grup_bul(kod: str) -> str:
     return "Diğer"
 
 def parse_gelir_from_pdf(pdf_path: str, text_content=None) -> dict:
-    if text_content:
-        full_text = text_content
-    else:
-        with pdfplumber.open(pdf_path) as pdf:
-            full_text = "\n".join(p.extract_text() or "" for p in pdf.pages)
+    full_text = text_content or extract_text(pdf_path)
 
     muk   = extract_mukellef_bilgileri(full_text)
     unvan = muk.get("unvan", "Bilinmiyor")
@@ -540,12 +532,7 @@ def parse_kdv_from_pdf(pdf_path, text_content=None):
         data.append({"alan": name, "deger": value, "tip": kind})
         
     try:
-        full_text = ""
-        if text_content:
-            full_text = text_content
-        else:
-            with pdfplumber.open(pdf_path) as pdf:            
-                full_text = "\n".join((p.extract_text() or "") for p in pdf.pages)
+        full_text = text_content or extract_text(pdf_path)
             
         muk = extract_mukellef_bilgileri(full_text)
         unvan = muk["unvan"]
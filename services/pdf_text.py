@@ -0,0 +1,165 @@
+"""
+PDF metin çıkarma katmanı.
+
+Bir PDF'in sayfa metinleri (ve istenirse satır kutuları) tek geçişte çıkarılır
+ve dosya içeriğinin hash'i ile diske önbelleklenir; aynı dosya için tekrar
+pdfplumber açılmaz. Ayrıştırıcılar (`parse_*_from_pdf`) metni buradan alır.
+
+İki yol vardır:
+- "layout": pdfplumber (yavaş, satır düzenini korur). Bilanço/gelir/KDV
+  ayrıştırıcıları satır yapısına dayandığı için bunu kullanır.
+- "text": önce pypdf/PyPDF2 ile hızlı, sadece metin; metin çıkmazsa pdfplumber.
+
+Önbellek dosyaları beyanname içeriği taşıdığı için Fernet ile şifrelenir.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from extensions import fernet
+
+try:
+    from pypdf import PdfReader
+except Exception:  # pragma: no cover - optional runtime dependency
+    try:
+        from PyPDF2 import PdfReader
+    except Exception:
+        PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+PDF_TEXT_CACHE_DIR = os.getenv("PDF_TEXT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "isfa_pdf_text")
+PDF_TEXT_CACHE_MAX_FILES = int(os.getenv("PDF_TEXT_CACHE_MAX_FILES", "2000"))
+
+# Çıkarma mantığı değişirse eski önbellek kayıtları geçersiz olsun
+_CACHE_VERSION = 1
+
+
+class PdfDocument:
+    def __init__(self, pages, lines=None, digest=None, extractor=None):
+        self.pages = pages          # sayfa başına metin
+        self.lines = lines          # sayfa başına [{"text", "x0", "x1", "top", "bottom"}, ...] veya None
+        self.digest = digest
+        self.extractor = extractor  # "pypdf" / "pdfplumber"
+
+    @property
+    def text(self):
+        return "\n".join(self.pages)
+
+    def __len__(self):
+        return len(self.pages)
+
+
+def content_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_path(digest, mode, with_lines):
+    suffix = f"{mode}{'-lines' if with_lines else ''}"
+    return os.path.join(PDF_TEXT_CACHE_DIR, f"{digest}.{suffix}.v{_CACHE_VERSION}")
+
+
+def _cache_read(path):
+    try:
+        with open(path, "rb") as f:
+            payload = json.loads(gzip.decompress(fernet.decrypt(f.read())))
+        return payload
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # Anahtar değişmiş veya dosya bozuk: önbellek ıskası say
+        logger.debug(f"PDF metin önbelleği okunamadı ({path}): {e}")
+        return None
+
+
+def _prune_cache():
+    try:
+        entries = [os.path.join(PDF_TEXT_CACHE_DIR, name) for name in os.listdir(PDF_TEXT_CACHE_DIR)]
+    except OSError:
+        return
+    if len(entries) <= PDF_TEXT_CACHE_MAX_FILES:
+        return
+    entries.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+    for old in entries[:len(entries) - PDF_TEXT_CACHE_MAX_FILES]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+
+
+def _cache_write(path, payload):
+    try:
+        os.makedirs(PDF_TEXT_CACHE_DIR, exist_ok=True)
+        data = fernet.encrypt(gzip.compress(json.dumps(payload, ensure_ascii=False).encode("utf-8")))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        _prune_cache()
+    except OSError as e:
+        logger.warning(f"PDF metin önbelleğine yazılamadı: {e}")
+
+
+def _extract_fast(path):
+    """pypdf ile sadece metin. Kütüphane yoksa veya hiç metin çıkmazsa None."""
+    if PdfReader is None:
+        return None
+    try:
+        reader = PdfReader(str(path))
+        pages = [page.extract_text() or "" for page in reader.pages]
+    except Exception:
+        return None
+    return pages if any(p.strip() for p in pages) else None
+
+
+def _extract_layout(path, with_lines=False):
+    import pdfplumber
+
+    pages, lines = [], [] if with_lines else None
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            pages.append(page.extract_text() or "")
+            if with_lines:
+                lines.append([
+                    {"text": l["text"], "x0": l["x0"], "x1": l["x1"], "top": l["top"], "bottom": l["bottom"]}
+                    for l in page.extract_text_lines()
+                ])
+    return pages, lines
+
+
+def extract_document(path, mode="layout", with_lines=False, use_cache=True):
+    """
+    PDF'in sayfa metinlerini döner (PdfDocument).
+    mode="layout": pdfplumber; mode="text": önce hızlı pypdf yolu.
+    with_lines=True satır kutularını da çıkarır (yalnızca pdfplumber ile).
+    """
+    digest = content_digest(path)
+    cache_file = _cache_path(digest, mode, with_lines)
+    if use_cache:
+        cached = _cache_read(cache_file)
+        if cached is not None:
+            return PdfDocument(cached["pages"], cached.get("lines"), digest, cached.get("extractor"))
+
+    pages, lines, extractor = None, None, "pdfplumber"
+    if mode == "text" and not with_lines:
+        pages = _extract_fast(path)
+        if pages is not None:
+            extractor = "pypdf"
+    if pages is None:
+        pages, lines = _extract_layout(path, with_lines=with_lines)
+
+    if use_cache:
+        _cache_write(cache_file, {"pages": pages, "lines": lines, "extractor": extractor})
+    return PdfDocument(pages, lines, digest, extractor)
+
+
+def extract_text(path, mode="layout", use_cache=True):
+    """Tüm sayfaların birleşik metni (ayrıştırıcıların beklediği `full_text`)."""
+    return extract_document(path, mode=mode, use_cache=use_cache).text
@@ -0,0 +1,255 @@
+"""
+Sorgu planı denetimi.
+
+Uygulamanın GET uç noktaları test istemcisiyle (verilen kullanıcı/rol
+oturumuyla) çağrılır; çalışan her sorgu `add_query_listener` ile yakalanır ve
+ardından aynı veritabanında EXPLAIN edilir. Tam tablo taraması yapan sorgular
+işaretlenir:
+
+    SQLite      EXPLAIN QUERY PLAN -> indeks kullanmayan "SCAN <tablo>" satırları
+    PostgreSQL  EXPLAIN (FORMAT JSON) -> "Seq Scan" düğümleri
+
+PostgreSQL'de tohum veri küçük olduğunda planlayıcı zaten sıralı taramayı
+seçer; bu yüzden EXPLAIN sırasında enable_seqscan kapatılır ve yalnızca hiçbir
+indeksin kullanılamadığı taramalar kalır.
+
+GET uç noktalarının bir kısmı da yazar (önbellek ısıtma, ziyaretçi alanı);
+denetim bu yüzden tools/explain_audit.py ile geçici bir SQLite veritabanında,
+`seed_database` ile doldurulmuş küçük bir veri kümesi üzerinde çalıştırılır.
+Boş veritabanında rotalar ilk sorgudan sonra döner ve denetlenecek bir şey kalmaz.
+
+Bilinen istisnalar (KNOWN_SCANS) tam tarama olarak işaretlenmez; bunlar
+kapsamı gereği tablonun tamamını okuyan sorgulardır.
+"""
+import re
+
+from flask import url_for
+
+from services.db import USE_SQLITE, add_query_listener, get_conn, remove_query_listener
+
+# Veri değiştiren veya oturumu bozan GET uç noktaları denetimde çağrılmaz
+SKIP_ENDPOINTS = {
+    "static",
+    "auth.logout",
+    "admin.approve_user",
+    "admin.reject_user",
+    "admin.suspend_user",
+}
+
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+# (url, tablo, sorgu başlangıcı): bilerek tam tarama yapan sorgular
+KNOWN_SCANS = [
+    # KDV paneli özeti: kapsamdaki tüm dosyaların tek SUM/COUNT ... FILTER toplamı; tam yetkili
+    # rollerde kapsam filtresi yoktur. Altı aylık trend sorgusu indeksli kalmalıdır.
+    ("/api/kdv/stats", "kdv_files", "SELECT COALESCE(SUM(amount_request) FILTER"),
+]
+
+
+def _known_scan(url, table, query):
+    return any(url == u and table == t and query.startswith(q) for u, t, q in KNOWN_SCANS)
+
+SEED_VKN = "1111111111"
+
+_SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+_RULE_ARG = re.compile(r"<(?:(\w+)(?:\([^)]*\))?:)?(\w+)>")
+_TABLE_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_NOT_ALIAS = {"WHERE", "JOIN", "LEFT", "RIGHT", "INNER", "OUTER", "ON", "ORDER", "GROUP", "LIMIT", "SET", "USING"}
+
+
+def _normalize(query):
+    return " ".join(query.split())
+
+
+def _aliases(query):
+    """SQLite planı takma adları gösterir ("SCAN f"); takma ad -> tablo eşlemesi."""
+    aliases = {}
+    for table, alias in _TABLE_ALIAS.findall(query):
+        if alias and alias.upper() not in _NOT_ALIAS:
+            aliases[alias] = table
+    return aliases
+
+
+def default_urls(app, sample_id=1):
+    """Parametresiz ve yalnızca int parametreli GET kurallarının URL listesi."""
+    urls = []
+    for rule in app.url_map.iter_rules():
+        if "GET" not in rule.methods or rule.endpoint in SKIP_ENDPOINTS:
+            continue
+        args = _RULE_ARG.findall(rule.rule)
+        if any(converter != "int" for converter, _ in args):
+            continue
+        with app.test_request_context():
+            urls.append(url_for(rule.endpoint, **{arg: sample_id for arg in rule.arguments}))
+    return sorted(set(urls))
+
+
+def capture_queries(app, urls, user_id=1, role="admin", username="admin", mukellef_id=None):
+    """URL'leri sırayla çağırır; [(url, sorgu, parametreler), ...] (sorgu metnine göre tekil)."""
+    captured, seen = [], set()
+    current = {"url": None}
+
+    def listener(query, params):
+        key = _normalize(query)
+        if key in seen or not key.upper().startswith(EXPLAINABLE):
+            return
+        seen.add(key)
+        captured.append((current["url"], query, params))
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["username"] = username
+        sess["role"] = role
+        sess["logged_in"] = True
+        sess["has_kdv_access"] = True
+        sess["kdv_portal_pin_verified"] = True
+        if mukellef_id:
+            sess["aktif_mukellef_id"] = mukellef_id
+
+    add_query_listener(listener)
+    try:
+        for url in urls:
+            current["url"] = url
+            try:
+                client.get(url)
+            except Exception as e:
+                print(f"{url} cagrilamadi: {e}")
+    finally:
+        remove_query_listener(listener)
+    return captured
+
+
+def _pg_walk(node, plan, scans, depth=0):
+    line = node.get("Node Type", "?")
+    if node.get("Relation Name"):
+        line += f" on {node['Relation Name']}"
+    if node.get("Index Name"):
+        line += f" using {node['Index Name']}"
+    plan.append("  " * depth + line)
+    if node.get("Node Type") == "Seq Scan":
+        scans.append(node.get("Relation Name"))
+    for child in node.get("Plans", []):
+        _pg_walk(child, plan, scans, depth + 1)
+
+
+def explain_query(cur, query, params):
+    """(plan satırları, tam taranan tablolar)"""
+    if USE_SQLITE:
+        cur.execute("EXPLAIN QUERY PLAN " + query, params)
+        plan = [row["detail"] for row in cur.fetchall()]
+        aliases = _aliases(query)
+        scans = []
+        for detail in plan:
+            match = _SQLITE_SCAN.match(detail)
+            if match and "USING" not in detail and match.group(1) != "CONSTANT":
+                scans.append(aliases.get(match.group(1), match.group(1)))
+        return plan, scans
+
+    cur.execute("SET LOCAL enable_seqscan = off")
+    cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    row = cur.fetchone()
+    root = (row["QUERY PLAN"] if isinstance(row, dict) else row[0])[0]["Plan"]
+    plan, scans = [], []
+    _pg_walk(root, plan, scans)
+    return plan, scans
+
+
+def seed_database(user_id=1, username="admin", role="admin"):
+    """
+    Boş veritabanına denetim verisi yazar: aktif kullanıcı, mükellef, KDV ve
+    bilanço beyannameleri, KDV iade dosyaları, teşvik belgesi ve dönemleri.
+    Kullanıcı zaten varsa yalnızca aktif/yetkili hale getirilir.
+    """
+    from routes.data_routes import kaydet_beyanname
+    from services.donem import kullanim_anahtari
+    from services.kdv_stats import sync_kdv_file_dates
+    from services.tesvik_data import defter_guncelle
+
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM users WHERE id = %s", (user_id,))
+        if cur.fetchone():
+            cur.execute(
+                "UPDATE users SET role = %s, is_approved = 1, is_suspended = 0, has_kdv_access = 1 WHERE id = %s",
+                (role, user_id),
+            )
+        else:
+            cur.execute(
+                "INSERT INTO users (id, username, password, role, is_approved, is_suspended, has_kdv_access)"
+                " VALUES (%s, %s, %s, %s, 1, 0, 1)",
+                (user_id, username, "-", role),
+            )
+
+        kimlik = {"vergi_kimlik_no": SEED_VKN, "unvan": "Denetim A.Ş."}
+        for donem in ("01/2024", "02/2024", "03/2024"):
+            kaydet_beyanname(
+                {**kimlik, "donem": donem, "veriler": [{"alan": "Matrah", "deger": "1000"}, {"alan": "Ödenecek", "deger": "200"}]},
+                "kdv", user_id=user_id, conn=conn,
+            )
+        kaydet_beyanname(
+            {**kimlik, "donem": "2023", "aktif": [{"Kod": "100", "Açıklama": "Kasa", "Cari Dönem": 10}],
+             "pasif": [{"Kod": "500", "Açıklama": "Sermaye", "Cari Dönem": 10}]},
+            "bilanco", user_id=user_id, conn=conn,
+        )
+        cur.execute("SELECT id FROM mukellef WHERE user_id = %s AND vergi_kimlik_no = %s", (user_id, SEED_VKN))
+        mukellef_id = cur.fetchone()["id"]
+
+        cur.execute("SELECT id FROM kdv_mukellef WHERE vkn = %s", (SEED_VKN,))
+        row = cur.fetchone()
+        if row:
+            kdv_mukellef_id = row["id"]
+        else:
+            cur.execute("INSERT INTO kdv_mukellef (vkn, unvan) VALUES (%s, %s) RETURNING id", (SEED_VKN, kimlik["unvan"]))
+            kdv_mukellef_id = cur.fetchone()["id"]
+        dosyalar = []
+        for period, status in (("01/2024", "İade Tamamlandı"), ("02/2024", "Eksiklik yazısı geldi"), ("03/2024", "Kontrol")):
+            cur.execute(
+                "INSERT INTO kdv_files (mukellef_id, user_id, period, subject, type, amount_request, status, date)"
+                " VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id",
+                (kdv_mukellef_id, user_id, period, "İhracat", "Nakden İade", 1000, status, "15.04.2024"),
+            )
+            dosyalar.append(cur.fetchone()["id"])
+        sync_kdv_file_dates(cur, dosyalar)
+
+        for belge_no in ("D-1", "D-2"):
+            cur.execute(
+                "INSERT INTO tesvik_belgeleri (user_id, mukellef_id, belge_no, karar, katki_tutari, vergi_orani)"
+                " VALUES (%s, %s, %s, %s, %s, %s)",
+                (user_id, mukellef_id, belge_no, "2012/3305", 1000000, 25),
+            )
+            for donem_text in ("2024 - 1. Geçici", "2024 - KURUMLAR"):
+                yil, tur = donem_text.split(" - ")
+                cur.execute(
+                    "INSERT INTO tesvik_kullanim (user_id, belge_no, hesap_donemi, donem_turu, donem_text,"
+                    " donem_anahtari, cari_yatirim_katki) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                    (user_id, belge_no, int(yil), tur, donem_text, kullanim_anahtari(donem_text), 1000),
+                )
+            defter_guncelle(cur, user_id, belge_no)
+        conn.commit()
+    return mukellef_id
+
+
+def audit(app, urls=None, user_id=1, role="admin", ignore_tables=(), mukellef_id=None):
+    """
+    Sorguları yakalar ve EXPLAIN eder.
+    Dönüş: [{"url", "query", "plan", "seq_scans", "error"}, ...]
+    """
+    urls = urls or default_urls(app)
+    results = []
+    for url, query, params in capture_queries(app, urls, user_id=user_id, role=role, mukellef_id=mukellef_id):
+        entry = {"url": url, "query": _normalize(query), "plan": [], "seq_scans": [], "error": None}
+        with get_conn() as conn:
+            cur = conn.cursor()
+            try:
+                plan, scans = explain_query(cur, query, params)
+                entry["plan"] = plan
+                entry["seq_scans"] = [
+                    t for t in scans if t not in ignore_tables and not _known_scan(url, t, entry["query"])
+                ]
+            except Exception as e:
+                entry["error"] = str(e)
+            finally:
+                conn.rollback()
+        results.append(entry)
+    return results
@@ -0,0 +1,78 @@
+"""
+İstek başına sorgu sayacı ve sorgu bütçesi (debug modu).
+
+`init_app` debug modunda (veya QUERY_BUDGET=1 ile) her isteğin çalıştırdığı
+sorguları sayar ve yanıta `X-Query-Count` başlığını ekler. Bir görünüm
+`@query_budget(n)` ile işaretlenmişse ve istek n'den fazla sorgu çalıştırdıysa:
+
+    app.testing veya QUERY_BUDGET_STRICT=1  -> QueryBudgetExceeded (istek 500 döner)
+    diğer durumlarda                        -> uyarı loglanır
+
+Böylece bir sayfaya N+1 sorgu geri geldiğinde testler ve geliştirme ortamı
+bunu hemen gösterir. Arka plan thread'lerindeki sorgular (istek dışı) sayılmaz.
+"""
+import os
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+
+from services.db import DEBUG_MODE, add_query_listener
+
+QUERY_BUDGET_ENABLED = DEBUG_MODE or os.getenv("QUERY_BUDGET", "0") == "1"
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "0") == "1"
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def query_budget(limit):
+    """Görünümün istek başına en fazla `limit` sorgu çalıştırmasına izin verir (@bp.route'un hemen altına)."""
+    def decorator(view):
+        view._query_budget = limit
+        return view
+    return decorator
+
+
+@contextmanager
+def uncounted():
+    """Bloktaki sorguları istek sayacına eklemez (tek seferlik bakım işleri için)."""
+    count = g.get("_query_count") if has_request_context() else None
+    try:
+        yield
+    finally:
+        if count is not None and "_query_count" in g:
+            g._query_count = count
+
+
+def _count_query(query, params):
+    if has_request_context() and "_query_count" in g:
+        g._query_count += 1
+
+
+def _start():
+    g._query_count = 0
+
+
+def _check(response):
+    count = g.pop("_query_count", None)
+    if count is None:
+        return response
+    response.headers["X-Query-Count"] = str(count)
+
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, "_query_budget", None)
+    if budget is not None and count > budget:
+        message = f"{request.endpoint}: {count} sorgu çalıştı, bütçe {budget}"
+        if current_app.testing or QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
+    return response
+
+
+def init_app(app):
+    if not QUERY_BUDGET_ENABLED:
+        return
+    add_query_listener(_count_query)
+    app.before_request(_start)
+    app.after_request(_check)
@@ -0,0 +1,172 @@
+"""
+Mevzuat (KDV / KV tebliğleri) için Türkçe duyarlı ters indeks ve BM25 skorlama.
+
+İndeks uygulama açılışında bir kez kurulur; her sorguda tüm korpus yerine
+yalnızca sorgu terimlerinin posting listeleri gezilir. Fuzzy yeniden sıralama
+bu kısa listeye uygulanır.
+"""
+import math
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+from rapidfuzz import fuzz, process
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Türkçe'de I/İ harflerinin küçültülmesi str.lower() ile doğru çalışmaz
+_TR_UPPER_MAP = str.maketrans({"I": "ı", "İ": "i"})
+# Aramada aksan farkı gözetilmez: "iştirak" == "istirak"
+_TR_FOLD_MAP = str.maketrans("çğıöşüâîû", "cgiosuaiu")
+
+STOPWORDS = {
+    "ve", "ile", "bir", "bu", "su", "o", "da", "de", "ki", "mi", "mu", "ne",
+    "icin", "olan", "olarak", "veya", "ya", "gibi", "kadar", "daha", "en",
+    "nedir", "nelerdir", "hangi", "hangileri", "nasil", "hakkinda", "kactir",
+}
+
+# Katlanmış (ASCII) biçimde. Amaç dilbilgisel doğruluk değil,
+# sorgu ve doküman tarafında aynı köke indirgemektir.
+_SUFFIXES = frozenset({
+    "lerinden", "larindan", "lerinde", "larinda", "lerine", "larina", "lerini", "larini",
+    "leri", "lari", "ler", "lar",
+    "indan", "inden", "undan", "unden", "ndan", "nden",
+    "inda", "inde", "unda", "unde", "nda", "nde",
+    "dan", "den", "tan", "ten", "da", "de", "ta", "te",
+    "ina", "ine", "una", "une", "nin", "nun", "in", "un",
+    "ya", "ye", "yi", "yu", "si", "su",
+    "a", "e", "i", "u",
+})
+_SUFFIX_LENGTHS = sorted({len(s) for s in _SUFFIXES}, reverse=True)
+
+MIN_STEM_LENGTH = 3
+
+
+def tr_casefold(text):
+    """Türkçe kurallarına göre küçük harfe çevirir ve aksanları katlar."""
+    return (text or "").translate(_TR_UPPER_MAP).lower().translate(_TR_FOLD_MAP)
+
+
+@lru_cache(maxsize=65536)
+def stem(token):
+    """Basit Türkçe ek budama (en fazla iki tur, en uzun ek önce)."""
+    if token.isdigit():
+        return token
+    for _ in range(2):
+        for length in _SUFFIX_LENGTHS:
+            if len(token) - length >= MIN_STEM_LENGTH and token[-length:] in _SUFFIXES:
+                token = token[:-length]
+                break
+        else:
+            break
+    return token
+
+
+def tokenize(text):
+    """Metni (pozisyon sırasıyla) köklenmiş terim listesine çevirir."""
+    tokens = []
+    for raw in _TOKEN_RE.findall(tr_casefold(text)):
+        if raw in STOPWORDS:
+            continue
+        tokens.append(stem(raw))
+    return tokens
+
+
+class InvertedIndex:
+    """
+    Alan bazlı (başlık + içerik) pozisyonel posting listeleri ve BM25 skorlama.
+
+    postings[alan][terim] = {doc_idx: [pozisyonlar]}
+    """
+
+    FIELD_WEIGHTS = {"title": 2.0, "content": 1.0}
+
+    def __init__(self, docs, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(docs)
+        self.postings = {field: defaultdict(dict) for field in self.FIELD_WEIGHTS}
+        self.doc_len = {field: [0] * self.size for field in self.FIELD_WEIGHTS}
+        self.avg_len = {}
+
+        for idx, doc in enumerate(docs):
+            for field in self.FIELD_WEIGHTS:
+                tokens = tokenize(doc.get(field) or "")
+                self.doc_len[field][idx] = len(tokens)
+                field_postings = self.postings[field]
+                for pos, term in enumerate(tokens):
+                    field_postings[term].setdefault(idx, []).append(pos)
+
+        for field in self.FIELD_WEIGHTS:
+            total = sum(self.doc_len[field])
+            self.avg_len[field] = (total / self.size) if self.size else 0.0
+
+        vocab = set()
+        for field in self.FIELD_WEIGHTS:
+            vocab.update(self.postings[field].keys())
+        self.vocabulary = sorted(vocab)
+        self._df = {
+            term: len(set(self.postings["title"].get(term, ())) | set(self.postings["content"].get(term, ())))
+            for term in self.vocabulary
+        }
+
+    def idf(self, term):
+        df = self._df.get(term, 0)
+        return math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+
+    def expand_terms(self, terms, score_cutoff=85, limit=2):
+        """İndekste olmayan (yazım hatalı) terimleri sözlükteki en yakın terimlere eşler."""
+        expanded = []
+        for term in terms:
+            if term in self._df:
+                expanded.append(term)
+                continue
+            if len(term) < 4:
+                continue
+            for match, _score, _ in process.extract(
+                term, self.vocabulary, scorer=fuzz.ratio, limit=limit, score_cutoff=score_cutoff
+            ):
+                expanded.append(match)
+        return expanded
+
+    def _phrase_hits(self, field, terms, doc_idx):
+        """Sorgudaki ardışık terim çiftlerinin dokümanda yan yana geçme sayısı."""
+        hits = 0
+        field_postings = self.postings[field]
+        for left, right in zip(terms, terms[1:]):
+            left_pos = field_postings.get(left, {}).get(doc_idx)
+            right_pos = field_postings.get(right, {}).get(doc_idx)
+            if left_pos and right_pos:
+                right_set = set(right_pos)
+                hits += sum(1 for p in left_pos if p + 1 in right_set)
+        return hits
+
+    def search(self, query, limit=50, phrase_boost=0.5):
+        """
+        BM25 ile en iyi `limit` dokümanı döner: [(doc_idx, skor), ...].
+        Sorgu terimleri ardışık geçiyorsa (pozisyonel eşleşme) ek puan verilir.
+        """
+        query_terms = tokenize(query)
+        terms = self.expand_terms(list(dict.fromkeys(query_terms)))
+        if not terms:
+            return []
+
+        scores = defaultdict(float)
+        for term in terms:
+            idf = self.idf(term)
+            for field, weight in self.FIELD_WEIGHTS.items():
+                avg_len = self.avg_len[field] or 1.0
+                lengths = self.doc_len[field]
+                for doc_idx, positions in self.postings[field].get(term, {}).items():
+                    tf = len(positions)
+                    norm = self.k1 * (1 - self.b + self.b * lengths[doc_idx] / avg_len)
+                    scores[doc_idx] += weight * idf * (tf * (self.k1 + 1)) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda pair: pair[1], reverse=True)[: limit * 2]
+        if len(query_terms) > 1:
+            boosted = []
+            for doc_idx, score in ranked:
+                hits = self._phrase_hits("title", query_terms, doc_idx) * 2 + self._phrase_hits("content", query_terms, doc_idx)
+                boosted.append((doc_idx, score * (1 + phrase_boost * min(hits, 4) / 4)))
+            ranked = sorted(boosted, key=lambda pair: pair[1], reverse=True)
+        return ranked[:limit]
@@ -0,0 +1,182 @@
+"""
+sitemap.xml üretimi ve önbelleği.
+
+Sitemap bir kez üretilir, render edilmiş baytlar (ve gzip hali) host bazında
+saklanır. Kaynak dosyaların (tebliğ JSON'ları, özelge indeksi, sayfa şablonları)
+mtime imzası değişmedikçe yeniden üretilmez. URL sayısı SITEMAP_MAX_URLS'i
+aşarsa sitemap index + gzip'li parçalar üretilir.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from datetime import datetime
+
+from flask import render_template, url_for
+
+from services.ozelge_service import load_ozelge_index
+from services.teblig_store import TEBLIG_FILES, get_teblig_tree
+
+# sitemaps.org protokol sınırı
+SITEMAP_MAX_URLS = int(os.getenv("SITEMAP_MAX_URLS", "50000"))
+
+# (endpoint, şablon, öncelik) - lastmod şablon dosyasının değişiklik tarihidir
+STATIC_PAGES = [
+    ("main.home", "index.html", "1.0"),
+    ("main.about", "pages/about.html", "0.5"),
+    ("main.team", "pages/team.html", "0.5"),
+    ("main.mevzuat", "pages/mevzuat.html", "0.5"),
+    ("main.indirim", "pages/indirim.html", "0.5"),
+    ("main.ceza", "pages/ceza.html", "0.5"),
+    ("main.kdv_tebligi", "pages/kdv_tebligi.html", "0.5"),
+    ("main.kv_tebligi", "pages/kv_tebligi.html", "0.5"),
+    ("main.mevzuat_degisiklikleri", "pages/mevzuat_degisiklikleri.html", "0.5"),
+    ("main.contact", "pages/contact.html", "0.5"),
+    ("main.cerez_politikasi", "pages/cerez_politikasi.html", "0.5"),
+    ("main.kdv_tevkifat", "pages/kdv_tevkifat.html", "0.5"),
+    ("main.itus", "pages/itus.html", "0.5"),
+    ("main.his", "pages/his.html", "0.5"),
+    ("main.kv_istisna_indirimler", "pages/kv_istisna_indirim.html", "0.9"),
+    ("main.tecil_taksitlendirme_2026", "pages/tecil_taksitlendirme_2026.html", "0.9"),
+    ("main.varlik_barisi_2026", "pages/varlik_barisi_2026.html", "0.9"),
+    ("tools.asgari", "calculators/asgarikurumlar.html", "0.5"),
+    ("tools.sermaye", "calculators/sermaye.html", "0.5"),
+    ("tools.finansman", "calculators/finansman.html", "0.5"),
+    ("tools.sermaye_azaltimi", "calculators/sermaye_azaltimi.html", "0.5"),
+    ("calculators.index", "calculators/index.html", "0.8"),
+    ("calculators.gelir_vergisi", "calculators/gelir_vergisi.html", "0.9"),
+    ("calculators.ithalat_kdv", "calculators/ithalat_kdv.html", "0.5"),
+    ("calculators.gecikme_zammi", "calculators/gecikme_zammi.html", "0.5"),
+    ("calculators.tecil_faizi", "calculators/tecil.html", "0.9"),
+    ("calculators.serbest_meslek", "calculators/serbest_meslek.html", "0.5"),
+    ("calculators.tdhp", "calculators/tdhp.html", "0.5"),
+    ("calculators.kdv_tevkifat", "calculators/kdv_tevkifat.html", "0.5"),
+    ("indirimlikurumlar_seo.hesaplama_araci", "calculators/indirimlikurumlar.html", "0.9"),
+    ("indirimlikurumlar_seo.teblig_ornekleri", "calculators/indirimlikurumlar.html", "0.8"),
+    ("indirimlikurumlar_seo.mevzuat_rehberi", "calculators/indirimlikurumlar.html", "0.8"),
+    ("indirimlikurumlar_seo.ozelge_kutuphanesi", "calculators/indirimlikurumlar.html", "0.8"),
+]
+
+# Host başlığı istemciden geldiği için önbellek host sayısı sınırlı tutulur
+SITEMAP_CACHE_HOSTS = 8
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0.0
+
+
+def _date(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d") if ts else datetime.now().strftime("%Y-%m-%d")
+
+
+def _source_paths(root_path):
+    paths = [os.path.join(root_path, "static", "data", name) for name in TEBLIG_FILES.values()]
+    paths.append(os.path.join(root_path, "static", "data", "ozelgeler_index.json"))
+    paths.extend(sorted({os.path.join(root_path, "templates", tpl) for _, tpl, _ in STATIC_PAGES}))
+    return paths
+
+
+def source_signature(root_path):
+    return tuple(_mtime(p) for p in _source_paths(root_path))
+
+
+def collect_urls(root_path):
+    """Sitemap'e girecek tüm URL'ler (gerçek lastmod tarihleriyle)."""
+    urls = []
+    for endpoint, template, priority in STATIC_PAGES:
+        try:
+            loc = url_for(endpoint, _external=True)
+        except Exception:
+            continue
+        lastmod = _date(_mtime(os.path.join(root_path, "templates", template)))
+        urls.append({"loc": loc, "lastmod": lastmod, "priority": priority})
+
+    for tax_type in TEBLIG_FILES:
+        try:
+            tree = get_teblig_tree(root_path, tax_type)
+        except Exception:
+            tree = None
+        if tree is None:
+            continue
+        lastmod = _date(tree.mtime)
+        endpoint = f"main.{tax_type}_tebligi"
+        for key in tree.order:
+            urls.append({
+                "loc": url_for(endpoint, bolum_id=key, _external=True),
+                "lastmod": lastmod,
+                "priority": "0.8",
+            })
+
+    try:
+        index_path = os.path.join(root_path, "static", "data", "ozelgeler_index.json")
+        index_date = _date(_mtime(index_path))
+        for item in load_ozelge_index(root_path).get("items", []):
+            urls.append({
+                "loc": url_for("indirimlikurumlar_seo.ozelge_detay", slug=item["slug"], _external=True),
+                "lastmod": item.get("indexed_at") or index_date,
+                "priority": "0.6",
+            })
+    except Exception:
+        pass
+    return urls
+
+
+class RenderedSitemap:
+    def __init__(self, signature, index, parts, last_modified):
+        self.signature = signature
+        self.index = index            # parçalıysa sitemap index baytları, değilse None
+        self.parts = parts            # urlset baytları (tek parça veya gzip'lenecek parçalar)
+        self.parts_gz = [gzip.compress(p, mtime=0) for p in parts]
+        self.index_gz = gzip.compress(index, mtime=0) if index is not None else None
+        self.last_modified = last_modified
+        digest = hashlib.md5()
+        for chunk in ([index] if index is not None else []) + parts:
+            digest.update(chunk)
+        self.etag = digest.hexdigest()
+
+    @property
+    def body(self):
+        return self.index if self.index is not None else self.parts[0]
+
+    @property
+    def body_gz(self):
+        return self.index_gz if self.index is not None else self.parts_gz[0]
+
+
+def _render(root_path, host_url, signature):
+    urls = collect_urls(root_path)
+    chunks = [urls[i:i + SITEMAP_MAX_URLS] for i in range(0, len(urls), SITEMAP_MAX_URLS)] or [[]]
+    parts = [render_template("sitemap.xml", urls=chunk).encode("utf-8") for chunk in chunks]
+    last_modified = datetime.fromtimestamp(max(signature) if signature else 0)
+
+    index = None
+    if len(parts) > 1:
+        sitemaps = [
+            {"loc": url_for("main.sitemap_part", part=n, _external=True), "lastmod": _date(max(signature))}
+            for n in range(1, len(parts) + 1)
+        ]
+        index = render_template("sitemap_index.xml", sitemaps=sitemaps).encode("utf-8")
+    return RenderedSitemap(signature, index, parts, last_modified)
+
+
+def get_sitemap(root_path, host_url):
+    """Host için önbellekteki sitemap'i döner; kaynaklar değiştiyse yeniden üretir."""
+    signature = source_signature(root_path)
+    cached = _cache.get(host_url)
+    if cached is not None and cached.signature == signature:
+        return cached
+    with _cache_lock:
+        cached = _cache.get(host_url)
+        if cached is None or cached.signature != signature:
+            cached = _render(root_path, host_url, signature)
+            _cache.pop(host_url, None)
+            while len(_cache) >= SITEMAP_CACHE_HOSTS:
+                _cache.pop(next(iter(_cache)))
+            _cache[host_url] = cached
+    return cached
@@ -0,0 +1,105 @@
+"""
+Tablo dışa aktarımı (Excel / CSV) için akışlı yanıt üretici.
+
+Satırlar bir iterator olarak verilir ve sırayla yazılır; hiçbir aşamada
+DataFrame veya bellekte tam dosya tutulmaz:
+
+    xlsx  xlsxwriter `constant_memory` ile geçici dosyaya yazılır, yanıt o
+          dosyadan parça parça okunur ve bitince dosya silinir
+    csv   her satır üretildiği anda yanıta yazılır (Excel'in Türkçe
+          ayarlarıyla açılması için UTF-8 BOM ve ';' ayırıcı)
+"""
+import csv
+import io
+import os
+import tempfile
+import unicodedata
+from urllib.parse import quote
+
+import xlsxwriter
+from flask import Response
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MIMETYPE = "text/csv; charset=utf-8"
+CHUNK_SIZE = 64 * 1024
+FORMATS = ("xlsx", "csv")
+
+
+def _file_chunks(path):
+    try:
+        with open(path, "rb") as fh:
+            while True:
+                chunk = fh.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.unlink(path)
+
+
+def _content_disposition(filename):
+    # Türkçe karakterler için ASCII yedek ad + RFC 5987 filename*
+    ascii_name = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def write_xlsx(path, headers, rows, sheet_name="Sayfa1", section_prefix=None, first_col_width=50):
+    """
+    Satırları sırayla yazar. `section_prefix` ile başlayan ilk hücreli satırlar
+    bölüm başlığı olarak biçimlendirilir.
+    """
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "tmpdir": tempfile.gettempdir()})
+    try:
+        worksheet = workbook.add_worksheet(sheet_name[:31])
+        header_format = workbook.add_format({'bold': True, 'bg_color': '#4e54c8', 'font_color': 'white', 'border': 1})
+        section_format = workbook.add_format({'bold': True, 'bg_color': '#f1f5f9', 'font_color': '#4e54c8'})
+
+        worksheet.set_column(0, 0, first_col_width)
+        worksheet.freeze_panes(1, 1)
+        worksheet.write_row(0, 0, headers, header_format)
+
+        for row_num, row in enumerate(rows, start=1):
+            # constant_memory: satır biçimi hücrelerden önce verilmeli
+            if section_prefix and str(row[0]).startswith(section_prefix):
+                worksheet.set_row(row_num, None, section_format)
+            worksheet.write_row(row_num, 0, row)
+    finally:
+        workbook.close()
+
+
+def _csv_chunks(headers, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    buffer.write("\ufeff")
+    writer.writerow(headers)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def export_response(headers, rows, filename, fmt="xlsx", **xlsx_options):
+    """
+    `rows` (liste/iterator, her eleman bir satır listesi) için indirilebilir yanıt.
+    `filename` uzantısız verilir; fmt 'xlsx' veya 'csv'.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Desteklenmeyen format: {fmt}")
+    disposition = {"Content-Disposition": _content_disposition(f"{filename}.{fmt}")}
+
+    if fmt == "csv":
+        return Response(_csv_chunks(headers, rows), mimetype=CSV_MIMETYPE, headers=disposition)
+
+    # Dosya istek içinde tamamlanır; yazma hatası yarım bir indirme yerine hata olarak döner
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        write_xlsx(path, headers, rows, **xlsx_options)
+    except Exception:
+        os.unlink(path)
+        raise
+    disposition["Content-Length"] = str(os.path.getsize(path))
+    return Response(_file_chunks(path), mimetype=XLSX_MIMETYPE, headers=disposition)
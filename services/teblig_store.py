@@ -0,0 +1,104 @@
+"""
+KDV / KV tebliğ ağaçları için süreç genelinde önbellek.
+
+JSON dosyası bir kez okunur; dosyanın mtime değeri değişirse yeniden yüklenir.
+Yükleme sırasında `bolum_id -> düğüm`, ebeveyn ve kardeş bilgileri önceden
+hesaplanır, böylece /mevzuat/<teblig>/<bolum_id> sayfaları O(1) arama yapar.
+"""
+import json
+import os
+import threading
+
+TEBLIG_FILES = {
+    "kdv": "kdv_tebligi.json",
+    "kv": "kv_tebligi.json",
+}
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def section_key(item):
+    """URL'de kullanılan bölüm anahtarı (uid içindeki '/' yerine '-')."""
+    return str(item.get("uid", item.get("id", ""))).replace("/", "-")
+
+
+class TebligTree:
+    def __init__(self, data, mtime):
+        self.data = data
+        self.mtime = mtime
+        self.nodes = {}       # key -> düğüm
+        self.parents = {}     # key -> ebeveyn key (kök için None)
+        self.children = {}    # key -> çocuk key listesi
+        self.order = []       # ön-sıra (pre-order) gezinme sırası
+        self.roots = []
+        self._index(data, None)
+
+    def _index(self, items, parent_key):
+        keys = []
+        for item in items:
+            key = section_key(item)
+            # Aynı anahtar tekrar ederse ilk bulunan geçerli (eski find_item davranışı)
+            if key not in self.nodes:
+                self.nodes[key] = item
+                self.parents[key] = parent_key
+                self.order.append(key)
+                keys.append(key)
+                self.children[key] = self._index(item.get("sub") or [], key)
+            else:
+                self._index(item.get("sub") or [], key)
+        if parent_key is None:
+            self.roots = keys
+        return keys
+
+    def get(self, key):
+        return self.nodes.get(key)
+
+    def parent(self, key):
+        parent_key = self.parents.get(key)
+        return self.nodes.get(parent_key) if parent_key is not None else None
+
+    def breadcrumb(self, key):
+        """Kökten düğüme kadar olan düğümler."""
+        path = []
+        while key is not None and key in self.nodes:
+            path.append(self.nodes[key])
+            key = self.parents.get(key)
+        return list(reversed(path))
+
+    def siblings(self, key):
+        if key not in self.nodes:
+            return []
+        parent_key = self.parents.get(key)
+        keys = self.roots if parent_key is None else self.children.get(parent_key, [])
+        return [self.nodes[k] for k in keys if k != key]
+
+
+def _teblig_path(root_path, tax_type):
+    return os.path.join(root_path, "static", "data", TEBLIG_FILES[tax_type])
+
+
+def get_teblig_tree(root_path, tax_type):
+    """Önbellekteki ağacı döner; dosya değiştiyse yeniden yükler. Dosya yoksa None."""
+    path = _teblig_path(root_path, tax_type)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+
+    tree = _cache.get(path)
+    if tree is not None and tree.mtime == mtime:
+        return tree
+
+    with _cache_lock:
+        tree = _cache.get(path)
+        if tree is None or tree.mtime != mtime:
+            with open(path, "r", encoding="utf-8") as f:
+                tree = TebligTree(json.load(f), mtime)
+            _cache[path] = tree
+    return tree
+
+
+def find_section(root_path, tax_type, bolum_id):
+    tree = get_teblig_tree(root_path, tax_type)
+    return tree.get(bolum_id) if tree else None
@@ -0,0 +1,195 @@
+"""
+İndirimli KV / teşvik modülünün veri erişimi.
+
+Belgeler ve dönemleri belge sayısından bağımsız sabit sayıda sorguyla
+yüklenir: belgeler için bir, tüm belgelerin tesvik_kullanim satırları için bir
+sorgu. Sayfanın ihtiyaç duyduğu diğer kayıtlar (dönem matrah havuzu) da aynı
+bağlantı üzerinden `load_indirimli_page` ile birlikte gelir.
+
+Katkı defteri (tesvik_katki_defteri) her belge için dönem sırasına göre
+kümülatif yatırım/diğer/yanan katkıyı ve dönem sonu kalan katkıyı tutar.
+tesvik_kullanim'a yazan her işlem aynı transaction içinde
+`defter_guncelle` çağırır; böylece "X döneminden önceki katkılar" tek bir
+indeksli satır okumasıdır.
+"""
+import psycopg2.extras
+
+from services.db import bulk_upsert, get_conn
+from services.donem import kullanim_donemi
+
+
+def _in(values):
+    return ",".join(["%s"] * len(values))
+
+
+def fetch_tesvik_docs(cur, user_id, mukellef_id=None):
+    """Kullanıcının (verilirse mükellefin) belgeleri, en yeni önce."""
+    if mukellef_id:
+        cur.execute("""
+            SELECT *
+            FROM tesvik_belgeleri
+            WHERE user_id = %s AND mukellef_id = %s
+            ORDER BY id DESC
+        """, (user_id, mukellef_id))
+    else:
+        cur.execute("""
+            SELECT *
+            FROM tesvik_belgeleri
+            WHERE user_id = %s
+            ORDER BY id DESC
+        """, (user_id,))
+    return cur.fetchall()
+
+
+def fetch_kullanim(cur, user_id, belge_nolar, columns="*"):
+    """Verilen belgelerin tüm dönem kayıtları tek sorguda (en yeni dönem önce)."""
+    belge_nolar = sorted({b for b in belge_nolar if b})
+    if not belge_nolar:
+        return []
+    cur.execute(f"""
+        SELECT {columns}
+        FROM tesvik_kullanim
+        WHERE user_id = %s AND belge_no IN ({_in(belge_nolar)})
+        ORDER BY donem_anahtari DESC, id DESC
+    """, (user_id, *belge_nolar))
+    return cur.fetchall()
+
+
+def attach_donemler(docs, kullanim_rows):
+    """
+    Her belgeye `donemler` listesini ({hesap_donemi, donem_turu}) dönem
+    anahtarına göre eskiden yeniye ekler; aynı yıl içinde geçici dönemler
+    sırayla, kurumlar beyannamesi en sonda.
+    """
+    by_belge = {}
+    for row in kullanim_rows:
+        by_belge.setdefault(row["belge_no"], []).append(row)
+    for d in docs:
+        rows = sorted(by_belge.get(d["belge_no"], []), key=lambda r: (r["donem_anahtari"] or 0, r["id"]))
+        d["donemler"] = [{"hesap_donemi": r["hesap_donemi"], "donem_turu": r["donem_turu"]} for r in rows]
+    return docs
+
+
+def load_tesvik_docs(user_id, mukellef_id=None):
+    """Belgeler ve dönem listeleri (iki sorgu)."""
+    with get_conn() as conn:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        docs = fetch_tesvik_docs(cur, user_id, mukellef_id)
+        if not docs:
+            return []
+        rows = fetch_kullanim(
+            cur, user_id, [d["belge_no"] for d in docs], "id, belge_no, hesap_donemi, donem_turu, donem_anahtari"
+        )
+    return attach_donemler(docs, rows)
+
+
+def load_indirimli_page(user_id, mukellef_id):
+    """
+    İndirimli KV sayfasının mükellef verisi tek bağlantıda:
+    {"docs": belgeler (+donemler), "kullanim": tüm dönem satırları, "donem_matrah": havuz kayıtları}
+    """
+    with get_conn() as conn:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        docs = fetch_tesvik_docs(cur, user_id, mukellef_id)
+        kullanim = fetch_kullanim(cur, user_id, [d["belge_no"] for d in docs]) if docs else []
+        try:
+            cur.execute(
+                "SELECT * FROM donem_matrah WHERE user_id = %s AND mukellef_id = %s"
+                " ORDER BY donem_anahtari DESC, id DESC",
+                (user_id, mukellef_id),
+            )
+            donem_matrah = cur.fetchall() or []
+        except Exception:
+            # Tablo henüz yoksa sayfa dönem havuzu olmadan açılır
+            conn.rollback()
+            donem_matrah = []
+    return {
+        "docs": attach_donemler(docs, kullanim),
+        "kullanim": kullanim,
+        "donem_matrah": donem_matrah,
+    }
+
+
+DEFTER_KOLONLARI = [
+    "user_id", "belge_no", "donem_anahtari", "hesap_donemi", "donem_turu",
+    "cari_yatirim_katki", "cari_diger_katki", "yanan_katki_tutari",
+    "kum_yatirim_katki", "kum_diger_katki", "kum_yanan_katki", "kalan_katki_tutari",
+]
+
+
+def defter_guncelle(cur, user_id, belge_no, baslangic=None):
+    """
+    Belgenin katkı defterini `baslangic` dönem anahtarından (verilmezse baştan)
+    itibaren tesvik_kullanim'dan yeniden yazar. Önceki dönemlerin satırlarına
+    dokunulmaz; kümülatif toplamlar bir önceki defter satırından devam eder.
+    Satırların anahtarı ve dönemi services.donem.kullanim_donemi kuralıyla
+    (donem_text öncelikli) belirlenir; çağıran yazdığı/sildiği satırın
+    tesvik_kullanim.donem_anahtari değerini verir. Commit etmez.
+    """
+    kum = {"kum_yatirim_katki": 0.0, "kum_diger_katki": 0.0, "kum_yanan_katki": 0.0}
+    if baslangic is not None:
+        cur.execute("""
+            SELECT kum_yatirim_katki, kum_diger_katki, kum_yanan_katki
+            FROM tesvik_katki_defteri
+            WHERE user_id = %s AND belge_no = %s AND donem_anahtari < %s
+            ORDER BY donem_anahtari DESC
+            LIMIT 1
+        """, (user_id, belge_no, baslangic))
+        onceki = cur.fetchone()
+        if onceki:
+            kum = {k: float(onceki[k] or 0) for k in kum}
+
+    cur.execute("""
+        SELECT donem_anahtari, donem_text, hesap_donemi, donem_turu, cari_yatirim_katki, cari_diger_katki,
+               yanan_katki_tutari, kalan_katki_tutari
+        FROM tesvik_kullanim
+        WHERE user_id = %s AND belge_no = %s AND donem_anahtari >= %s
+        ORDER BY donem_anahtari, id
+    """, (user_id, belge_no, baslangic or 0))
+
+    # Aynı anahtara düşen kayıtlar (ör. dönem türünün büyük/küçük harf farkı) birleştirilir
+    donemler = {}
+    for r in cur.fetchall():
+        yil, tur = kullanim_donemi(r["donem_text"], r["hesap_donemi"], r["donem_turu"])
+        d = donemler.setdefault(r["donem_anahtari"], {
+            "hesap_donemi": int(yil), "donem_turu": tur,
+            "cari_yatirim_katki": 0.0, "cari_diger_katki": 0.0, "yanan_katki_tutari": 0.0,
+            "kalan_katki_tutari": 0.0,
+        })
+        for k in ("cari_yatirim_katki", "cari_diger_katki", "yanan_katki_tutari"):
+            d[k] += float(r[k] or 0)
+        d["kalan_katki_tutari"] = float(r["kalan_katki_tutari"] or 0)
+
+    if baslangic is None:
+        cur.execute("DELETE FROM tesvik_katki_defteri WHERE user_id = %s AND belge_no = %s", (user_id, belge_no))
+    else:
+        cur.execute(
+            "DELETE FROM tesvik_katki_defteri WHERE user_id = %s AND belge_no = %s AND donem_anahtari >= %s",
+            (user_id, belge_no, baslangic),
+        )
+
+    satirlar = []
+    for anahtar in sorted(donemler):
+        d = donemler[anahtar]
+        kum["kum_yatirim_katki"] += d["cari_yatirim_katki"]
+        kum["kum_diger_katki"] += d["cari_diger_katki"]
+        kum["kum_yanan_katki"] += d["yanan_katki_tutari"]
+        satirlar.append((
+            user_id, belge_no, anahtar, d["hesap_donemi"], d["donem_turu"],
+            d["cari_yatirim_katki"], d["cari_diger_katki"], d["yanan_katki_tutari"],
+            kum["kum_yatirim_katki"], kum["kum_diger_katki"], kum["kum_yanan_katki"],
+            d["kalan_katki_tutari"],
+        ))
+    return bulk_upsert(cur, "tesvik_katki_defteri", DEFTER_KOLONLARI, satirlar)
+
+
+def defter_sil(cur, user_id, belge_no):
+    """Belgenin defter satırlarını siler (belge silinirken)."""
+    cur.execute("DELETE FROM tesvik_katki_defteri WHERE user_id = %s AND belge_no = %s", (user_id, belge_no))
+
+
+def defter_belge_no_degistir(cur, user_id, eski_belge_no, yeni_belge_no):
+    cur.execute(
+        "UPDATE tesvik_katki_defteri SET belge_no = %s WHERE user_id = %s AND belge_no = %s",
+        (yeni_belge_no, user_id, eski_belge_no),
+    )
@@ -0,0 +1,398 @@
+"""
+Çoklu beyanname yükleme (/yukle-coklu) için arka plan işleme hattı.
+
+İstek yalnızca dosyaları geçici bir klasöre kaydedip iş (job) kaydı açar.
+Ayrıştırma (PDF metin çıkarma + bilanço/gelir/KDV/XML parse) CPU ağırlıklı
+olduğu için süreç havuzunda yapılır; tüm sonuçlar tek transaction ile
+yazılır. İş durumu `upload_jobs` tablosunda tutulur, böylece hangi gunicorn
+worker'ı sorgulanırsa sorgulansın ilerleme okunabilir.
+"""
+import copy
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import psycopg2.extras
+
+from services.db import get_conn
+from services.pdf_service import parse_bilanco_from_pdf, parse_gelir_from_pdf, parse_kdv_from_pdf
+from services.pdf_text import extract_text
+from services.xml_service import parse_xml_file
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+UPLOAD_JOB_TTL_HOURS = int(os.getenv("UPLOAD_JOB_TTL_HOURS", "24"))
+# Bu süre boyunca ilerleme yazmayan aktif iş (worker öldü/yeniden başladı) hatalı sayılır
+UPLOAD_JOB_STALE_MINUTES = int(os.getenv("UPLOAD_JOB_STALE_MINUTES", "30"))
+
+AKTIF_DURUMLAR = ("queued", "parsing", "saving")
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def process_parsed_parts(full_data, doc_type):
+    # Yıl tespiti
+    yil = 2023
+    try:
+        m = re.search(r"(\d{4})", str(full_data.get("donem", "")))
+        if m: yil = int(m.group(1))
+    except: pass
+
+    results = []
+
+    if doc_type == 'bilanco':
+        cols = {'prev': 'Önceki Dönem', 'curr': 'Cari Dönem', 'inf': 'Cari Dönem (Enflasyonlu)'}
+        target_val_key = 'Cari Dönem'
+        sections = ['aktif', 'pasif']
+        title_base = "BİLANÇO"
+    else: # gelir
+        cols = {'prev': 'onceki_donem', 'curr': 'cari_donem', 'inf': 'cari_donem_enflasyonlu'}
+        target_val_key = 'cari_donem'
+        sections = ['tablo']
+        title_base = "GELİR TABLOSU"
+
+    def create_part(source_col, target_year, type_suffix="", include_prev=False):
+        new_d = copy.deepcopy(full_data)
+        new_d['donem'] = str(target_year)
+
+        has_any_data = False
+
+        # Keys mapping for previous and inflation columns
+        prev_key = cols['prev']
+        inf_key = cols.get('inf', None)  # Inflation column name
+
+        for sec in sections:
+            new_rows = []
+            if sec in new_d:
+                for row in new_d[sec]:
+                    val = row.get(source_col)
+                    prev_val = row.get(prev_key)
+                    inf_val = row.get(inf_key) if inf_key else None
+
+                    if val is not None or (include_prev and (prev_val is not None or inf_val is not None)):
+                        base_keys = ['Kod', 'Açıklama', 'kod', 'aciklama', 'grup']
+                        new_row = {k: v for k, v in row.items() if k in base_keys}
+
+                        # Set target value (Current Period or Inflation Adjusted)
+                        if val is not None:
+                            new_row[target_val_key] = val
+                            has_any_data = True
+
+                        # If including previous period data (only for main current year record)
+                        if include_prev and prev_val is not None:
+                            new_row[prev_key] = prev_val
+
+                        # If including inflation data (only for main current year record)
+                        if include_prev and inf_val is not None and inf_key:
+                            new_row[inf_key] = inf_val
+
+                        new_rows.append(new_row)
+            new_d[sec] = new_rows
+
+        new_d['veriler'] = {s: new_d.get(s, []) for s in sections}
+        # has_inflation should be True if we have inflation column data
+        new_d['has_inflation'] = (type_suffix == '_enf') or (include_prev and full_data.get('has_inflation', False))
+
+        final_tur = doc_type + type_suffix
+        return new_d, has_any_data, final_tur
+
+    # 1. Önceki Dönem
+    d1, ok1, t1 = create_part(cols['prev'], yil - 1)
+    if ok1: results.append((d1, t1, f"{yil-1} {title_base}"))
+
+    # 2. Cari Dönem
+    d2, ok2, t2 = create_part(cols['curr'], yil, include_prev=True)
+    if ok2: results.append((d2, t2, f"{yil} {title_base}"))
+
+    # 3. Enflasyonlu
+    if full_data.get('has_inflation') and doc_type == 'bilanco':
+        d3, ok3, t3 = create_part(cols['inf'], yil, '_enf')
+        if ok3: results.append((d3, t3, f"{yil} ENFLASYONLU {title_base}"))
+
+    return results
+
+
+def _kayit(data, tur, basarili, basarisiz=None):
+    """Kaydedilecek beyanname; kayıt başarılıysa `basarili`, değilse `basarisiz` mesajı döner."""
+    return {"kayit": {"data": data, "tur": tur}, "basarili": basarili, "basarisiz": basarisiz}
+
+
+def _mesaj(**mesaj):
+    return {"mesaj": mesaj}
+
+
+def parse_uploaded_file(path, filename):
+    """
+    Tek dosyayı ayrıştırır ve sıralı adım listesi döner. Her adım ya doğrudan
+    bir mesaj ya da kaydedilecek bir beyannamedir. Veritabanına ve oturuma
+    dokunmaz; süreç havuzunda çalışır.
+    """
+    adimlar = []
+    try:
+        full_text = ""
+        is_pdf = filename.lower().endswith(".pdf")
+        if is_pdf:
+            # Tek geçiş: aynı metin tüm ayrıştırıcılara verilir
+            full_text = extract_text(path)
+
+        tur = "diger"
+
+        # 1. XML Kontrolü
+        if filename.lower().endswith(".xml") or full_text.strip().startswith("<?xml"):
+            try:
+                res = parse_xml_file(path)
+                if not res.get("hata"):
+                    tur = res.get("tur", "xml_beyanname")
+                    # XML ise direkt kaydet
+                    adimlar.append(_kayit(res, tur, {
+                        "filename": filename,
+                        "type": "success",
+                        "title": "XML Beyanname Yüklendi",
+                        "text": f"{res.get('unvan')} - {res.get('donem')} yüklendi.",
+                        "tur": tur,
+                        "donem": res.get("donem")
+                    }))
+                else:
+                    adimlar.append(_mesaj(filename=filename, type="error", message=res['hata']))
+                    return adimlar
+            except Exception as e:
+                adimlar.append(_mesaj(filename=filename, type="error", message=f"(XML): {str(e)}"))
+                return adimlar
+
+        # 2. PDF Kontrolü (Öncelik Kurumlar/Bilanço/Gelir'de)
+        # Regex ile sağlam kontrol: encoding hatalarını (. ile) tolere et
+        elif is_pdf and (re.search(r"KURUMLAR\s*VERG", full_text, re.I) or
+                         re.search(r"BILAN.O", full_text, re.I) or
+                         re.search(r"GEL.R\s*TABLO", full_text, re.I)):
+            tur = "bilanco/gelir"
+
+            # Bilanço Parsingleme ve Parçalama
+            try:
+                res_b = parse_bilanco_from_pdf(path, full_text)
+                # Eğer bilanco içeriği varsa (aktif veya pasif doluysa)
+                if res_b.get("aktif") or res_b.get("pasif"):
+                    for p_data, p_tur, p_title in process_parsed_parts(res_b, "bilanco"):
+                        adimlar.append(_kayit(p_data, p_tur, {
+                            "filename": filename,
+                            "type": "success",
+                            "title": "Bilanço Yüklendi",
+                            "text": f"{p_data.get('unvan')} - {p_title} başarıyla yüklendi.",
+                            "tur": p_tur,
+                            "donem": p_data.get("donem")
+                        }))
+            except Exception:
+                pass  # Bilanço hatası, devam et
+
+            # Gelir Tablosu Parsingleme ve Parçalama
+            try:
+                res_g = parse_gelir_from_pdf(path, full_text)
+                if res_g.get("tablo"):
+                    for p_data, p_tur, p_title in process_parsed_parts(res_g, "gelir"):
+                        adimlar.append(_kayit(p_data, p_tur, {
+                            "filename": filename,
+                            "type": "success",
+                            "title": "Gelir Tablosu Yüklendi",
+                            "text": f"{p_data.get('unvan')} - {p_title} başarıyla yüklendi.",
+                            "tur": p_tur,
+                            "donem": p_data.get("donem")
+                        }))
+            except Exception:
+                pass
+
+        # 3. KDV Kontrolü (Sadece yukarıdakiler değilse)
+        elif is_pdf and (re.search(r"KATMA\s*DE.ER\s*VERG", full_text, re.I) or "KDV" in full_text.upper()):
+            res = parse_kdv_from_pdf(path, full_text)
+            if not res.get("hata"):
+                tur = "kdv"
+                adimlar.append(_kayit(res, tur, {
+                    "filename": filename,
+                    "type": "success",
+                    "title": "Başarıyla Yüklendi",
+                    "text": f"{res.get('unvan', 'Bilinmiyor')} mükellefi {res.get('donem', 'Bilinmiyor')} dönemi KDV yüklendi.",
+                    "vkn": res.get("vergi_kimlik_no"),
+                    "donem": res.get("donem"),
+                    "tur": "kdv"
+                }, {"filename": filename, "type": "error", "message": "Veritabanına kaydedilirken hata oluştu."}))
+
+        # 4. Mizan (Excel) kontrolü
+        elif filename.lower().endswith((".xlsx", ".xls")):
+            adimlar.append(_mesaj(
+                filename=filename,
+                type="mizan_input_required",
+                text="Excel mizan dosyası için mükellef ve dönem bilgisi gerekli."
+            ))
+            return adimlar
+
+        # Hiçbiri değilse
+        if tur == "diger":
+            adimlar.append(_mesaj(filename=filename, type="error", message="Dosya içeriği tanınamadı veya desteklenmeyen format."))
+
+    except Exception as e:
+        adimlar.append(_mesaj(filename=filename, type="error", message=str(e)))
+    return adimlar
+
+
+def _get_pool():
+    """Süreç havuzu (worker süreci başına, ilk yüklemede açılır)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=UPLOAD_WORKERS)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# --- İş kayıtları ---
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def create_job(user_id, total):
+    job_id = uuid.uuid4().hex
+    cutoff = (datetime.now() - timedelta(hours=UPLOAD_JOB_TTL_HOURS)).strftime("%Y-%m-%d %H:%M:%S")
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM upload_jobs WHERE updated_at < %s", (cutoff,))
+        cur.execute(
+            "INSERT INTO upload_jobs (id, user_id, status, total, done, results, created_at, updated_at) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+            (job_id, user_id, "queued", total, 0, "[]", _now(), _now()),
+        )
+        conn.commit()
+    return job_id
+
+
+def update_job(job_id, **fields):
+    if "results" in fields:
+        fields["results"] = json.dumps(fields["results"], ensure_ascii=False, default=str)
+    fields["updated_at"] = _now()
+    assignments = ", ".join(f"{name}=%s" for name in fields)
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(f"UPDATE upload_jobs SET {assignments} WHERE id=%s", (*fields.values(), job_id))
+        conn.commit()
+
+
+def _mark_stale(cur, job):
+    """
+    Çalışan thread'i ölen (worker yeniden başlatıldı, süreç öldürüldü) iş
+    queued/parsing/saving'de takılı kalmasın: son ilerlemeden bu yana
+    UPLOAD_JOB_STALE_MINUTES geçtiyse iş 'error' olarak kapatılır. Koşullu
+    UPDATE, tam o sırada ilerleme yazan canlı bir işi ezmez.
+    """
+    cutoff = (datetime.now() - timedelta(minutes=UPLOAD_JOB_STALE_MINUTES)).strftime("%Y-%m-%d %H:%M:%S")
+    if job["status"] not in AKTIF_DURUMLAR or (job.get("updated_at") or "") >= cutoff:
+        return False
+    results = [{"filename": "", "type": "error",
+                "message": "Yükleme işi yanıt vermiyor (sunucu yeniden başlatılmış olabilir). Lütfen dosyaları tekrar yükleyin."}]
+    fields = {"status": "error", "results": json.dumps(results, ensure_ascii=False), "updated_at": _now()}
+    cur.execute(
+        "UPDATE upload_jobs SET status=%s, results=%s, updated_at=%s WHERE id=%s AND status=%s AND updated_at=%s",
+        (*fields.values(), job["id"], job["status"], job["updated_at"]),
+    )
+    if cur.rowcount != 1:
+        return False
+    logger.warning(f"Takılı kalan yükleme işi hatalı olarak kapatıldı: {job['id']} ({job['status']})")
+    job.update(fields)
+    return True
+
+
+def get_job(job_id, user_id):
+    with get_conn() as conn:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute(
+            "SELECT id, status, total, done, results, created_at, updated_at FROM upload_jobs WHERE id=%s AND user_id=%s",
+            (job_id, user_id),
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        job = dict(row)
+        if _mark_stale(cur, job):
+            conn.commit()
+    job["results"] = json.loads(job.get("results") or "[]")
+    return job
+
+
+def _parse_all(job_id, files):
+    """Dosyaları süreç havuzunda ayrıştırır: {sıra: adımlar}. Havuz kullanılamazsa sırayla çalışır."""
+    parsed = {}
+    if len(files) > 1 and UPLOAD_WORKERS > 1:
+        try:
+            pool = _get_pool()
+            futures = {pool.submit(parse_uploaded_file, path, name): idx for idx, (path, name) in enumerate(files)}
+            for future in as_completed(futures):
+                idx = futures[future]
+                try:
+                    parsed[idx] = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    parsed[idx] = [_mesaj(filename=files[idx][1], type="error", message=str(e))]
+                update_job(job_id, done=len(parsed))
+            return parsed
+        except (BrokenProcessPool, OSError, RuntimeError) as e:
+            logger.warning(f"Yükleme süreç havuzu kullanılamadı, kalan dosyalar sırayla işlenecek: {e}")
+            _discard_pool()
+
+    for idx, (path, name) in enumerate(files):
+        if idx not in parsed:
+            parsed[idx] = parse_uploaded_file(path, name)
+            update_job(job_id, done=len(parsed))
+    return parsed
+
+
+def _run_job(job_id, user_id, files, work_dir, save_batch):
+    try:
+        update_job(job_id, status="parsing")
+        parsed = _parse_all(job_id, files)
+        update_job(job_id, status="saving")
+        # Yükleme sırasına göre (süreç havuzunun bitirme sırasına göre değil)
+        adimlar = [(name, parsed[idx]) for idx, (_, name) in enumerate(files)]
+        results = save_batch(user_id, adimlar)
+        update_job(job_id, status="done", results=results)
+    except Exception as e:
+        logger.exception(f"Yükleme işi başarısız: {job_id}")
+        update_job(job_id, status="error", results=[{"filename": "", "type": "error", "message": str(e)}])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def start_job(user_id, files, work_dir, save_batch, pre_results=None):
+    """
+    Kaydedilmiş dosyalar [(yol, dosya_adı), ...] için iş başlatır ve iş kimliğini döner.
+    `save_batch(user_id, [(dosya_adı, adımlar), ...])` tek transaction içinde kayıt
+    yapıp mesaj listesini döndürmelidir. `pre_results` (ör. uzantısı desteklenmeyen
+    dosyalar) sonuç listesinin başına eklenir.
+    """
+    job_id = create_job(user_id, len(files))
+    pre_results = list(pre_results or [])
+
+    def batch(uid, adimlar):
+        return pre_results + save_batch(uid, adimlar)
+
+    thread = threading.Thread(
+        target=_run_job, args=(job_id, user_id, files, work_dir, batch),
+        name=f"yukleme-{job_id[:8]}", daemon=True,
+    )
+    thread.start()
+    return job_id
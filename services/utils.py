@@ -3,6 +3,7 @@ import pandas as pd
 import re
 from jinja2 import Undefined
 import config
+from services import donem
 
 ALLOWED_EXTENSIONS = config.ALLOWED_EXTENSIONS
 
@@ -201,20 +202,19 @@ def prepare_df(df_raw, column_name):
     return df
 
 def mon2num(mon: str) -> int:
-    m = mon.upper().strip()
-    m = (m
-         .replace('Ş','S').replace('Ğ','G').replace('İ','I').replace('Ü','U').replace('Ö','O').replace('Ç','C'))
-    MAP = {
-        'OCAK':1, 'SUBAT':2, 'MART':3, 'NISAN':4, 'MAYIS':5, 'HAZIRAN':6,
-        'TEMMUZ':7, 'AGUSTOS':8, 'EYLUL':9, 'EKIM':10, 'KASIM':11, 'ARALIK':12
-    }
-    return MAP.get(m, 99)
+    return donem.ay_no(mon) or 99
 
 def month_key(col: str):
-    try:
-        if '/' in col:
-            yil_str, ay_str = col.split('/', 1)
-            return (int(yil_str), mon2num(ay_str))
-        return (9999, 99)
-    except Exception:
-        return (9999, 99)
+    """'2024/OCAK', '03/2024' gibi dönem kolonlarını kronolojik sıralar; tanınmayanlar sona."""
+    return donem.metin_anahtari(col) or 10 ** 9
+
+def kdv_kolonu(donem_text: str) -> str:
+    """KDV rapor kolon başlığı: 'Ocak / 2024' -> '2024/OCAK', '01/2024' -> '2024/01'; diğerleri olduğu gibi."""
+    parts = [p.strip() for p in str(donem_text or "").split("/") if p.strip()]
+    if len(parts) != 2:
+        return donem_text
+    if parts[1].isdigit() and len(parts[1]) == 4:
+        ay, yil = parts
+    else:
+        yil, ay = parts
+    return f"{yil}/{ay.upper()}"
@@ -0,0 +1,192 @@
+"""
+Mevzuat araması için vektör (anlamsal) arama katmanı.
+
+prepare_embeddings.py'nin ürettiği normalize MiniLM vektörleri (`*_vectors.npy`)
+bellek eşlemeli (mmap) açılır; sorgu vektörü ile kosinüs benzerliği NumPy ile
+parça parça hesaplanır ve argpartition ile en iyi k seçilir. Sorgu kodlayıcısı
+ilk sorguda yüklenir ve önbelleğe alınır; ağ erişimi olmayan ortamlarda
+(test) hashing tabanlı kodlayıcı takılabilir.
+"""
+import logging
+import os
+import threading
+import zlib
+
+import numpy as np
+
+from services.search_index import tokenize
+
+DEFAULT_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+
+logger = logging.getLogger(__name__)
+
+
+def _l2_normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class SentenceTransformerEncoder:
+    """prepare_embeddings.py ile aynı modeli kullanan kodlayıcı (doküman vektörleriyle aynı uzay)."""
+
+    def __init__(self, model_name=DEFAULT_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = model_name
+        self._model = SentenceTransformer(model_name)
+
+    def encode(self, texts):
+        vectors = self._model.encode(list(texts), normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class HashingEncoder:
+    """
+    Ağ ve model gerektirmeyen yedek kodlayıcı: köklenmiş terim ve terim
+    ikililerini sabit boyutlu, işaretli bir vektöre hash'ler.
+    Doküman matrisi de aynı kodlayıcıyla üretildiğinden kendi içinde tutarlıdır.
+    """
+
+    def __init__(self, dim=2048):
+        self.name = f"hashing-{dim}"
+        self.dim = dim
+
+    def _features(self, text):
+        terms = tokenize(text)
+        return terms + [f"{a}_{b}" for a, b in zip(terms, terms[1:])]
+
+    def encode(self, texts):
+        texts = list(texts)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                matrix[row, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        return _l2_normalize(matrix)
+
+
+_encoder = None
+_encoder_loaded = False
+_encoder_lock = threading.Lock()
+
+
+def set_encoder(encoder):
+    """Sorgu kodlayıcısını değiştirir (test veya farklı model için)."""
+    global _encoder, _encoder_loaded
+    with _encoder_lock:
+        _encoder = encoder
+        _encoder_loaded = True
+
+
+def get_encoder():
+    """
+    Kodlayıcıyı ilk çağrıda yükler ve önbelleğe alır. SEARCH_ENCODER ortam değişkeni:
+    'auto' (varsayılan: model yoksa vektör arama kapalı), 'minilm' veya 'hashing'.
+    """
+    global _encoder, _encoder_loaded
+    if _encoder_loaded:
+        return _encoder
+    with _encoder_lock:
+        if not _encoder_loaded:
+            choice = os.getenv("SEARCH_ENCODER", "auto").lower()
+            if choice == "hashing":
+                _encoder = HashingEncoder()
+            else:
+                try:
+                    _encoder = SentenceTransformerEncoder()
+                except Exception as e:
+                    if choice == "minilm":
+                        raise
+                    logger.warning(f"Embedding modeli yüklenemedi, vektör arama devre dışı: {e}")
+            _encoder_loaded = True
+    return _encoder
+
+
+def top_k_cosine(matrix, queries, k=20, chunk_size=8192):
+    """
+    Normalize vektörler için toplu en iyi-k kosinüs benzerliği.
+    Matris parça parça okunur (mmap dostu); her parçada argpartition ile
+    aday seçilir, sadece son k aday sıralanır.
+    Dönüş: (indeksler, skorlar) -> her ikisi de (sorgu_sayısı, k) şeklinde.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    n = matrix.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        empty = np.empty((len(queries), 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    cand_idx, cand_scores = [], []
+    for start in range(0, n, chunk_size):
+        block = np.asarray(matrix[start:start + chunk_size], dtype=np.float32)
+        sims = queries @ block.T
+        kk = min(k, sims.shape[1])
+        part = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+        cand_idx.append(part + start)
+        cand_scores.append(np.take_along_axis(sims, part, axis=1))
+
+    idx = np.concatenate(cand_idx, axis=1)
+    scores = np.concatenate(cand_scores, axis=1)
+    if idx.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        idx = np.take_along_axis(idx, part, axis=1)
+        scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-scores, axis=1)
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Birden fazla sıralamayı (doküman indeksi listeleri) RRF ile birleştirir: {doc_idx: skor}."""
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_idx in enumerate(ranking):
+            fused[doc_idx] = fused.get(doc_idx, 0.0) + 1.0 / (k + rank + 1)
+    return fused
+
+
+class VectorIndex:
+    """
+    Bir tebliğin madde vektörleri. Kodlayıcı modeli dosyadaki vektörlerle
+    aynıysa `.npy` mmap ile açılır; değilse (hashing) matris metinlerden bir kez üretilir.
+    """
+
+    def __init__(self, items, vectors_path=None, model_name=DEFAULT_MODEL):
+        self.texts = [f"{it.get('title') or ''} {it.get('content') or ''}" for it in items]
+        self.vectors_path = vectors_path
+        self.model_name = model_name
+        self._matrices = {}
+        self._lock = threading.Lock()
+
+    def _load_matrix(self, encoder):
+        if encoder.name == self.model_name:
+            if not self.vectors_path or not os.path.exists(self.vectors_path):
+                return None
+            matrix = np.load(self.vectors_path, mmap_mode="r")
+            if matrix.shape[0] != len(self.texts):
+                logger.warning(
+                    f"{self.vectors_path}: {matrix.shape[0]} vektör, {len(self.texts)} madde; vektör arama devre dışı."
+                )
+                return None
+            return matrix
+        return encoder.encode(self.texts)
+
+    def matrix_for(self, encoder):
+        if encoder.name not in self._matrices:
+            with self._lock:
+                if encoder.name not in self._matrices:
+                    self._matrices[encoder.name] = self._load_matrix(encoder)
+        return self._matrices[encoder.name]
+
+    def search(self, queries, k=20, encoder=None):
+        """Sorgu (veya sorgu listesi) için [(doc_idx, benzerlik), ...] listeleri döner."""
+        single = isinstance(queries, str)
+        queries = [queries] if single else list(queries)
+        encoder = encoder or get_encoder()
+        matrix = self.matrix_for(encoder) if encoder is not None else None
+        if matrix is None or not queries:
+            results = [[] for _ in queries]
+        else:
+            idx, scores = top_k_cosine(matrix, encoder.encode(queries), k=k)
+            results = [list(zip(i.tolist(), s.tolist())) for i, s in zip(idx, scores)]
+        return results[0] if single else results
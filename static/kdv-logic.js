@@ -59,6 +59,53 @@ async function initDashboard() {
     fetchActiveFiles();
 }
 
+// /api/kdv/files sayfalı okuyucu: next() her çağrıda bir sonraki sayfayı getirir.
+// Sunucu ilk sayfada X-Total-Count, devamı varsa X-Next-Cursor başlığı döner.
+function createKdvFilesPager(params, pageSize = 100) {
+    let cursor = null;
+    let done = false;
+    let loading = false;
+    let total = null;
+
+    return {
+        get done() { return done; },
+        get loading() { return loading; },
+        get total() { return total; },
+        async next() {
+            if (done || loading) return null;
+            loading = true;
+            try {
+                const qs = new URLSearchParams(params);
+                qs.set('limit', pageSize);
+                if (cursor) qs.set('cursor', cursor);
+
+                const response = await fetch(`/api/kdv/files?${qs.toString()}`);
+                if (!response.ok) throw new Error('Sunucu hatası: ' + response.status);
+
+                const totalHeader = response.headers.get('X-Total-Count');
+                if (totalHeader !== null) total = parseInt(totalHeader, 10);
+                cursor = response.headers.get('X-Next-Cursor');
+                done = !cursor;
+                return await response.json();
+            } finally {
+                loading = false;
+            }
+        }
+    };
+}
+
+// Liste sonundaki işaretçi görünür olduğunda onVisible çağrılır (kaydırdıkça yükleme)
+function observeListEnd(sentinel, onVisible) {
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(e => e.isIntersecting)) onVisible();
+    }, { rootMargin: '300px' });
+    observer.observe(sentinel);
+    return observer;
+}
+
+let activeFilesPager = null;
+let activeFilesObserver = null;
+
 // Aktif dosyaları getir ve listele (Dashboard için)
 async function fetchActiveFiles() {
     const container = document.getElementById('filesListContainer');
@@ -72,17 +119,38 @@ async function fetchActiveFiles() {
         </div>`;
     
     const userId = document.getElementById('dashboardPersonnelFilter')?.value || '';
-    let apiUrl = '/api/kdv/files?active=1';
-    if (userId) apiUrl += `&user_id=${userId}`;
-    
+    const params = {
+        active: 1,
+        exclude_completed: 1,
+        fields: 'id,period,subject,status,location,amount_request,client_name'
+    };
+    if (userId) params.user_id = userId;
+
+    if (activeFilesObserver) activeFilesObserver.disconnect();
+    activeFilesPager = createKdvFilesPager(params, 48);
+    await loadMoreActiveFiles(true);
+}
+
+async function loadMoreActiveFiles(firstPage = false) {
+    const container = document.getElementById('filesListContainer');
+    const pager = activeFilesPager;
+    if (!container || !pager || pager.done || pager.loading) return;
+
     try {
-        const response = await fetch(apiUrl);
-        if (!response.ok) throw new Error('Sunucu hatası: ' + response.status);
-        const files = await response.json();
-        
-        renderFilesList(files);
+        const files = await pager.next();
+        if (pager !== activeFilesPager || !files) return;
+
+        if (firstPage) {
+            renderFilesList(files);
+            const sentinel = document.getElementById('filesListSentinel');
+            if (sentinel) activeFilesObserver = observeListEnd(sentinel, () => loadMoreActiveFiles());
+        } else {
+            appendFilesList(files);
+        }
+        if (pager.done && activeFilesObserver) activeFilesObserver.disconnect();
     } catch (error) {
         console.error('Aktif dosyalar yüklenirken hata:', error);
+        if (!firstPage) return;
         container.innerHTML = `
             <div class="alert alert-danger rounded-4 p-4 border-0 shadow-sm">
                 <i class="fa-solid fa-circle-exclamation me-2"></i>
@@ -95,14 +163,8 @@ function renderFilesList(files) {
     const container = document.getElementById('filesListContainer');
     if (!container) return;
 
-    let html = '<div class="row g-4">';
-    const activeOperations = files.filter(f => 
-        f.status !== 'İade Tamamlandı' && 
-        f.status !== 'İade Alındı' && 
-        f.location !== 'İade Tamamlandı'
-    );
-
-    if (activeOperations.length === 0) {
+    // Tamamlananlar sunucuda (exclude_completed=1) elenir
+    if (files.length === 0) {
         container.innerHTML = `
             <div class="text-center py-5 bg-white rounded-4 border shadow-sm w-100">
                 <i class="fa-solid fa-folder-open fs-1 mb-3 text-muted opacity-25"></i>
@@ -112,65 +174,71 @@ function renderFilesList(files) {
         return;
     }
 
-    activeOperations.forEach(file => {
-        // Durum renkleri ve ikonları
-        let statusClass = 'bg-primary';
-        let statusIcon = 'fa-circle-dot';
-        let cardStatusClass = 'card-status-info';
-        
-        const status = file.status || '';
-        if (status.includes('Eksiklik')) {
-            statusClass = 'bg-warning text-dark';
-            statusIcon = 'fa-triangle-exclamation';
-            cardStatusClass = 'card-status-warning';
-        } else if (status.includes('Tamamlandı') || status.includes('Bitti')) {
-            statusClass = 'bg-success';
-            statusIcon = 'fa-check-double';
-            cardStatusClass = 'card-status-success';
-        } else if (status.includes('İptal') || status.includes('Red')) {
-            statusClass = 'bg-danger';
-            statusIcon = 'fa-xmark';
-            cardStatusClass = 'card-status-danger'; 
-        } else if (status.includes('Vergi Dairesi') || status.includes('Makam')) {
-            statusClass = 'bg-info text-dark';
-            statusIcon = 'fa-building-columns';
-            cardStatusClass = 'card-status-info';
-        }
-        
-        const periodStr = (file.period_year && file.period_month) ? `${file.period_year}-${file.period_month}` : (file.period || '-');
-
-        html += `
-            <div class="col-md-6 col-lg-4 col-xl-3">
-                <div class="card h-100 border-0 shadow-sm rounded-4 overflow-hidden file-card-premium ${cardStatusClass} position-relative" 
-                     onclick="window.location.href='/kdv-detay/${file.id}'" 
-                     style="transition: all 0.3s ease; cursor: pointer; border: 1px solid rgba(0,0,0,0.03) !important; padding: 0;">
-                    <div class="card-body p-4 d-flex flex-column" style="min-height: 200px;">
-                        <div class="d-flex justify-content-between align-items-start mb-3">
-                            <span class="badge ${statusClass} rounded-pill px-3 py-2 small fw-bold shadow-sm">
-                                <i class="fa-solid ${statusIcon} me-1 small"></i> ${file.status || 'İade dilekçesi girildi'}
-                            </span>
-                            <span class="badge bg-light text-secondary border rounded-pill px-2 py-1" style="font-size: 0.7rem;">
-                                ${periodStr}
-                            </span>
+    container.innerHTML = `<div class="row g-4" id="filesListRow">${files.map(fileCardHtml).join('')}</div>
+        <div id="filesListSentinel"></div>`;
+}
+
+function appendFilesList(files) {
+    const row = document.getElementById('filesListRow');
+    if (row) row.insertAdjacentHTML('beforeend', files.map(fileCardHtml).join(''));
+}
+
+function fileCardHtml(file) {
+    // Durum renkleri ve ikonları
+    let statusClass = 'bg-primary';
+    let statusIcon = 'fa-circle-dot';
+    let cardStatusClass = 'card-status-info';
+    
+    const status = file.status || '';
+    if (status.includes('Eksiklik')) {
+        statusClass = 'bg-warning text-dark';
+        statusIcon = 'fa-triangle-exclamation';
+        cardStatusClass = 'card-status-warning';
+    } else if (status.includes('Tamamlandı') || status.includes('Bitti')) {
+        statusClass = 'bg-success';
+        statusIcon = 'fa-check-double';
+        cardStatusClass = 'card-status-success';
+    } else if (status.includes('İptal') || status.includes('Red')) {
+        statusClass = 'bg-danger';
+        statusIcon = 'fa-xmark';
+        cardStatusClass = 'card-status-danger'; 
+    } else if (status.includes('Vergi Dairesi') || status.includes('Makam')) {
+        statusClass = 'bg-info text-dark';
+        statusIcon = 'fa-building-columns';
+        cardStatusClass = 'card-status-info';
+    }
+    
+    const periodStr = file.period || '-';
+
+    return `
+        <div class="col-md-6 col-lg-4 col-xl-3">
+            <div class="card h-100 border-0 shadow-sm rounded-4 overflow-hidden file-card-premium ${cardStatusClass} position-relative" 
+                 onclick="window.location.href='/kdv-detay/${file.id}'" 
+                 style="transition: all 0.3s ease; cursor: pointer; border: 1px solid rgba(0,0,0,0.03) !important; padding: 0;">
+                <div class="card-body p-4 d-flex flex-column" style="min-height: 200px;">
+                    <div class="d-flex justify-content-between align-items-start mb-3">
+                        <span class="badge ${statusClass} rounded-pill px-3 py-2 small fw-bold shadow-sm">
+                            <i class="fa-solid ${statusIcon} me-1 small"></i> ${file.status || 'İade dilekçesi girildi'}
+                        </span>
+                        <span class="badge bg-light text-secondary border rounded-pill px-2 py-1" style="font-size: 0.7rem;">
+                            ${periodStr}
+                        </span>
+                    </div>
+                    <h5 class="fw-bold text-dark mb-1 text-truncate" title="${file.client_name}" style="font-size: 1.05rem;">${file.client_name}</h5>
+                    <p class="small text-secondary mb-3 text-truncate" style="font-size: 0.8rem;">${file.subject || '-'}</p>
+                    
+                    <div class="d-flex justify-content-between align-items-center mt-auto pt-3 border-top">
+                        <div>
+                            <small class="d-block text-muted fw-bold" style="font-size: 0.65rem; letter-spacing: 0.5px;">TALEP TUTARI</small>
+                            <span class="fw-bold text-dark">₺ ${formatMoney(file.amount_request)}</span>
                         </div>
-                        <h5 class="fw-bold text-dark mb-1 text-truncate" title="${file.client_name}" style="font-size: 1.05rem;">${file.client_name}</h5>
-                        <p class="small text-secondary mb-3 text-truncate" style="font-size: 0.8rem;">${file.subject || '-'}</p>
-                        
-                        <div class="d-flex justify-content-between align-items-center mt-auto pt-3 border-top">
-                            <div>
-                                <small class="d-block text-muted fw-bold" style="font-size: 0.65rem; letter-spacing: 0.5px;">TALEP TUTARI</small>
-                                <span class="fw-bold text-dark">₺ ${formatMoney(file.amount_request)}</span>
-                            </div>
-                            <div class="text-end">
-                                <small class="d-block text-muted fw-bold" style="font-size: 0.65rem; letter-spacing: 0.5px;">MAKAM</small>
-                                <span class="small fw-bold text-primary">${file.location || 'VD'}</span>
-                            </div>
+                        <div class="text-end">
+                            <small class="d-block text-muted fw-bold" style="font-size: 0.65rem; letter-spacing: 0.5px;">MAKAM</small>
+                            <span class="small fw-bold text-primary">${file.location || 'VD'}</span>
                         </div>
                     </div>
                 </div>
             </div>
-        `;
-    });
-    html += '</div>';
-    container.innerHTML = html;
+        </div>
+    `;
 }
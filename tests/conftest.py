@@ -0,0 +1,38 @@
+"""
+Testler geçici bir SQLite veritabanı üzerinde çalışır. services.db bağlantı
+ayarlarını import anında okuduğu için ortam değişkenleri uygulama
+import edilmeden önce burada ayarlanır.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+from dotenv import dotenv_values, find_dotenv
+
+# app.py .env'i ortamın üzerine yükler; .env bir veritabanı veriyorsa testler ona yazardı
+if dotenv_values(find_dotenv()).get("DATABASE_URL"):
+    pytest.exit(".env DATABASE_URL tanımlıyor; testler geçici veritabanı yerine ona yazar.", returncode=2)
+
+_TMP_DIR = tempfile.mkdtemp(prefix="ymm-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+os.environ["SECRET_KEY"] = "test"
+# HTTPS yönlendirmesini kapatır; sorgu sayacı (X-Query-Count) da debug modunda açılır
+os.environ["FLASK_DEBUG"] = "1"
+os.environ["QUERY_BUDGET"] = "1"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app as flask_app
+
+    # Bütçe aşımı uyarı yerine QueryBudgetExceeded (500) olur
+    flask_app.testing = True
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
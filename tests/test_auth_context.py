@@ -0,0 +1,45 @@
+"""Oturumu açık kullanıcı onaysız/askıda hale gelirse sonraki istekte oturumu kapanır."""
+import pytest
+
+from services.auth_context import invalidate_auth_context
+from services.db import get_conn
+
+USER_ID = 5
+
+
+@pytest.fixture
+def kullanici(app):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM users WHERE id = %s", (USER_ID,))
+        cur.execute(
+            "INSERT INTO users (id, username, password, role, is_approved, is_suspended) VALUES (%s, %s, %s, %s, %s, %s)",
+            (USER_ID, "askida", "x", "user", 1, 0),
+        )
+        conn.commit()
+    invalidate_auth_context(USER_ID)
+    yield USER_ID
+    invalidate_auth_context(USER_ID)
+
+
+def _durum(kolon, deger):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(f"UPDATE users SET {kolon} = %s WHERE id = %s", (deger, USER_ID))
+        conn.commit()
+    invalidate_auth_context(USER_ID)
+
+
+@pytest.mark.parametrize("kolon, deger", [("is_suspended", 1), ("is_approved", 0)])
+def test_inactive_user_session_cleared(client, kullanici, kolon, deger):
+    with client.session_transaction() as s:
+        s.update(user_id=USER_ID, username="askida", role="user", logged_in=True)
+
+    # Aktifken giriş kontrolünden geçer (admin olmadığı için ana sayfaya yönlenir)
+    assert not client.get("/users").headers["Location"].startswith("/login")
+
+    _durum(kolon, deger)
+    assert client.get("/users").headers["Location"].startswith("/login")
+    with client.session_transaction() as s:
+        assert "user_id" not in s
+        assert not s.get("logged_in")
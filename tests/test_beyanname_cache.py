@@ -0,0 +1,29 @@
+"""Çözülmüş beyanname önbelleği: invalidate ilgili id'nin tüm sürümlerini düşürür."""
+from services.beyanname_cache import BeyannameCache
+
+
+def test_invalidate_drops_all_versions_of_id():
+    cache = BeyannameCache(max_bytes=1000)
+    cache.put((1, "2024-01-01"), {"v": 1}, 10)
+    cache.put((1, "2024-02-01"), {"v": 2}, 10)
+    cache.put((2, "2024-01-01"), {"v": 3}, 10)
+
+    cache.invalidate([1, 99])
+
+    assert cache.get((1, "2024-01-01")) is None
+    assert cache.get((1, "2024-02-01")) is None
+    assert cache.get((2, "2024-01-01")) == {"v": 3}
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["invalidations"]) == (1, 10, 2)
+
+
+def test_put_evicts_least_recently_used():
+    cache = BeyannameCache(max_bytes=20)
+    cache.put((1, "a"), "bir", 10)
+    cache.put((2, "a"), "iki", 10)
+    cache.get((1, "a"))
+    cache.put((3, "a"), "üç", 10)
+
+    assert cache.get((2, "a")) is None
+    assert cache.get((1, "a")) == "bir"
+    assert cache.stats()["evictions"] == 1
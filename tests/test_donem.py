@@ -0,0 +1,60 @@
+"""Dönem metinlerinin kanonik anahtara çevrilmesi ve anahtar sırası."""
+import pytest
+
+from services import donem
+
+
+@pytest.mark.parametrize("metin, beklenen", [
+    ("01/2024", 2024011),
+    ("01 / 2024", 2024011),
+    ("Ocak / 2024", 2024011),
+    ("2024/OCAK", 2024011),
+    ("Ağustos / 2024", 2024081),
+    ("2024", 2024123),
+    ("2024 - 2. Geçici", 2024062),
+    ("2024 - KURUMLAR", 2024123),
+    ("2024 - Ara Dönem", 2024139),
+])
+def test_metin_anahtari(metin, beklenen):
+    assert donem.metin_anahtari(metin) == beklenen
+
+
+@pytest.mark.parametrize("metin", [None, "", "Bilinmiyor", "13/2024", "Ocak"])
+def test_metin_anahtari_cozulemeyen(metin):
+    assert donem.metin_anahtari(metin) is None
+
+
+@pytest.mark.parametrize("hesap_donemi, donem_turu, beklenen", [
+    (2024, "1. Geçici", 2024032),
+    ("2024", "4. Geçici", 2024122),
+    (2024, "KURUMLAR", 2024123),
+    (2024, "Kurumlar", 2024123),
+    (2024, "Diğer", 2024139),
+    ("yok", "1. Geçici", None),
+    (None, "KURUMLAR", None),
+])
+def test_tesvik_anahtari(hesap_donemi, donem_turu, beklenen):
+    assert donem.tesvik_anahtari(hesap_donemi, donem_turu) == beklenen
+
+
+def test_kullanim_anahtari_donem_text_oncelikli():
+    # donem_text kolonlarla çelişirse donem_text kazanır
+    assert donem.kullanim_anahtari("2024 - 3. Geçici", 2023, "KURUMLAR") == 2024092
+    assert donem.kullanim_donemi("2024 - 3. Geçici", 2023, "KURUMLAR") == ("2024", "3. Geçici")
+    # donem_text yoksa veya biçimi tanınmıyorsa kolonlar kullanılır
+    assert donem.kullanim_anahtari(None, 2023, "KURUMLAR") == 2023123
+    assert donem.kullanim_anahtari("serbest metin", 2023, "2. Geçici") == 2023062
+
+
+def test_ayni_ayda_aylik_gecici_yillik_sirasi():
+    aylik = donem.metin_anahtari("12/2024")
+    gecici = donem.tesvik_anahtari(2024, "4. Geçici")
+    yillik = donem.tesvik_anahtari(2024, "KURUMLAR")
+    bilinmeyen = donem.tesvik_anahtari(2024, "Diğer")
+    assert aylik < gecici < yillik < bilinmeyen < donem.metin_anahtari("01/2025")
+    assert donem.metin_anahtari("06/2024") < donem.tesvik_anahtari(2024, "2. Geçici") < donem.metin_anahtari("07/2024")
+
+
+def test_coz():
+    assert donem.coz(2024062) == (2024, 6, donem.GECICI)
+    assert donem.coz(donem.anahtar(2024, 13, donem.BILINMEYEN)) == (2024, 13, donem.BILINMEYEN)
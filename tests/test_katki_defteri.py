@@ -0,0 +1,110 @@
+"""
+Katkı defteri (tesvik_katki_defteri) kümülatif toplamları ve bulk_upsert.
+Araya dönem eklenince/silinince defter o dönemden itibaren yeniden yazılır;
+önceki satırlar korunur, sonraki satırların kümülatifleri kayar.
+"""
+import pytest
+
+from services.db import bulk_upsert, get_conn
+from services.donem import kullanim_anahtari
+from services.tesvik_data import defter_guncelle
+
+USER_ID = 4
+BELGE_NO = "D001"
+
+
+@pytest.fixture
+def cur(app):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM users WHERE id = %s", (USER_ID,))
+        if not cur.fetchone():
+            cur.execute(
+                "INSERT INTO users (id, username, password, role, is_approved) VALUES (%s, %s, %s, %s, TRUE)",
+                (USER_ID, "defter", "x", "admin"),
+            )
+        yield cur
+        conn.rollback()
+
+
+def _kullanim(cur, donem_text, yatirim, diger=0, yanan=0):
+    yil, tur = donem_text.split(" - ")
+    anahtar = kullanim_anahtari(donem_text)
+    cur.execute(
+        "INSERT INTO tesvik_kullanim (user_id, belge_no, hesap_donemi, donem_turu, donem_text, donem_anahtari,"
+        " cari_yatirim_katki, cari_diger_katki, yanan_katki_tutari) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+        (USER_ID, BELGE_NO, int(yil), tur, donem_text, anahtar, yatirim, diger, yanan),
+    )
+    return anahtar
+
+
+def _defter(cur):
+    cur.execute(
+        "SELECT donem_turu, kum_yatirim_katki, kum_diger_katki, kum_yanan_katki FROM tesvik_katki_defteri"
+        " WHERE user_id = %s AND belge_no = %s ORDER BY donem_anahtari",
+        (USER_ID, BELGE_NO),
+    )
+    return [(r["donem_turu"], r["kum_yatirim_katki"], r["kum_diger_katki"], r["kum_yanan_katki"])
+            for r in cur.fetchall()]
+
+
+def test_araya_eklenen_donem_sonrakileri_kaydirir(cur):
+    _kullanim(cur, "2024 - 1. Geçici", 100, 10)
+    _kullanim(cur, "2024 - KURUMLAR", 300, 30, 5)
+    defter_guncelle(cur, USER_ID, BELGE_NO)
+    assert _defter(cur) == [("1. Geçici", 100, 10, 0), ("KURUMLAR", 400, 40, 5)]
+
+    anahtar = _kullanim(cur, "2024 - 2. Geçici", 200, 20, 1)
+    defter_guncelle(cur, USER_ID, BELGE_NO, anahtar)
+    assert _defter(cur) == [
+        ("1. Geçici", 100, 10, 0),
+        ("2. Geçici", 300, 30, 1),
+        ("KURUMLAR", 600, 60, 6),
+    ]
+
+
+def test_aradan_silinen_donem_sonrakileri_kaydirir(cur):
+    _kullanim(cur, "2024 - 1. Geçici", 100)
+    orta = _kullanim(cur, "2024 - 2. Geçici", 200)
+    _kullanim(cur, "2024 - 3. Geçici", 300)
+    defter_guncelle(cur, USER_ID, BELGE_NO)
+    assert [r[1] for r in _defter(cur)] == [100, 300, 600]
+
+    cur.execute("DELETE FROM tesvik_kullanim WHERE user_id = %s AND donem_anahtari = %s", (USER_ID, orta))
+    defter_guncelle(cur, USER_ID, BELGE_NO, orta)
+    assert _defter(cur) == [("1. Geçici", 100, 0, 0), ("3. Geçici", 400, 0, 0)]
+
+
+def test_kismi_yeniden_yazim_tam_yazimla_ayni(cur):
+    _kullanim(cur, "2023 - KURUMLAR", 50, 5, 2)
+    _kullanim(cur, "2024 - 2. Geçici", 200, 20, 3)
+    defter_guncelle(cur, USER_ID, BELGE_NO)
+    anahtar = _kullanim(cur, "2024 - 1. Geçici", 100, 10)
+    defter_guncelle(cur, USER_ID, BELGE_NO, anahtar)
+    kismi = _defter(cur)
+    defter_guncelle(cur, USER_ID, BELGE_NO)
+    assert _defter(cur) == kismi
+
+
+def test_bulk_upsert(cur):
+    cur.execute("DELETE FROM tesvik_katki_defteri WHERE user_id = %s", (USER_ID,))
+    kolonlar = ["user_id", "belge_no", "donem_anahtari", "hesap_donemi", "kum_yatirim_katki"]
+    cakisma = ["user_id", "belge_no", "donem_anahtari"]
+
+    assert bulk_upsert(cur, "tesvik_katki_defteri", kolonlar, []) == 0
+    assert bulk_upsert(cur, "tesvik_katki_defteri", kolonlar, [
+        (USER_ID, "B1", 2024032, 2024, 10),
+        (USER_ID, "B1", 2024062, 2024, 20),
+    ]) == 2
+    # Çakışmada yalnızca verilen kolon güncellenir
+    bulk_upsert(cur, "tesvik_katki_defteri", kolonlar, [(USER_ID, "B1", 2024062, 2024, 25)],
+                conflict=cakisma, update=["kum_yatirim_katki"])
+    # update=[] -> DO NOTHING
+    bulk_upsert(cur, "tesvik_katki_defteri", kolonlar, [(USER_ID, "B1", 2024032, 2024, 99)],
+                conflict=cakisma, update=[])
+
+    cur.execute(
+        "SELECT donem_anahtari, kum_yatirim_katki FROM tesvik_katki_defteri WHERE user_id = %s ORDER BY donem_anahtari",
+        (USER_ID,),
+    )
+    assert [(r["donem_anahtari"], r["kum_yatirim_katki"]) for r in cur.fetchall()] == [(2024032, 10), (2024062, 25)]
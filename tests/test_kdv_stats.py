@@ -0,0 +1,48 @@
+"""
+KDV panel trendi yalnızca aylık dönemleri gösterir: geçici (2024062) ve
+yıllık/bilinmeyen dönemler aylık dönemle aynı ay etiketine düşmemeli.
+"""
+from datetime import date
+
+from services import donem
+from services.auth_context import AuthContext
+from services.db import get_conn
+from services.kdv_stats import compute_stats
+
+USER_ID = 2
+VKN = "2222222222"
+
+
+def _dosya(cur, mukellef_id, anahtar, tutar):
+    cur.execute(
+        "INSERT INTO kdv_files (mukellef_id, user_id, period, subject, type, amount_request, status, date,"
+        " donem_anahtari) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+        (mukellef_id, USER_ID, str(anahtar), "İhracat", "Nakden", tutar, "Devam Ediyor", "01.07.2024", anahtar),
+    )
+
+
+def test_trend_only_counts_monthly_periods(app):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM users WHERE id = %s", (USER_ID,))
+        if not cur.fetchone():
+            cur.execute(
+                "INSERT INTO users (id, username, password, role, is_approved) VALUES (%s, %s, %s, %s, TRUE)",
+                (USER_ID, "kdv", "x", "user"),
+            )
+        cur.execute("DELETE FROM kdv_mukellef WHERE vkn = %s", (VKN,))
+        cur.execute("INSERT INTO kdv_mukellef (vkn, unvan) VALUES (%s, %s) RETURNING id", (VKN, "Trend A.Ş."))
+        mukellef_id = cur.fetchone()["id"]
+
+        _dosya(cur, mukellef_id, donem.anahtar(2024, 5, donem.AYLIK), 100)
+        _dosya(cur, mukellef_id, donem.anahtar(2024, 6, donem.AYLIK), 200)
+        _dosya(cur, mukellef_id, donem.anahtar(2024, 6, donem.GECICI), 5000)
+        _dosya(cur, mukellef_id, donem.anahtar(2024, 12, donem.YILLIK), 7000)
+        _dosya(cur, mukellef_id, donem.anahtar(2024, 13, donem.BILINMEYEN), 9000)
+
+        ctx = AuthContext(USER_ID, "kdv", "user", 1, 0, 1, ())
+        stats = compute_stats(cur, ctx, mukellef_id=mukellef_id, today=date(2024, 7, 15))
+        conn.rollback()
+
+    assert stats["trend_labels"] == ["May 24", "Haz 24"]
+    assert stats["trend_data"] == [100.0, 200.0]
@@ -0,0 +1,82 @@
+"""
+İndirimli KV sayfası ve belge listesi belge sayısından bağımsız sabit sayıda
+sorgu çalıştırmalı (N+1 geri dönmesin). X-Query-Count başlığı sorgu bütçesi
+ile karşılaştırılır; app.testing açık olduğu için bütçe aşımı 500 döner.
+"""
+import pytest
+
+from services.db import get_conn
+from services.donem import kullanim_anahtari
+from services.tesvik_data import defter_guncelle
+from routes.indirimlikurumlar import INDIRIMLI_PAGE_QUERY_BUDGET
+
+BELGE_SAYISI = 30
+USER_ID = 1
+# Ekleme sırası kasıtlı olarak kronolojik değil
+DONEMLER = [("2025", "KURUMLAR"), ("2025", "1. Geçici"), ("2025", "2. Geçici")]
+
+
+@pytest.fixture(scope="module")
+def seeded(app):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM tesvik_katki_defteri WHERE user_id = %s", (USER_ID,))
+        cur.execute("DELETE FROM tesvik_kullanim WHERE user_id = %s", (USER_ID,))
+        cur.execute("DELETE FROM tesvik_belgeleri WHERE user_id = %s", (USER_ID,))
+        cur.execute("SELECT id FROM users WHERE id = %s", (USER_ID,))
+        if not cur.fetchone():
+            cur.execute(
+                "INSERT INTO users (id, username, password, role, is_approved) VALUES (%s, %s, %s, %s, TRUE)",
+                (USER_ID, "test", "x", "admin"),
+            )
+        cur.execute(
+            "INSERT INTO mukellef (user_id, vergi_kimlik_no, unvan) VALUES (%s, %s, %s) RETURNING id",
+            (USER_ID, "1234567890", "Test A.Ş."),
+        )
+        mukellef_id = cur.fetchone()["id"]
+        for i in range(BELGE_SAYISI):
+            belge_no = f"B{i:03d}"
+            cur.execute(
+                "INSERT INTO tesvik_belgeleri (user_id, mukellef_id, belge_no, karar, katki_tutari, vergi_orani)"
+                " VALUES (%s, %s, %s, %s, %s, %s)",
+                (USER_ID, mukellef_id, belge_no, "2012/3305", 1000000, 25),
+            )
+            for yil, tur in DONEMLER:
+                donem_text = f"{yil} - {tur}"
+                cur.execute(
+                    "INSERT INTO tesvik_kullanim (user_id, belge_no, hesap_donemi, donem_turu, donem_text,"
+                    " donem_anahtari, cari_yatirim_katki) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                    (USER_ID, belge_no, int(yil), tur, donem_text, kullanim_anahtari(donem_text), 1000),
+                )
+            defter_guncelle(cur, USER_ID, belge_no)
+        conn.commit()
+    return mukellef_id
+
+
+@pytest.fixture
+def logged_in(client, seeded):
+    with client.session_transaction() as s:
+        s.update(user_id=USER_ID, username="test", role="admin", logged_in=True, aktif_mukellef_id=seeded)
+    return client
+
+
+def _query_count(response):
+    assert response.status_code == 200, response.get_data(as_text=True)[:500]
+    return int(response.headers["X-Query-Count"])
+
+
+def test_index_query_budget(logged_in):
+    # İlk istek varsayılan kayıtları oluşturabilir; bütçe sabit durumda ölçülür
+    logged_in.get("/indirimlikurumlar/")
+    count = _query_count(logged_in.get("/indirimlikurumlar/"))
+    assert count <= INDIRIMLI_PAGE_QUERY_BUDGET
+
+
+def test_list_tesvik_docs_query_budget(logged_in):
+    response = logged_in.get("/indirimlikurumlar/list_tesvik_docs")
+    assert _query_count(response) <= 2
+
+    docs = response.get_json()["docs"]
+    assert len(docs) == BELGE_SAYISI
+    for doc in docs:
+        assert [d["donem_turu"] for d in doc["donemler"]] == ["1. Geçici", "2. Geçici", "KURUMLAR"]
@@ -0,0 +1,55 @@
+"""
+Toplu yükleme kayıtları tek transaction'da yazar: hatalı kayıt kendi
+savepoint'inde geri alınır, döngü yarıda kesilirse hiçbir kayıt kalmaz.
+"""
+import pytest
+
+from services.db import get_conn
+from routes.data_routes import kaydet_yukleme_sonuclari
+
+USER_ID = 3
+VKN = "3333333333"
+
+
+@pytest.fixture
+def kullanici(app):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM users WHERE id = %s", (USER_ID,))
+        if not cur.fetchone():
+            cur.execute(
+                "INSERT INTO users (id, username, password, role, is_approved) VALUES (%s, %s, %s, %s, TRUE)",
+                (USER_ID, "yukleme", "x", "admin"),
+            )
+        cur.execute("DELETE FROM beyanname WHERE user_id = %s", (USER_ID,))
+        conn.commit()
+    return USER_ID
+
+
+def _adim(donem, **veri):
+    data = {"vergi_kimlik_no": VKN, "unvan": "Yükleme A.Ş.", "donem": donem, "veriler": [], **veri}
+    return {"kayit": {"data": data, "tur": "kdv"}, "basarili": {"type": "success", "message": donem}}
+
+
+def _donemler():
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT donem FROM beyanname WHERE user_id = %s ORDER BY donem", (USER_ID,))
+        return [r["donem"] for r in cur.fetchall()]
+
+
+def test_failed_record_rolls_back_alone(kullanici):
+    hatali = _adim("02/2024", veriler=object())  # json.dumps hata verir
+    sonuclar = kaydet_yukleme_sonuclari(USER_ID, [("a.pdf", [_adim("01/2024"), hatali, _adim("03/2024")])])
+
+    assert [s["type"] for s in sonuclar] == ["success", "error", "success"]
+    assert _donemler() == ["01/2024", "03/2024"]
+
+
+def test_interrupted_batch_writes_nothing(kullanici):
+    yarim = _adim("02/2024")
+    del yarim["basarili"]  # kayıttan sonra KeyError
+    with pytest.raises(KeyError):
+        kaydet_yukleme_sonuclari(USER_ID, [("a.pdf", [_adim("01/2024"), yarim])])
+
+    assert _donemler() == []
@@ -0,0 +1,40 @@
+"""Thread'i ölen yükleme işi UPLOAD_JOB_STALE_MINUTES sonra 'error' olarak kapanır."""
+from datetime import datetime, timedelta
+
+from services.db import get_conn
+from services.upload_service import UPLOAD_JOB_STALE_MINUTES, create_job, get_job, update_job
+
+USER_ID = 1
+
+
+def _geri_al(job_id, dakika):
+    zaman = (datetime.now() - timedelta(minutes=dakika)).strftime("%Y-%m-%d %H:%M:%S")
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE upload_jobs SET updated_at = %s WHERE id = %s", (zaman, job_id))
+        conn.commit()
+
+
+def test_stale_job_marked_error(app):
+    job_id = create_job(USER_ID, total=2)
+    update_job(job_id, status="saving", done=1)
+    _geri_al(job_id, UPLOAD_JOB_STALE_MINUTES + 1)
+
+    job = get_job(job_id, USER_ID)
+    assert job["status"] == "error"
+    assert job["results"][0]["type"] == "error"
+    # Kalıcı olarak yazıldı
+    assert get_job(job_id, USER_ID)["status"] == "error"
+
+
+def test_recent_or_finished_job_untouched(app):
+    canli = create_job(USER_ID, total=1)
+    update_job(canli, status="parsing")
+    _geri_al(canli, UPLOAD_JOB_STALE_MINUTES - 1)
+    assert get_job(canli, USER_ID)["status"] == "parsing"
+
+    biten = create_job(USER_ID, total=1)
+    update_job(biten, status="done", results=[])
+    _geri_al(biten, UPLOAD_JOB_STALE_MINUTES + 60)
+    assert get_job(biten, USER_ID)["status"] == "done"
+    assert get_job(biten, "baska-kullanici") is None
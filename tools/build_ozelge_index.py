@@ -1,4 +1,5 @@
 from pathlib import Path
+import argparse
 import sys
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -8,6 +9,13 @@ from services.ozelge_service import build_ozelge_index
 
 
 if __name__ == "__main__":
-    data = build_ozelge_index(ROOT)
+    parser = argparse.ArgumentParser(description="Özelge indeksini (ozelgeler_index.json) yeniden üretir.")
+    parser.add_argument("--workers", type=int, default=None, help="PDF tarama süreç sayısı (varsayılan: CPU sayısı)")
+    parser.add_argument("--no-cache", action="store_true", help="PDF tarama önbelleğini kullanma, tüm dosyaları yeniden işle")
+    args = parser.parse_args()
+
+    stats = {}
+    data = build_ozelge_index(ROOT, workers=args.workers, use_cache=not args.no_cache, stats=stats)
     print(f"{data['count']} ozelge indekslendi.")
+    print(f"PDF: {stats.get('processed', 0)} islendi, {stats.get('cached', 0)} onbellekten.")
     print(f"Indeks: {ROOT / 'static' / 'data' / 'ozelgeler_index.json'}")
@@ -0,0 +1,81 @@
+from pathlib import Path
+import argparse
+import os
+import secrets
+import shutil
+import sys
+import tempfile
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rotaların çalıştırdığı sorguları geçici, tohumlanmış bir SQLite veritabanında EXPLAIN eder ve tam tablo taramalarını raporlar."
+    )
+    parser.add_argument("--url", action="append", default=[], help="Denetlenecek URL (tekrarlanabilir; verilmezse tüm GET rotaları)")
+    parser.add_argument("--user-id", type=int, default=1, help="Oturum kullanıcısı (varsayılan: 1)")
+    parser.add_argument("--role", default="admin", help="Oturum rolü (varsayılan: admin)")
+    parser.add_argument("--ignore-table", action="append", default=[], help="Taraması kabul edilen tablo (tekrarlanabilir)")
+    parser.add_argument("--verbose", action="store_true", help="Tüm sorguların planlarını yazdır")
+    parser.add_argument(
+        "--use-database-url", action="store_true",
+        help="Geçici veritabanı yerine DATABASE_URL'i kullan (GET rotaları da yazar: göçler, önbellek, ziyaretçi alanı); tohum verisi eklenmez",
+    )
+    args = parser.parse_args()
+
+    from dotenv import dotenv_values, find_dotenv
+
+    tmp_dir = None
+    if args.use_database_url:
+        if not (os.getenv("DATABASE_URL") or dotenv_values(find_dotenv()).get("DATABASE_URL")):
+            sys.exit("DATABASE_URL tanımlı değil.")
+    else:
+        # app.py .env'i ortamın üzerine yükler; .env DATABASE_URL veriyorsa geçici veritabanı garanti edilemez
+        if dotenv_values(find_dotenv()).get("DATABASE_URL"):
+            sys.exit(".env DATABASE_URL tanımlıyor; denetim o veritabanına yazar. Bilerek çalıştırmak için --use-database-url verin.")
+        tmp_dir = tempfile.mkdtemp(prefix="explain-audit-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'audit.db')}"
+    # Test istemcisi HTTP ile çağırır; debug modu HTTPS yönlendirmesini kapatır
+    os.environ["FLASK_DEBUG"] = "1"
+    # Oturum çerezi (test istemcisi oturumu) için
+    os.environ.setdefault("SECRET_KEY", secrets.token_hex(16))
+
+    try:
+        from app import app
+        from services.migrations import run_migrations
+        from services.query_audit import audit, seed_database
+
+        mukellef_id = None
+        if tmp_dir:
+            run_migrations(bootstrap_admin=False)
+            mukellef_id = seed_database(user_id=args.user_id, role=args.role)
+
+        results = audit(
+            app, urls=args.url or None, user_id=args.user_id, role=args.role,
+            ignore_tables=set(args.ignore_table), mukellef_id=mukellef_id,
+        )
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    flagged = [r for r in results if r["seq_scans"]]
+    errors = [r for r in results if r["error"]]
+
+    for r in results:
+        if not (args.verbose or r["seq_scans"] or r["error"]):
+            continue
+        mark = "SCAN" if r["seq_scans"] else ("HATA" if r["error"] else "ok")
+        print(f"[{mark}] {r['url']}")
+        print(f"    {r['query'][:300]}")
+        if r["seq_scans"]:
+            print(f"    taranan: {', '.join(r['seq_scans'])}")
+        if r["error"]:
+            print(f"    hata: {r['error']}")
+        if args.verbose:
+            for line in r["plan"]:
+                print(f"      {line}")
+
+    print(f"{len(results)} sorgu denetlendi, {len(flagged)} tam tarama, {len(errors)} hata.")
+    sys.exit(1 if flagged else 0)
@@ -0,0 +1,27 @@
+from pathlib import Path
+import argparse
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from services.migrations import LATEST_VERSION, MIGRATIONS, applied_versions, bootstrap_admin_from_env, run_migrations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Şema göçlerini (DATABASE_URL) uygular; worker'lar açılışta yalnızca sürümü kontrol eder.")
+    parser.add_argument("--status", action="store_true", help="Uygulanmış ve bekleyen göçleri listele, değişiklik yapma")
+    parser.add_argument("--no-admin", action="store_true", help="ADMIN_USERNAME/ADMIN_PASSWORD ile admin hesabını güncelleme")
+    args = parser.parse_args()
+
+    if args.status:
+        done = {row["version"]: row for row in applied_versions()}
+        for version, name, _ in MIGRATIONS:
+            row = done.get(version)
+            print(f"{version:>3} {name:<24} {row['applied_at'] if row else 'BEKLIYOR'}")
+        sys.exit(0 if len(done) >= len(MIGRATIONS) else 1)
+
+    applied = run_migrations(bootstrap_admin=False)
+    if not args.no_admin:
+        bootstrap_admin_from_env()
+    print(f"{len(applied)} goc uygulandi, sema surumu {LATEST_VERSION}.")